@@ -18,6 +18,7 @@ import os
 
 from . export import DSC_OT_export
 from . draw_road import DrawRoad
+from . create_road_from_points import CreateRoadFromPoints
 from . segment_road import SegmentRoad
 from . adjust_lane_numbers import AdjustLaneNumbers
 from . adjust_lane_boundary import AdjustLaneBoundary
@@ -32,6 +33,9 @@ from . save_map_scene import SaveMapScene
 from . open_map_scene import OpenMapScene
 from . export_open_drive_map import ExportOpenDriveMap
 from . remove_road import RemoveRoad
+from . simplify_map_curves import SimplifyMapCurves
+from . check_road_conflicts import CheckRoadConflicts
+from . auto_segment_curve_fit_sections import AutoSegmentCurveFitSections
 
 from .utils import export_import_utils
 
@@ -79,6 +83,8 @@ class DSC_PT_panel_create(bpy.types.Panel):
         row = innerBox.row(align=True)
         row.operator('dsc.draw_road', text='绘制道路', icon_value=custom_icons['road_straight'].icon_id)
         row = innerBox.row(align=True)
+        row.operator('dsc.create_road_from_points', text='由点列创建道路', icon_value=custom_icons['road_parametric_polynomial'].icon_id)
+        row = innerBox.row(align=True)
         row.operator('dsc.remove_road', text='删除道路', icon_value=custom_icons['road_straight'].icon_id)
         row = innerBox.row(align=True)
         row.operator('dsc.segment_road', text='道路分段', icon_value=custom_icons['road_straight'].icon_id)
@@ -103,7 +109,13 @@ class DSC_PT_panel_create(bpy.types.Panel):
         row = innerBox.row(align=True)
         row.operator('dsc.adjust_curve_fit_sections', text='调整车道宽度元素数量', icon_value=custom_icons['road_straight'].icon_id)
         row = innerBox.row(align=True)
+        row.operator('dsc.auto_segment_curve_fit_sections', text='自动调整车道宽度元素数量', icon_value=custom_icons['road_straight'].icon_id)
+        row = innerBox.row(align=True)
         row.operator('dsc.draw_segmenting_line_for_curve_fitting', text='显示/隐藏三次曲线拟合分段线', icon_value=custom_icons['road_straight'].icon_id)
+        row = innerBox.row(align=True)
+        row.operator('dsc.simplify_map_curves', text='简化地图曲线', icon_value=custom_icons['road_straight'].icon_id)
+        row = innerBox.row(align=True)
+        row.operator('dsc.check_road_conflicts', text='道路交叉重叠检查', icon_value=custom_icons['road_straight'].icon_id)
 
         innerBox = outerBox.box()
         innerBox.label(text='导入/导出')
@@ -126,6 +138,7 @@ classes = (
     DSC_OT_export,
     DSC_PT_panel_create,
     DrawRoad,
+    CreateRoadFromPoints,
     SegmentRoad,
     AdjustLaneNumbers,
     AdjustLaneBoundary,
@@ -137,7 +150,10 @@ classes = (
     SaveMapScene,
     OpenMapScene,
     ExportOpenDriveMap,
-    RemoveRoad
+    RemoveRoad,
+    SimplifyMapCurves,
+    CheckRoadConflicts,
+    AutoSegmentCurveFitSections
 )
 
 def register():
@@ -1,5 +1,6 @@
 import bpy
 import copy
+from bpy.props import FloatProperty
 
 from .utils import draw_utils
 from .utils import math_utils
@@ -20,6 +21,13 @@ class AdjustCurveFitSections(DrawCurveBase):
     bl_label = 'xxx'
     bl_options = {'REGISTER', 'UNDO'}
 
+    tolerance: FloatProperty(
+        name='允许偏差',
+        default=cubic_curve_fitting_utils.auto_segment_tolerance,
+        min=0.001,
+        precision=3,
+        unit='LENGTH')
+
     def __init__(self):
         DrawCurveBase.__init__(self)
 
@@ -27,6 +35,11 @@ class AdjustCurveFitSections(DrawCurveBase):
         self.section_id = None
         self.lane_id = None
 
+        # 选中车道后，车道边界不再变化，其空间索引只需生成一次；最后一个curve fit section的空间索引在分段情况变化时重新生成。
+        self.lane_boundary_spatial_index = None
+        self.adjacent_lane_boundary_spatial_index = None
+        self.last_curve_fit_section_spatial_index = None
+
     def draw_dynamic_segmenting_line_for_curve_fitting(self, raycast_point, projected_point):
         '''
         绘制动态分段线，提示分段位置。
@@ -35,15 +48,14 @@ class AdjustCurveFitSections(DrawCurveBase):
         lane_sections = road_data['lane_sections']
         lane_section = lane_sections[self.section_id]
 
-        if self.lane_id > 0: # 左侧车道
-            lane_boundary = lane_section['lanes'][self.lane_id]['boundary_curve_elements']
-            adjacent_lane_boundary = lane_section['lanes'][self.lane_id - 1]['boundary_curve_elements']
-        elif self.lane_id < 0: # 右侧车道
-            lane_boundary = lane_section['lanes'][self.lane_id]['boundary_curve_elements']
-            adjacent_lane_boundary = lane_section['lanes'][self.lane_id + 1]['boundary_curve_elements']
+        lane_boundary, adjacent_lane_boundary = cubic_curve_fitting_utils.get_lane_boundaries(lane_section, self.lane_id)
+
+        if self.lane_boundary_spatial_index is None:
+            self.lane_boundary_spatial_index = basic_element_utils.build_curve_spatial_index(lane_boundary)
+            self.adjacent_lane_boundary_spatial_index = basic_element_utils.build_curve_spatial_index(adjacent_lane_boundary)
 
-        intersected_point_on_lane_boundary = basic_element_utils.intersect_line_curve(raycast_point, projected_point, lane_boundary, projected_point)
-        intersected_point_on_adjacent_lane_boundary = basic_element_utils.intersect_line_curve(raycast_point, projected_point, adjacent_lane_boundary, projected_point)
+        intersected_point_on_lane_boundary = basic_element_utils.intersect_line_curve(raycast_point, projected_point, lane_boundary, projected_point, self.lane_boundary_spatial_index)
+        intersected_point_on_adjacent_lane_boundary = basic_element_utils.intersect_line_curve(raycast_point, projected_point, adjacent_lane_boundary, projected_point, self.adjacent_lane_boundary_spatial_index)
         if intersected_point_on_lane_boundary != None and intersected_point_on_adjacent_lane_boundary != None:
             draw_utils.draw_line('dynamic_segmenting_line_for_curve_fitting', intersected_point_on_lane_boundary, intersected_point_on_adjacent_lane_boundary)
 
@@ -76,8 +88,10 @@ class AdjustCurveFitSections(DrawCurveBase):
                 lane = section['lanes'][self.lane_id]
                 curve_fit_sections = lane['curve_fit_sections']
                 last_curve_fit_section = curve_fit_sections[len(curve_fit_sections) - 1] # 车道的三次曲线拟合分段总是对最后一个curve fit section进行分段。
-                # 如果分段成功，projected_point不为None，最后一个lane section被分成 pre_section和 next_section。
-                self.projected_point, self.pre_section, self.next_section = basic_element_utils.split_reference_line_segment(last_curve_fit_section, raycast_point)
+                if self.last_curve_fit_section_spatial_index is None:
+                    self.last_curve_fit_section_spatial_index = basic_element_utils.build_curve_spatial_index(last_curve_fit_section)
+                # 光标移动时只定位投影点，确定分段时才分割curve fit section。
+                self.projected_point, _ = basic_element_utils.project_point_onto_curve(last_curve_fit_section, raycast_point, self.last_curve_fit_section_spatial_index)
 
                 if self.projected_point != None:
                     self.draw_dynamic_segmenting_line_for_curve_fitting(raycast_point, self.projected_point)
@@ -101,6 +115,7 @@ class AdjustCurveFitSections(DrawCurveBase):
                     
                     center_lane = lane_section['lanes'][0]['boundary_curve_elements']
                     lane['curve_fit_sections'] = [copy.deepcopy(center_lane)] # 清除上次分段的结果。
+                    self.last_curve_fit_section_spatial_index = None
 
                     helpers.select_activate_object(context, raycast_object) # 高亮显示当前选中的车道。
 
@@ -111,10 +126,13 @@ class AdjustCurveFitSections(DrawCurveBase):
                     lane_section = lane_sections[self.section_id]
                     lane = lane_section['lanes'][self.lane_id]
                     curve_fit_sections = lane['curve_fit_sections']
+                    # 最后一个section被分成 pre_section和 next_section。
+                    _, pre_section, next_section = basic_element_utils.split_reference_line_segment(curve_fit_sections[len(curve_fit_sections) - 1], self.projected_point, self.last_curve_fit_section_spatial_index)
                     # 删除最后一个section，并添加分段得到的两个sections。
                     curve_fit_sections.pop() 
-                    curve_fit_sections.append(self.pre_section) 
-                    curve_fit_sections.append(self.next_section)
+                    curve_fit_sections.append(pre_section) 
+                    curve_fit_sections.append(next_section)
+                    self.last_curve_fit_section_spatial_index = None
 
                     cubic_curve_fitting_utils.update_cubic_curve_factors(lane_section, self.lane_id)
                     cubic_curve_fitting_utils.draw_cubic_curve_fitting_result(self.road_id, self.section_id, self.lane_id)
@@ -136,6 +154,7 @@ class AdjustCurveFitSections(DrawCurveBase):
                 curve_fit_sections.pop()
                 curve_fit_sections.pop()
                 curve_fit_sections.append(merged_segment)
+                self.last_curve_fit_section_spatial_index = None
 
                 cubic_curve_fitting_utils.update_cubic_curve_factors(section, self.lane_id)
                 cubic_curve_fitting_utils.draw_cubic_curve_fitting_result(self.road_id, self.section_id, self.lane_id)
@@ -144,6 +163,20 @@ class AdjustCurveFitSections(DrawCurveBase):
 
             return {'RUNNING_MODAL'}
 
+        elif event.type == 'A' and event.value == 'RELEASE': # A是Auto的首字母，表示按允许偏差自动分段。
+            if self.lane_id != None:
+                road_data = map_scene_data.get_road_data(self.road_id)
+                lane_section = road_data['lane_sections'][self.section_id]
+                cubic_curve_fitting_utils.auto_segment_curve_fit_sections(lane_section, self.lane_id, self.tolerance)
+                self.last_curve_fit_section_spatial_index = None
+
+                cubic_curve_fitting_utils.update_cubic_curve_factors(lane_section, self.lane_id)
+                cubic_curve_fitting_utils.draw_cubic_curve_fitting_result(self.road_id, self.section_id, self.lane_id)
+
+                cubic_curve_fitting_utils.draw_static_segmenting_line_for_curve_fitting(self.road_id, self.section_id, self.lane_id)
+
+            return {'RUNNING_MODAL'}
+
         elif event.type in {'ESC'}:
             if self.lane_id != None:
                 cubic_curve_fitting_utils.remove_cubic_curve_fitting_result(self.road_id, self.section_id, self.lane_id)
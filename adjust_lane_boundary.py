@@ -166,7 +166,7 @@ class AdjustLaneBoundary(DrawCurveBase):
                     line2_point1 = self.end_line_one_side_point
                     line2_point2 = self.end_line_another_side_point
                     end_line_projected_point = geometry.intersect_line_line(line1_point1, line1_point2, line2_point1, line2_point2)[0]
-                elif self.dynamic_element['type'] == 'arc':
+                else: # arc或spiral（DrawCurveBase只绘制line、arc和spiral，不会出现parampoly3）：dynamic元素总是经过光标位置，把光标投影到结束点定位线上，元素就结束于定位线上。
                     end_line_projected_point = math_utils.project_point_onto_line(self.current_selected_point, self.end_line_one_side_point, self.end_line_another_side_point)
                 
                 draw_utils.draw_point('projected_point_on_end_line', end_line_projected_point) # 更新投影点位置。
@@ -44,7 +44,9 @@ class AdjustLaneNumbers(bpy.types.Operator):
                 lane_to_object_map = selected_road['lane_to_object_map']
 
                 if lane_id == selected_section['left_most_lane_index']: # 鼠标选中了最左侧的车道，在该车道的外面增加一个车道。
-                    road_utils.add_lane(selected_section, 'left')
+                    fold_spans = road_utils.add_lane(selected_section, 'left')
+                    if len(fold_spans) > 0:
+                        self.report({'WARNING'}, '新车道边界在曲率半径过小处发生折叠，已剪除折叠部分。')
                     left_most_lane_index = selected_section['left_most_lane_index']
                     lane_mesh = road_utils.create_band_mesh(selected_section['lanes'][left_most_lane_index]['boundary_curve_elements'], selected_section['lanes'][left_most_lane_index - 1]['boundary_curve_elements'])
                     lane_object_name = 'lane_object_' + str(road_id) + '_' + str(section_id) + '_' + str(left_most_lane_index)
@@ -56,7 +58,9 @@ class AdjustLaneNumbers(bpy.types.Operator):
                     lane_to_object_map[(section_id, left_most_lane_index)] = lane_object
 
                 elif lane_id == selected_section['right_most_lane_index']: # 鼠标选中了最右侧的车道，在该车道的外面增加一个车道。
-                    road_utils.add_lane(selected_section, 'right')
+                    fold_spans = road_utils.add_lane(selected_section, 'right')
+                    if len(fold_spans) > 0:
+                        self.report({'WARNING'}, '新车道边界在曲率半径过小处发生折叠，已剪除折叠部分。')
                     right_most_lane_index = selected_section['right_most_lane_index']   
                     lane_mesh = road_utils.create_band_mesh(selected_section['lanes'][right_most_lane_index + 1]['boundary_curve_elements'], selected_section['lanes'][right_most_lane_index]['boundary_curve_elements'])
                     lane_object_name = 'lane_object_' + str(road_id) + '_' + str(section_id) + '_' + str(right_most_lane_index)
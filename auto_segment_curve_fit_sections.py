@@ -0,0 +1,33 @@
+import bpy
+from bpy.props import FloatProperty
+
+from .utils import cubic_curve_fitting_utils
+
+from . import map_scene_data
+
+
+
+class AutoSegmentCurveFitSections(bpy.types.Operator):
+    bl_idname = 'dsc.auto_segment_curve_fit_sections'
+    bl_label = '自动调整车道宽度元素数量'
+    bl_options = {'REGISTER', 'UNDO'}
+
+    tolerance: FloatProperty(
+        name='允许偏差',
+        default=cubic_curve_fitting_utils.auto_segment_tolerance,
+        min=0.001,
+        precision=3,
+        unit='LENGTH')
+
+    @classmethod
+    def poll(cls, context):
+        return context.area.type == 'VIEW_3D'
+
+    def execute(self, context):
+        '''
+        按允许偏差对地图中所有车道重新进行三次曲线拟合分段，原来手动分段的结果被替换。
+        '''
+        section_count = cubic_curve_fitting_utils.auto_segment_all_curve_fit_sections(map_scene_data.get_map_data(), self.tolerance)
+        self.report({'INFO'}, '所有车道共分为' + str(section_count) + '段进行三次曲线拟合。')
+
+        return {'FINISHED'}
@@ -0,0 +1,35 @@
+import bpy
+from bpy.props import FloatProperty
+
+from .utils import road_utils
+
+from . import map_scene_data
+
+
+
+class CheckRoadConflicts(bpy.types.Operator):
+    bl_idname = 'dsc.check_road_conflicts'
+    bl_label = '道路交叉重叠检查'
+    bl_options = {'REGISTER'}
+
+    merge_distance: FloatProperty(
+        name='合并距离',
+        default=10.0,
+        min=0.0,
+        unit='LENGTH')
+
+    @classmethod
+    def poll(cls, context):
+        return context.area.type == 'VIEW_3D'
+
+    def execute(self, context):
+        '''
+        检查地图中不同道路的参考线和最外侧车道边界之间的交叉和重叠，道路首尾相接处不算。
+        '''
+        conflicts = road_utils.find_road_conflicts(map_scene_data.get_map_data(), self.merge_distance)
+        for road_id, (start_s, end_s), other_road_id, (other_start_s, other_end_s) in conflicts:
+            self.report({'WARNING'}, '道路' + str(road_id) + ' s∈[' + format(start_s, '.2f') + ', ' + format(end_s, '.2f') + '] 与道路' + 
+                str(other_road_id) + ' s∈[' + format(other_start_s, '.2f') + ', ' + format(other_end_s, '.2f') + '] 交叉或重叠。')
+        self.report({'INFO'}, '共发现' + str(len(conflicts)) + '处道路交叉或重叠。')
+
+        return {'FINISHED'}
@@ -0,0 +1,85 @@
+import bpy
+from bpy.props import FloatProperty
+from mathutils import Vector
+from math import dist
+
+from . import helpers
+from .utils import basic_element_utils
+from .utils import road_utils
+
+from . import map_scene_data
+
+
+
+class CreateRoadFromPoints(bpy.types.Operator):
+    bl_idname = 'dsc.create_road_from_points'
+    bl_label = '由点列创建道路'
+    bl_options = {'REGISTER', 'UNDO'}
+
+    tolerance: FloatProperty(
+        name='允许偏差',
+        default=basic_element_utils.arc_tessellation_tolerance,
+        min=0.001,
+        precision=3,
+        unit='LENGTH')
+
+    @classmethod
+    def poll(cls, context):
+        return context.area.type == 'VIEW_3D' and context.active_object is not None and context.active_object.type == 'MESH'
+
+    def execute(self, context):
+        '''
+        把当前选中的mesh object（比如导入的测绘点列或手绘的折线）的顶点按顶点顺序拟合为由parampoly3构成的道路参考线（见basic_element_utils.fit_parampoly3_curve_to_points），
+        并以此创建默认的双向双车道road。顶点被投影到xy平面上，相邻的重合顶点只保留一个。
+        '''
+        points_object = context.active_object
+        points = []
+        for vertex in points_object.data.vertices:
+            point = points_object.matrix_world @ vertex.co
+            point = Vector((point[0], point[1], 0.0))
+            if len(points) == 0 or dist(point, points[-1]) > 0.000001:
+                points.append(point)
+
+        if len(points) < 2:
+            self.report({'WARNING'}, '选中的object至少需要两个不重合的顶点。')
+            return {'CANCELLED'}
+
+        reference_line_elements = basic_element_utils.fit_parampoly3_curve_to_points(points, self.tolerance)
+        lane_section = road_utils.create_lane_section(reference_line_elements)
+
+        road_id = map_scene_data.generate_road_id()
+        road_object = bpy.data.objects.new('road_object_' + str(road_id), None)
+        context.scene.collection.objects.link(road_object)
+
+        lane_to_object_map = {}
+        for lane_id, up_boundary_id, down_boundary_id in ((1, 1, 0), (-1, 0, -1)):
+            lane_mesh = road_utils.create_band_mesh(lane_section['lanes'][up_boundary_id]['boundary_curve_elements'], lane_section['lanes'][down_boundary_id]['boundary_curve_elements'])
+            lane_object = bpy.data.objects.new('lane_object_' + str(road_id) + '_' + str(0) + '_' + str(lane_id), lane_mesh)
+            lane_object['type'] = 'lane'
+            lane_object.parent = road_object
+            context.scene.collection.objects.link(lane_object)
+
+            lane_to_object_map[(0, lane_id)] = lane_object
+
+        left_side_curve = basic_element_utils.OffsetCurve(reference_line_elements, 0.1, 'left')
+        right_side_curve = basic_element_utils.OffsetCurve(reference_line_elements, 0.1, 'right')
+        mesh = road_utils.create_band_mesh(left_side_curve, right_side_curve)
+        road_reference_line_object = bpy.data.objects.new('reference_line_object_' + str(road_id), mesh)
+        road_reference_line_object.location[2] += 0.05
+        road_reference_line_object['type'] = 'road_reference_line'
+        road_reference_line_object.parent = road_object
+        context.scene.collection.objects.link(road_reference_line_object)
+
+        road_data = {}
+        road_data['reference_line_sections'] = [reference_line_elements]
+        road_data['lane_sections'] = [lane_section]
+        road_data['road_reference_line_object'] = road_reference_line_object
+        road_data['lane_to_object_map'] = lane_to_object_map
+        road_data['road_object'] = road_object
+        map_scene_data.set_road_data(road_id, road_data)
+
+        helpers.select_activate_object(context, road_object)
+
+        self.report({'INFO'}, '用' + str(len(reference_line_elements)) + '段parampoly3拟合了' + str(len(points)) + '个点。')
+
+        return {'FINISHED'}
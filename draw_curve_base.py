@@ -8,7 +8,7 @@ from .utils import math_utils
 from . import helpers
 
 '''
-道路参考线的构成元素是line和arc，元素信息包括type、start_point、start_tangent、end_point、end_tangent。
+道路参考线的构成元素是line、arc和spiral，元素信息包括type、start_point、start_tangent、end_point、end_tangent，spiral还包括start_curvature、end_curvature、spiral_length和lateral_offset。
 道路参考线的第一个元素必须是line，除第一个元素外，其它元素的start_point等于它前面元素的end_point，start_tangent等于它前面元素的end_tangent。
 reference_line_elements中的元素由static元素（该数组中除最后一个元素以外的元素）和dynamic元素（该数组中最后一个元素）构成。
 '''
@@ -22,13 +22,13 @@ class DrawCurveBase(bpy.types.Operator):
         self.current_selected_point = None
         self.dynamic_element_was_added = False # dynamic元素是否已经加入reference_line_elements。
         self.reference_line_elements = [] # 保存道路参考线的构成元素，即line和arc元素。
-        self.dynamic_element = { # dynamic_element 是随鼠标位置动态变化的dynamic元素，是reference_line_elements中的最后一个元素。
-            'type': 'line', # 元素类型，line或者arc。
-            'start_point': None, # 该元素起始点的坐标向量。
-            'start_tangent': None, # 该元素起始点处的切向量。
-            'end_point': None, # 该元素结束点的坐标向量。
-            'end_tangent': None # 该元素结束点处的切向量。
-        }
+        self.dynamic_element = basic_element_utils.CurveElement( # dynamic_element 是随鼠标位置动态变化的dynamic元素，是reference_line_elements中的最后一个元素。
+            type = 'line', # 元素类型，line、arc或者spiral。
+            start_point = None, # 该元素起始点的坐标向量。
+            start_tangent = None, # 该元素起始点处的切向量。
+            end_point = None, # 该元素结束点的坐标向量。
+            end_tangent = None # 该元素结束点处的切向量。
+        )
 
     def modal(self, context, event):
         if event.type == 'MOUSEMOVE':
@@ -62,6 +62,10 @@ class DrawCurveBase(bpy.types.Operator):
                 self.dynamic_element['end_tangent'] = basic_element_utils.computer_arc_end_tangent(self.dynamic_element['start_point'],
                                                                                     self.dynamic_element['start_tangent'],
                                                                                     self.dynamic_element['end_point'])
+                basic_element_utils.update_arc_geometry_info(self.dynamic_element)
+
+            elif self.dynamic_element['type'] == 'spiral': # 当前正在绘制的元素是spiral。
+                self.update_dynamic_spiral(self.current_selected_point)
 
             return {'RUNNING_MODAL'}
 
@@ -96,11 +100,15 @@ class DrawCurveBase(bpy.types.Operator):
 
             return {'RUNNING_MODAL'}
             
-        elif event.type in {'LEFT_SHIFT'} and event.value in {'RELEASE'}: # 切换当前绘制元素的类型。
+        elif event.type in {'LEFT_SHIFT'} and event.value in {'RELEASE'}: # 切换当前绘制元素的类型，按line、arc、spiral的顺序循环。
             if self.dynamic_element['type'] == 'line':
                 if len(self.reference_line_elements) <= 1:
-                    return {'RUNNING_MODAL'} # 第一个元素必须是line，因为如果是arc，则该arc起始点处的切线方向是不确定的。
+                    return {'RUNNING_MODAL'} # 第一个元素必须是line，因为如果是arc或spiral，则起始点处的切线方向是不确定的。
                 self.dynamic_element['type'] = 'arc'
+            elif self.dynamic_element['type'] == 'arc':
+                self.dynamic_element['type'] = 'spiral'
+                if self.dynamic_element_was_added == True:
+                    self.update_dynamic_spiral(self.dynamic_element['end_point'])
             else:
                 self.dynamic_element['type'] = 'line'
 
@@ -109,4 +117,23 @@ class DrawCurveBase(bpy.types.Operator):
 
         return {'RUNNING_MODAL'}
 
-    
\ No newline at end of file
+    
+
+    def update_dynamic_spiral(self, end_point):
+        '''
+        更新dynamic元素（spiral），使其经过end_point。spiral起始点处的曲率等于前一个元素结束点处的曲率。
+        '''
+        pre_element = self.reference_line_elements[len(self.reference_line_elements) - 2]
+        start_curvature = basic_element_utils.get_element_end_curvature(pre_element)
+        spiral_parameters = basic_element_utils.fit_spiral_to_end_point(self.dynamic_element['start_point'],
+                                                                        self.dynamic_element['start_tangent'],
+                                                                        start_curvature,
+                                                                        end_point)
+        if spiral_parameters is None: # 求解失败时（比如end_point位于起始点后方），退化为曲率不变的spiral。
+            spiral_parameters = (start_curvature, max(dist(self.dynamic_element['start_point'], end_point), 0.0001))
+
+        self.dynamic_element['start_curvature'] = start_curvature
+        self.dynamic_element['end_curvature'] = spiral_parameters[0]
+        self.dynamic_element['spiral_length'] = spiral_parameters[1]
+        self.dynamic_element['lateral_offset'] = 0.0
+        basic_element_utils.update_spiral_geometry_info(self.dynamic_element)
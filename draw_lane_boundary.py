@@ -24,8 +24,8 @@ class DrawLaneBoundary(bpy.types.Operator):
 
         vertex_index = -1
 
-        left_dotted_curve = basic_element_utils.generate_new_curve_by_offset(dotted_curve, 0.2, 'left')
-        right_dotted_curve = basic_element_utils.generate_new_curve_by_offset(dotted_curve, 0.2, 'right')
+        left_dotted_curve = basic_element_utils.OffsetCurve(dotted_curve, 0.2, 'left')
+        right_dotted_curve = basic_element_utils.OffsetCurve(dotted_curve, 0.2, 'right')
 
         for index in range(0, len(dotted_curve)):
             left_element = left_dotted_curve[index]
@@ -40,9 +40,10 @@ class DrawLaneBoundary(bpy.types.Operator):
                 vertex_index += 4
                 faces.append((vertex_index-3, vertex_index-2, vertex_index-1, vertex_index))
 
-            elif left_element['type'] == 'arc':
-                left_vertices = basic_element_utils.generate_vertices_from_arc(left_element)
-                right_vertices = basic_element_utils.generate_vertices_from_arc(right_element)
+            else: # arc、spiral或parampoly3。
+                divisions = max(basic_element_utils.get_element_divisions(left_element), basic_element_utils.get_element_divisions(right_element)) # 左右两侧的element分成相同的段数，使顶点一一对应。
+                left_vertices = basic_element_utils.generate_vertices_from_element(left_element, divisions)
+                right_vertices = basic_element_utils.generate_vertices_from_element(right_element, divisions)
 
                 left_pre_index = 0
                 left_current_index = 0
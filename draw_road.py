@@ -1,11 +1,13 @@
 import bpy
 import bmesh
+import copy
 from mathutils import Vector, Matrix, geometry
 from math import fabs, dist, acos
 
 from . import helpers
 from .utils import basic_element_utils
 from .utils import road_utils
+from .utils import cubic_curve_fitting_utils
 from .utils import draw_utils
 from . import map_scene_data
 from . draw_curve_base import DrawCurveBase
@@ -46,8 +48,8 @@ class DrawRoad(DrawCurveBase):
         map_scene_data.set_road_data(self.road_id, road_data) # 把当前道路信息保存到全局map中。
 
     def create_road_reference_line(self, context):
-        left_side_curve = basic_element_utils.generate_new_curve_by_offset(self.reference_line_elements, 0.1, 'left')
-        right_side_curve = basic_element_utils.generate_new_curve_by_offset(self.reference_line_elements, 0.1, 'right')
+        left_side_curve = basic_element_utils.OffsetCurve(self.reference_line_elements, 0.1, 'left')
+        right_side_curve = basic_element_utils.OffsetCurve(self.reference_line_elements, 0.1, 'right')
         mesh = road_utils.create_band_mesh(left_side_curve, right_side_curve)
         object_name = 'reference_line_object_' + str(self.road_id) # 一条道路对应一条道路参考线。
         object = bpy.data.objects.new(object_name, mesh)
@@ -87,8 +89,8 @@ class DrawRoad(DrawCurveBase):
 
         helpers.select_activate_object(context, self.road_object)
 
-    def update_default_road(self):
-        self.update_default_lane_section()
+    def update_default_road(self, trim_folds=False):
+        self.update_default_lane_section(trim_folds)
 
         # 更新1车道在场景中的object实物。
         lane_object = self.lane_to_object_map[(0, 1)]
@@ -120,18 +122,24 @@ class DrawRoad(DrawCurveBase):
         default_lane_section = road_utils.create_lane_section(self.reference_line_elements)
         self.lane_sections.append(default_lane_section)
 
-    def update_default_lane_section(self):
+    def update_default_lane_section(self, trim_folds=False):
         '''
         reference_line_elements发生了更新， 1车道和-1车道随之更新。
+        1车道和-1车道的边界是reference_line_elements的OffsetCurve视图，随reference_line_elements自动更新，只需更新宽度拟合分段和拟合系数。
+        绘制过程中不剪除边界的折叠部分，trim_folds为True时（道路绘制完成）才剪除（见basic_element_utils.trim_offset_curve）。
         '''
-        self.lane_sections[0]['left_most_lane_index'] = 0
-        self.lane_sections[0]['right_most_lane_index'] = 0
+        lane_section = self.lane_sections[0]
+        center_lane = lane_section['lanes'][0]['boundary_curve_elements']
 
-        del self.lane_sections[0]['lanes'][1] # 删除当前1车道
-        del self.lane_sections[0]['lanes'][-1] # 删除当前-1车道
+        for lane_id, direction in ((1, 'left'), (-1, 'right')):
+            lane = lane_section['lanes'][lane_id]
+            if not isinstance(lane['boundary_curve_elements'], basic_element_utils.OffsetCurve): # 创建车道时被剪除了折叠部分，恢复为视图。
+                lane['boundary_curve_elements'] = basic_element_utils.OffsetCurve(center_lane, 3, direction)
+            if trim_folds:
+                lane['boundary_curve_elements'], _ = basic_element_utils.trim_offset_curve(lane['boundary_curve_elements'])
 
-        road_utils.add_lane(self.lane_sections[0], 'left') # 添加1车道
-        road_utils.add_lane(self.lane_sections[0], 'right') # 添加-1车道
+            lane['curve_fit_sections'] = [copy.deepcopy(center_lane)] # dynamic元素会被原地修改，拟合分段必须使用副本。
+            cubic_curve_fitting_utils.update_cubic_curve_factors(lane_section, lane_id)
 
     def modal(self, context, event):
         context.workspace.status_text_set("xxx")
@@ -159,7 +167,7 @@ class DrawRoad(DrawCurveBase):
                 self.remove_default_road()
             elif elements_number > 1:
                 self.reference_line_elements.pop() # 弹出无效的dynamic element。
-                self.update_default_road()
+                self.update_default_road(trim_folds=True)
 
                 self.reference_line_sections.append(self.reference_line_elements)
                 self.create_road_reference_line(context)
@@ -21,7 +21,9 @@ class ExportOpenDriveMap(bpy.types.Operator):
         return context.area.type == 'VIEW_3D'
 
     def execute(self, context): 
-        export_import_utils.export_open_drive_map(self.filepath)
+        parallel_error = export_import_utils.export_open_drive_map(self.filepath)
+        if parallel_error is not None:
+            self.report({'WARNING'}, '并行拟合车道宽度失败，已改为在当前进程中拟合：' + repr(parallel_error))
 
         return {'FINISHED'}
 
@@ -1,5 +1,6 @@
 road_id = 0
 road_map = {}
+map_origin = (0.0, 0.0, 0.0) # 地图局部坐标系的原点在世界坐标系（比如UTM坐标系）中的坐标，用双精度浮点数保存。场景中的几何数据都是局部坐标。
 
 
 def generate_road_id():
@@ -20,4 +21,9 @@ def get_road_data(id):
 def get_map_data():
     return road_map
 
+def set_map_origin(origin):
+    global map_origin
+    map_origin = (float(origin[0]), float(origin[1]), float(origin[2]))
 
+def get_map_origin():
+    return map_origin
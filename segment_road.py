@@ -20,8 +20,7 @@ class SegmentRoad(bpy.types.Operator):
         self.selected_road_id = None # 当前选中的road的id。
 
         self.projected_point = None # 记当前光标位置raycast到xy平面上的点为 raycast_point， projected_point即为raycast_point投影到道路参考线上的点的坐标。
-        self.pre_section = None
-        self.next_section = None
+        self.last_reference_line_section_spatial_index = None # 最后一个道路参考线分段的空间索引，分段情况变化时重新生成。
 
     def refresh_segmenting(self, context):
         '''
@@ -40,6 +39,8 @@ class SegmentRoad(bpy.types.Operator):
 
         lane_sections.clear()
 
+        self.last_reference_line_section_spatial_index = None
+
         for index in range(0, len(reference_line_sections)):
             lane_section = road_utils.create_lane_section(reference_line_sections[index])
             lane_sections.append(lane_section)
@@ -98,8 +99,10 @@ class SegmentRoad(bpy.types.Operator):
                 road_data = map_scene_data.get_road_data(self.selected_road_id)
                 reference_line_sections = road_data['reference_line_sections']
                 last_reference_line_section = reference_line_sections[len(reference_line_sections) - 1] # 道路分段总是对最后一个lane section进行分段。
-                # 如果分段成功，projected_point不为None，最后一个lane section被分成 pre_section和 next_section。
-                self.projected_point, self.pre_section, self.next_section = basic_element_utils.split_reference_line_segment(last_reference_line_section, raycast_point)
+                if self.last_reference_line_section_spatial_index is None:
+                    self.last_reference_line_section_spatial_index = basic_element_utils.build_curve_spatial_index(last_reference_line_section)
+                # 光标移动时只定位投影点，确定分段时才分割道路参考线。
+                self.projected_point, _ = basic_element_utils.project_point_onto_curve(last_reference_line_section, raycast_point, self.last_reference_line_section_spatial_index)
 
                 if self.projected_point != None:
                     self.draw_segmenting_line(raycast_point, self.projected_point)
@@ -117,10 +120,12 @@ class SegmentRoad(bpy.types.Operator):
                 if self.projected_point != None:
                     road_data = map_scene_data.get_road_data(self.selected_road_id)
                     reference_line_sections = road_data['reference_line_sections']
+                    # 最后一个lane section被分成 pre_section和 next_section。
+                    _, pre_section, next_section = basic_element_utils.split_reference_line_segment(reference_line_sections[len(reference_line_sections) - 1], self.projected_point, self.last_reference_line_section_spatial_index)
                     # 删除最后一个lane section，并添加分段得到的两个lane sections。
                     reference_line_sections.pop() 
-                    reference_line_sections.append(self.pre_section) 
-                    reference_line_sections.append(self.next_section)
+                    reference_line_sections.append(pre_section) 
+                    reference_line_sections.append(next_section)
 
                     self.refresh_segmenting(context)
 
@@ -0,0 +1,34 @@
+import bpy
+from bpy.props import FloatProperty
+
+from .utils import basic_element_utils
+from .utils import road_utils
+
+from . import map_scene_data
+
+
+
+class SimplifyMapCurves(bpy.types.Operator):
+    bl_idname = 'dsc.simplify_map_curves'
+    bl_label = '简化地图曲线'
+    bl_options = {'REGISTER', 'UNDO'}
+
+    tolerance: FloatProperty(
+        name='允许偏差',
+        default=basic_element_utils.simplify_curve_tolerance,
+        min=0.0,
+        precision=4,
+        unit='LENGTH')
+
+    @classmethod
+    def poll(cls, context):
+        return context.area.type == 'VIEW_3D'
+
+    def execute(self, context):
+        '''
+        合并地图中所有curve的冗余element，合并前后curve的几何形状在允许偏差内不变，因此不需要重建车道object实物。
+        '''
+        removed_element_count = road_utils.simplify_map_curves(map_scene_data.get_map_data(), self.tolerance)
+        self.report({'INFO'}, '共合并或删除了' + str(removed_element_count) + '个element。')
+
+        return {'FINISHED'}
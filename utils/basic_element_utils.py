@@ -1,30 +1,117 @@
 import math
 import bpy
-import copy
+import numpy as np
+
+from bisect import bisect_left
 
 
 from mathutils import geometry, Vector, Matrix
-from math import acos, ceil, pi, radians, dist
+from math import acos, atan2, ceil, fabs, pi, radians, dist
 from numpy import deg2rad
 
+from . import curve_array_utils
 from . import draw_utils
 from . import math_utils
 from . import road_utils
 
 
+arc_tessellation_tolerance = 0.02 # 用线段近似arc时允许的最大弦高（米）。
+arc_tessellation_max_divisions = 360 # 用线段近似arc时最多分成的段数。
+simplify_curve_tolerance = 0.001 # simplify_curve合并element时允许的最大偏差（米）。
+arc_min_curvature = 0.00001 # 小于该曲率（即半径大于100000米）的arc退化为直线。
 
-def generate_new_curve_by_offset(curve, offset, direction):
+
+class CurveElement:
     '''
-    把curve中的elements朝direction方向偏移offset的距离，产生新的elements。
+    道路参考线、车道边界等curve的构成元素（line、arc、spiral或parampoly3），用__slots__保存element信息以节省内存，
+    同时支持element['start_point']形式的字典式访问，因此可以和只包含相同key的dict互换使用。
+    start_tangent和end_tangent被冻结为不可修改的Vector，copy()和copy.deepcopy()产生的element与原element共享这些tangent。
+    center_point、radius、curvature、sweep_radian、length是arc几何信息的缓存（见update_arc_geometry_info），
+    通过字典式访问修改type、start_point、start_tangent或end_point后，缓存自动失效。
+    spiral是与一条回旋线（clothoid，曲率沿 s 线性变化）保持lateral_offset距离（向左为正）的曲线，道路参考线上的spiral的lateral_offset为0，
+    由spiral偏移得到的车道边界只改变lateral_offset，回旋线不变。回旋线的起始曲率、结束曲率和长度分别保存在start_curvature、end_curvature、spiral_length中，
+    spiral由start_point、start_tangent和这些参数确定，end_point和end_tangent由update_spiral_geometry_info计算。
+    parampoly3与spiral类似，是与一条三次参数多项式曲线保持lateral_offset距离的曲线，poly_coefficients是OpenDRIVE paramPoly3标准形式
+    （au = av = bv = 0，p的范围为[0, 1]）的8个系数，局部坐标系的u轴沿多项式曲线的起始切线方向；arc_length_table是弧长参数化表的缓存。
+    '''
+    __slots__ = ('type', 'start_point', 'start_tangent', 'end_point', 'end_tangent', 'center_point', 'radius', 'curvature', 'sweep_radian', 'length',
+        'start_curvature', 'end_curvature', 'spiral_length', 'lateral_offset', 'poly_coefficients', 'arc_length_table')
+
+    geometry_keys = frozenset(('type', 'start_point', 'start_tangent', 'end_point', 'poly_coefficients'))
+    cached_keys = ('center_point', 'radius', 'curvature', 'sweep_radian', 'length', 'arc_length_table')
+
+    def __init__(self, type=None, start_point=None, start_tangent=None, end_point=None, end_tangent=None):
+        self.type = type
+        self.start_point = start_point
+        self['start_tangent'] = start_tangent
+        self.end_point = end_point
+        self['end_tangent'] = end_tangent
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if (key == 'start_tangent' or key == 'end_tangent') and value is not None and not value.is_frozen:
+            value = value.copy().freeze() # 冻结的tangent可以在element之间安全共享。
+
+        setattr(self, key, value)
+
+        if key in CurveElement.geometry_keys:
+            self.clear_cached_geometry_info()
+
+    def clear_cached_geometry_info(self):
+        for cached_key in CurveElement.cached_keys:
+            if hasattr(self, cached_key):
+                delattr(self, cached_key)
+
+    def __contains__(self, key):
+        return key in CurveElement.__slots__ and hasattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default) if key in CurveElement.__slots__ else default
+
+    def keys(self):
+        return [key for key in CurveElement.__slots__ if hasattr(self, key)]
+
+    def copy(self):
+        '''
+        浅复制，新element和原element共享point和tangent。
+        '''
+        new_element = CurveElement.__new__(CurveElement)
+        for key in CurveElement.__slots__:
+            value = getattr(self, key, self)
+            if value is not self:
+                setattr(new_element, key, value)
+
+        return new_element
+
+    def __deepcopy__(self, memo):
+        '''
+        point被复制，冻结的tangent被共享。
+        '''
+        new_element = self.copy()
+        if self.start_point is not None:
+            new_element.start_point = self.start_point.copy()
+        if self.end_point is not None:
+            new_element.end_point = self.end_point.copy()
+
+        return new_element
+
+    def __repr__(self):
+        return 'CurveElement(' + ', '.join(key + '=' + repr(getattr(self, key)) for key in self.keys()) + ')'
+
+def generate_new_element_by_offset(element, offset):
+    '''
+    把element朝左侧偏移offset的距离（offset为负时朝右侧偏移），产生新的element。
     '''
     def generate_new_point(origin, tangent):
         normal_vector_of_xy_plane = Vector((0.0, 0.0, 1.0))
         normal_vector = normal_vector_of_xy_plane.cross(tangent).normalized()
         math_utils.vector_scale_ref(normal_vector, offset)
 
-        if direction == 'right':
-            normal_vector.negate()
-
         new_point = Vector((0.0, 0.0, 0.0))
         new_point[0] = origin[0] + normal_vector[0]
         new_point[1] = origin[1] + normal_vector[1]
@@ -32,186 +119,486 @@ def generate_new_curve_by_offset(curve, offset, direction):
 
         return new_point
 
-    new_curve = []
-    for element in curve:
-        new_element = {}
+    new_element = CurveElement()
 
-        if element['type'] == 'line':
-            new_element['type'] = 'line'
-            new_element['start_point'] = generate_new_point(element['start_point'], element['start_tangent'])
+    if element['type'] == 'line':
+        new_element['type'] = 'line'
+        new_element['start_point'] = generate_new_point(element['start_point'], element['start_tangent'])
 
-            new_element['start_tangent'] = element['start_tangent']
-            new_element['end_point'] = generate_new_point(element['end_point'], element['end_tangent'])
+        new_element['start_tangent'] = element['start_tangent']
+        new_element['end_point'] = generate_new_point(element['end_point'], element['end_tangent'])
 
-            new_element['end_tangent'] = element['end_tangent']
-        elif element['type'] == 'arc':
-            new_element['type'] = 'arc'
-            new_element['start_point'] = generate_new_point(element['start_point'], element['start_tangent'])
+        new_element['end_tangent'] = element['end_tangent']
+    elif element['type'] == 'arc':
+        new_element['type'] = 'arc'
+        new_element['start_point'] = generate_new_point(element['start_point'], element['start_tangent'])
+
+        new_element['start_tangent'] = element['start_tangent']
+        new_element['end_point'] = generate_new_point(element['end_point'], element['end_tangent'])
+
+        new_element['end_tangent'] = element['end_tangent']
+
+        update_arc_geometry_info(new_element)
+    elif element['type'] == 'spiral':
+        new_element['type'] = 'spiral'
+        new_element['start_point'] = generate_new_point(element['start_point'], element['start_tangent'])
+        new_element['start_tangent'] = element['start_tangent']
+        new_element['end_point'] = generate_new_point(element['end_point'], element['end_tangent'])
+        new_element['end_tangent'] = element['end_tangent']
+
+        new_element['start_curvature'] = element['start_curvature']
+        new_element['end_curvature'] = element['end_curvature']
+        new_element['spiral_length'] = element['spiral_length']
+        new_element['lateral_offset'] = element['lateral_offset'] + offset
+    elif element['type'] == 'parampoly3':
+        new_element['type'] = 'parampoly3'
+        new_element['start_point'] = generate_new_point(element['start_point'], element['start_tangent'])
+        new_element['start_tangent'] = element['start_tangent']
+        new_element['end_point'] = generate_new_point(element['end_point'], element['end_tangent'])
+        new_element['end_tangent'] = element['end_tangent']
+
+        new_element['poly_coefficients'] = element['poly_coefficients']
+        new_element['lateral_offset'] = element['lateral_offset'] + offset
+        if 'arc_length_table' in element: # 弧长参数化表只与多项式曲线有关，偏移后可以共享。
+            new_element['arc_length_table'] = element['arc_length_table']
+
+    return new_element
 
-            new_element['start_tangent'] = element['start_tangent']
-            new_element['end_point'] = generate_new_point(element['end_point'], element['end_tangent'])
+def generate_new_curve_by_offset(curve, offset, direction):
+    '''
+    把curve中的elements朝direction方向偏移offset的距离，产生新的elements。
+    只读取偏移结果时，应使用不复制element的OffsetCurve。
+    '''
+    if direction == 'right':
+        offset = -offset
 
-            new_element['end_tangent'] = element['end_tangent']
-    
-        new_curve.append(new_element)
+    return [generate_new_element_by_offset(element, offset) for element in curve]
 
-    return new_curve
+
+class OffsetCurve:
+    '''
+    把base_curve朝direction方向偏移offset的距离得到的curve的惰性视图，只保存base_curve和带符号的偏移量（向左为正），
+    按下标访问或遍历时才由base_curve中对应的element生成偏移后的element，生成的element不被缓存，因此不占用内存，
+    base_curve被原地修改（比如绘制道路时的dynamic元素）后视图随之变化。对OffsetCurve再偏移时，直接偏移其base_curve，偏移量相加。
+    视图是只读的：需要单独修改偏移得到的curve时（比如调整车道边界），用materialize()生成element列表，或直接用新的element列表替换视图。
+    '''
+    __slots__ = ('base_curve', 'offset')
+
+    def __init__(self, base_curve, offset, direction='left'):
+        if direction == 'right':
+            offset = -offset
+        if isinstance(base_curve, OffsetCurve):
+            offset += base_curve.offset
+            base_curve = base_curve.base_curve
+
+        self.base_curve = base_curve
+        self.offset = offset
+
+    def __len__(self):
+        return len(self.base_curve)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [generate_new_element_by_offset(element, self.offset) for element in self.base_curve[index]]
+
+        return generate_new_element_by_offset(self.base_curve[index], self.offset)
+
+    def __iter__(self):
+        for element in self.base_curve:
+            yield generate_new_element_by_offset(element, self.offset)
+
+    def materialize(self):
+        return list(self)
+
+    def __repr__(self):
+        return 'OffsetCurve(offset=' + repr(self.offset) + ', base_curve=' + repr(self.base_curve) + ')'
+
+def split_curve_at(curve, s_values, length_index=None):
+    '''
+    沿curve只遍历一次，在s_values（从小到大排列）中的每个 s 坐标处把curve切开，返回由len(s_values) + 1段curve组成的列表，curve本身不被修改。
+    整个位于某一段内的element直接引用，被切开的element在每一段上截取的部分分别生成新的element（见get_sub_element_by_distance）。
+    切点与element端点的距离小于0.000001时不切开该element；切点超出curve范围或两个切点重合时，对应的一段为空列表。
+    length_index是curve的累计长度表。
+    '''
+    if length_index is None:
+        length_index = build_curve_length_index(curve)
+
+    pieces = [[]]
+    cut_index = 0
+    for element_index, element in enumerate(curve):
+        element_start = length_index[element_index]
+        element_length = length_index[element_index + 1] - element_start
+
+        local_start = 0.0
+        while cut_index < len(s_values) and s_values[cut_index] - element_start < element_length - 0.000001:
+            local_end = max(s_values[cut_index] - element_start, local_start)
+            if local_end - local_start > 0.000001:
+                pieces[-1].append(get_sub_element_by_distance(element, local_start, local_end))
+            pieces.append([])
+            local_start = local_end
+            cut_index += 1
+
+        if element_length - local_start > 0.000001:
+            if local_start < 0.000001:
+                pieces[-1].append(element)
+            else:
+                pieces[-1].append(get_sub_element_by_distance(element, local_start, element_length))
+
+    pieces.extend([] for _ in range(len(s_values) - cut_index)) # 位于curve终点之后的切点。
+
+    return pieces
+
+def move_split_distances_off_joints(length_index, split_distances, clearance=0.001):
+    '''
+    把与element连接点的距离小于clearance的分段位置移到相邻的较长element内部，与连接点相距clearance（element太短时取其中点）。
+    split_reference_line_segment总是在一个element内部分割，分割得到的两段curve首尾element是同一个element的两部分，之后可以由merge_split_elements合并；
+    用split_curve_at分段前调用本函数，分段结果也满足这一点。返回新的分段位置列表。
+    '''
+    moved_distances = []
+    for split_distance in split_distances:
+        joint_index = min(max(bisect_left(length_index, split_distance), 1), len(length_index) - 2) # 距离split_distance最近的连接点是joint_index或joint_index - 1。
+        if joint_index > 1 and split_distance - length_index[joint_index - 1] < length_index[joint_index] - split_distance:
+            joint_index -= 1
+
+        joint_distance = length_index[joint_index]
+        if 0 < joint_index < len(length_index) - 1 and fabs(split_distance - joint_distance) < clearance:
+            pre_element_length = joint_distance - length_index[joint_index - 1]
+            next_element_length = length_index[joint_index + 1] - joint_distance
+            if pre_element_length >= next_element_length:
+                split_distance = joint_distance - min(clearance, pre_element_length / 2)
+            else:
+                split_distance = joint_distance + min(clearance, next_element_length / 2)
+
+        moved_distances.append(split_distance)
+
+    return moved_distances
+
+def trim_offset_curve(curve):
+    '''
+    剪除偏移曲线中因曲率半径小于偏移距离而反向折叠的部分及其两侧的自相交环，见CurveArray.get_offset_fold_spans。
+    curve不是OffsetCurve时不做处理。返回(trimmed_curve, fold_spans)，fold_spans是被剪除部分在base_curve上的 s 区间列表；
+    没有需要剪除的部分时trimmed_curve就是curve本身，否则是剪除后的element列表，相邻的保留部分在自相交点处相连。
+    整条curve都反向时无法剪除，curve原样返回，只通过fold_spans标记。
+    '''
+    if not isinstance(curve, OffsetCurve) or len(curve) == 0:
+        return curve, []
+
+    base_curve_array = curve_to_curve_array(curve.base_curve)
+    fold_spans = base_curve_array.get_offset_fold_spans(curve.offset)
+    if len(fold_spans) == 0:
+        return curve, []
+
+    # 在所有反向区间的端点处切开base_curve，偶数段保留，奇数段是反向区间。
+    kept_pieces = split_curve_at(curve.base_curve, fold_spans.ravel().tolist(), list(base_curve_array.length_index))[0::2]
+    fold_spans = [(float(start), float(end)) for start, end in fold_spans]
+    if all(len(piece) == 0 for piece in kept_pieces):
+        return curve, fold_spans
+
+    trimmed_curve = [generate_new_element_by_offset(element, curve.offset) for piece in kept_pieces for element in piece]
+
+    return trimmed_curve, fold_spans
+
+def generate_dash_intervals(curve_length, dash_size, gap_size):
+    '''
+    依次产生虚线中每段dash在curve上的 s 坐标区间(dash_start, dash_end)，最后一段dash可能不足dash_size。
+    dash_size不大于0时不产生dash；gap_size不大于0时虚线退化为实线，只产生一段覆盖整条curve的dash。
+    '''
+    if dash_size <= 0 or curve_length <= 0.001:
+        return
+    if gap_size <= 0:
+        yield 0.0, curve_length
+        return
+
+    dash_start = 0.0
+    while curve_length - dash_start > 0.001:
+        yield dash_start, min(dash_start + dash_size, curve_length)
+        dash_start += dash_size + gap_size
+
+def get_sub_element_by_distance(element, start_distance, end_distance):
+    '''
+    截取element上距离其起始点start_distance到end_distance之间的部分，产生新的element，element本身不被修改。
+    '''
+    if element['type'] == 'spiral':
+        start_base_distance = get_spiral_base_distance(element, start_distance)
+        end_base_distance = get_spiral_base_distance(element, end_distance)
+        return create_spiral_element(get_point_on_spiral_by_distance(element, start_distance),
+            get_tangent_on_spiral_by_distance(element, start_distance),
+            element['start_curvature'] + get_spiral_curvature_rate(element) * start_base_distance,
+            element['start_curvature'] + get_spiral_curvature_rate(element) * end_base_distance,
+            end_base_distance - start_base_distance,
+            element['lateral_offset'])
+
+    if element['type'] == 'parampoly3':
+        start_parameter, end_parameter = get_parampoly3_parameters_by_distances(element, [start_distance, end_distance])
+        pre_coefficients, _ = curve_array_utils.split_parampoly3_coefficients(np.array(element['poly_coefficients']), end_parameter)
+        _, sub_coefficients = curve_array_utils.split_parampoly3_coefficients(pre_coefficients, start_parameter / end_parameter)
+        return create_parampoly3_element(get_point_on_parampoly3_by_distance(element, start_distance),
+            get_tangent_on_parampoly3_by_distance(element, start_distance),
+            curve_array_utils.normalize_parampoly3_coefficients(sub_coefficients),
+            element['lateral_offset'])
+
+    if element['type'] == 'line' or get_arc_curvature(element) == 0: # 退化为直线的arc按line截取。
+        return CurveElement(type=element['type'],
+            start_point=get_point_on_line_by_distance(element, start_distance),
+            start_tangent=element['start_tangent'],
+            end_point=get_point_on_line_by_distance(element, end_distance),
+            end_tangent=element['end_tangent'])
+
+    sub_element = CurveElement(type='arc',
+        start_point=get_point_on_arc_by_distance(element, start_distance),
+        start_tangent=get_tangent_on_arc_by_distance(element, start_distance),
+        end_point=get_point_on_arc_by_distance(element, end_distance),
+        end_tangent=get_tangent_on_arc_by_distance(element, end_distance))
+    update_arc_geometry_info(sub_element)
+
+    return sub_element
+
+def iterate_dotted_curve_elements(solid_curve, dash_size, gap_size):
+    '''
+    按generate_dash_intervals产生的dash区间依次产生构成虚线的elements，solid_curve既不被复制也不被修改。
+    dash区间和solid_curve的element都按 s 坐标从小到大排列，因此只需沿solid_curve向前推进，不回头查找。
+    一段dash跨越多个element时，在每个element上截取的部分分别作为一个element产生；element整个位于dash中时直接产生该element本身。
+    '''
+    if isinstance(solid_curve, OffsetCurve): # 一个element可能与多段dash重叠，先生成一次element列表，避免重复生成偏移后的element。
+        solid_curve = solid_curve.materialize()
+
+    length_index = build_curve_length_index(solid_curve)
+    first_element_index = 0
+
+    for dash_start, dash_end in generate_dash_intervals(length_index[-1], dash_size, gap_size):
+        while length_index[first_element_index + 1] <= dash_start: # 跳过在当前dash之前结束的element。
+            first_element_index += 1
+
+        element_index = first_element_index
+        while element_index < len(solid_curve) and length_index[element_index] < dash_end:
+            element = solid_curve[element_index]
+            element_start = length_index[element_index]
+            element_length = length_index[element_index + 1] - element_start
+            local_start = max(dash_start - element_start, 0.0)
+            local_end = min(dash_end - element_start, element_length)
+
+            if local_end - local_start > 0.001:
+                if local_start < 0.001 and local_end > element_length - 0.001:
+                    yield element
+                else:
+                    yield get_sub_element_by_distance(element, local_start, local_end)
+
+            element_index += 1
 
 def generate_dotted_curve_from_solid_curve(solid_curve, dash_size, gap_size):
     '''
     solid_curve中的element的空间位置是前后相连的，本函数根据dash_size和gap_size从solid_curve的elements中截取出新的elements，
     这些elements并不保证空间位置前后相连，以实现虚边界线的绘制。
     '''
-    dotted_curve = []
-
-    is_generating_dash = True
-
-    copyed_solid_curve = copy.deepcopy(solid_curve) # 为了不改变solid_curve中的数据，产生一个副本。 
-    copyed_dash_size = dash_size
-    copyed_gap_size = gap_size
-
-    while len(copyed_solid_curve) > 0:
-        element = copyed_solid_curve[0] # 每次都从copyed_solid_curve中的第一个element开始截取。
-
-        if is_generating_dash == True: # 截取dash的逻辑。
-            element_length = 0
-            pre_element = None
-            next_element = None
-
-            if element['type'] == 'line': # 当前是在line element上截取。
-                element_length = dist(element['start_point'], element['end_point'])
-                # 当前元素的长度大于要截取的dash的长度，把当前元素一分为二，其中pre_element的长度和要截取的dash的长度相等。
-                if element_length > copyed_dash_size: 
-                    split_point = get_point_on_line_by_distance(element, copyed_dash_size)
-                    pre_element, next_element = split_line(element, split_point)
-
-            elif element['type'] == 'arc':  # 当前是在arc element上截取。
-                center_point, arc_radian, arc_radius = get_arc_geometry_info(element)
-                element_length = arc_radian * arc_radius
-                if element_length > copyed_dash_size:
-                    split_point = get_point_on_arc_by_distance(element, copyed_dash_size)
-                    pre_element, next_element = split_arc(element, split_point)
-
-            if element_length > copyed_dash_size: # 当前元素的长度大于要截取的dash的长度，当前元素足够完成dash的截取。
-                dotted_curve.append(pre_element) # pre_element即为要截取的element。
-                copyed_solid_curve.pop(0) # 从copyed_solid_curve中删除当前element。
-                copyed_solid_curve.insert(0, next_element) # 把截取剩下的element插到copyed_solid_curve的前面，成为被截取element。
-
-                is_generating_dash = not is_generating_dash
-                copyed_dash_size = dash_size
-            else: # 当前元素的长度小于要截取的dash的长度，截取当前element全长，不足dash长度的部分从后面的element中截取。
-                dotted_curve.append(element)
-                copyed_solid_curve.pop(0)
-
-                copyed_dash_size -= element_length # dash剩余需要截取的长度。
-                if copyed_dash_size < 0.001:
-                    is_generating_dash = not is_generating_dash
-                    copyed_dash_size = dash_size
-        else: # 截取gap的逻辑。
-            element_length = 0
-            pre_element = None
-            next_element = None
-
-            if element['type'] == 'line':
-                element_length = dist(element['start_point'], element['end_point'])
-                if element_length > copyed_gap_size:
-                    split_point = get_point_on_line_by_distance(element, copyed_gap_size)
-                    pre_element, next_element = split_line(element, split_point)
-            elif element['type'] == 'arc':
-                center_point, arc_radian, arc_radius = get_arc_geometry_info(element)
-                element_length = arc_radian * arc_radius
-                if element_length > copyed_gap_size:
-                    split_point = get_point_on_arc_by_distance(element, copyed_gap_size)
-                    pre_element, next_element = split_arc(element, split_point)
-
-            if element_length > copyed_gap_size:
-                copyed_solid_curve.pop(0)
-                copyed_solid_curve.insert(0, next_element)
-
-                is_generating_dash = not is_generating_dash
-                copyed_gap_size = gap_size
-            else:
-                copyed_solid_curve.pop(0)
-
-                copyed_gap_size -= element_length
-                if copyed_gap_size < 0.001:
-                    is_generating_dash = not is_generating_dash
-                    copyed_gap_size = gap_size
+    return list(iterate_dotted_curve_elements(solid_curve, dash_size, gap_size))
 
-    return dotted_curve
-        
-def generate_vertices_from_curve_elements(curve_elements):
+def generate_vertices_from_curve_elements(curve_elements, element_divisions=None):
     '''
     从elements生成顶点，用于创建mesh。
+    element_divisions[i]不为None时，第i个element被分成element_divisions[i]段，见get_paired_element_divisions。
     '''
     vertices = []
-    for element in curve_elements:
-        if element['type'] == 'line':
-            vertices.append(element['start_point'].copy())
-            vertices.append(element['end_point'].copy())
-        elif element['type'] == 'arc':
-            arc_vertices = generate_vertices_from_arc(element)
-            vertices.extend(arc_vertices)
+    for index, element in enumerate(curve_elements):
+        vertices.extend(generate_vertices_from_element(element, None if element_divisions is None else element_divisions[index]))
     return vertices
 
-def generate_vertices_from_arc(arc):
+def generate_vertices_from_element(element, divisions=None):
+    if element['type'] == 'line':
+        return [element['start_point'].copy(), element['end_point'].copy()]
+    elif element['type'] == 'arc':
+        return generate_vertices_from_arc(element, divisions)
+    elif element['type'] == 'spiral':
+        return generate_vertices_from_spiral(element, divisions)
+    elif element['type'] == 'parampoly3':
+        return generate_vertices_from_parampoly3(element, divisions)
+
+def get_element_divisions(element):
     '''
-    按照一定的弧度角间距在arc上生成顶点（比如每隔1°产生一个顶点）。
+    计算用线段近似element时需要分成的段数，见get_arc_divisions、get_spiral_divisions和get_parampoly3_divisions。
     '''
-    vertices = []
+    if element['type'] == 'line':
+        return 1
+    elif element['type'] == 'arc':
+        return get_arc_divisions(element)
+    elif element['type'] == 'spiral':
+        return get_spiral_divisions(element)
+    elif element['type'] == 'parampoly3':
+        return get_parampoly3_divisions(element)
+
+def get_radian_per_division(curvature, tolerance):
+    '''
+    曲率为curvature的圆上，弦高不超过tolerance的弦所对的最大圆心角：半径为R的圆上圆心角为Δ的弦，弦高为 R * (1 - cos(Δ / 2))。
+    '''
+    if tolerance * curvature >= 1:
+        return pi
+    else:
+        return 2 * acos(1 - tolerance * curvature)
 
+def get_arc_divisions(arc, tolerance=arc_tessellation_tolerance, max_divisions=arc_tessellation_max_divisions):
+    '''
+    计算用线段近似arc时需要分成的段数，使每段弦到arc的最大距离（弦高）不超过tolerance，段数不超过max_divisions。
+    '''
     center_point, arc_radian, arc_radius = get_arc_geometry_info(arc)
-    plan_radian_per_division = radians(1)
-    divisions = ceil(arc_radian / plan_radian_per_division)
-    actual_radian_per_division = arc_radian / divisions
+    if center_point is None: # arc退化为直线。
+        return 1
 
-    normal_vector =  arc['start_tangent'].cross(arc['end_tangent'])
-    if normal_vector.z < 0:
-        actual_radian_per_division = -actual_radian_per_division
+    return min(max(ceil(arc_radian / get_radian_per_division(1 / arc_radius, tolerance)), 1), max_divisions)
 
-    vertices.append(arc['start_point'].copy())
+def get_spiral_divisions(spiral, tolerance=arc_tessellation_tolerance, max_divisions=arc_tessellation_max_divisions):
+    '''
+    计算用线段近似spiral时需要分成的段数：顶点沿回旋线等 s 间距分布，每段的转角不超过 最大曲率 * 每段的最大长度，
+    使其不超过最大曲率对应的圆上弦高为tolerance的圆心角（见get_radian_per_division）。
+    曲率 k / (1 - k * t) 和长度缩放系数 1 - k * t 都是回旋线曲率 k 的单调函数，最大值在spiral的首尾取得。
+    '''
+    lateral_offset = spiral['lateral_offset']
+    curvatures = (spiral['start_curvature'], spiral['end_curvature'])
+    max_curvature = max(fabs(curvature / (1 - curvature * lateral_offset)) for curvature in curvatures)
+    if max_curvature == 0:
+        return 1
 
-    current_vector = math_utils.vector_subtract(arc['start_point'], center_point)
-    for i in range(1, divisions):
-        current_vector.rotate(Matrix.Rotation(actual_radian_per_division, 4, 'Z'))
-        current_point = math_utils.vector_add(center_point, current_vector)
-        vertices.append(current_point)
+    max_division_length = max(1 - curvature * lateral_offset for curvature in curvatures) * spiral['spiral_length']
+
+    return min(max(ceil(max_curvature * max_division_length / get_radian_per_division(max_curvature, tolerance)), 1), max_divisions)
 
+def get_parampoly3_divisions(parampoly3, tolerance=arc_tessellation_tolerance, max_divisions=arc_tessellation_max_divisions):
+    '''
+    计算用线段近似parampoly3时需要分成的段数：顶点沿曲线等距分布，最大曲率取弧长参数化表各节点处曲率的最大值，
+    使每段的转角不超过该曲率对应的圆上弦高为tolerance的圆心角。
+    '''
+    table_parameters = np.linspace(0, 1, curve_array_utils.parampoly3_table_size)
+    curvatures = curve_array_utils.get_parampoly3_curvatures(np.tile(parampoly3['poly_coefficients'], (len(table_parameters), 1)), parampoly3['lateral_offset'], table_parameters)
+    max_curvature = float(np.abs(curvatures).max())
+    if max_curvature == 0:
+        return 1
+
+    return min(max(ceil(max_curvature * get_element_length(parampoly3) / get_radian_per_division(max_curvature, tolerance)), 1), max_divisions)
+
+def get_paired_element_divisions(curve_a, curve_b):
+    '''
+    curve_a和curve_b的element一一对应时（比如两条由同一条curve偏移得到的边界），为每对arc、spiral或parampoly3取相同的段数，使两侧生成的顶点一一对应；
+    否则返回None。
+    '''
+    if len(curve_a) != len(curve_b):
+        return None
+
+    element_divisions = []
+    for element_a, element_b in zip(curve_a, curve_b):
+        if element_a['type'] == element_b['type'] and element_a['type'] != 'line':
+            element_divisions.append(max(get_element_divisions(element_a), get_element_divisions(element_b)))
+        else:
+            element_divisions.append(None)
+
+    return element_divisions
+
+def generate_vertices_from_arc(arc, divisions=None):
+    '''
+    在arc上等弧度角间距生成顶点，divisions默认由get_arc_divisions按弦高误差计算。
+    每个顶点的坐标直接由圆心、半径和角度计算，不累积旋转误差。
+    '''
+    center_point, arc_radian, arc_radius = get_arc_geometry_info(arc)
+    if center_point is None: # arc退化为直线。
+        return [arc['start_point'].copy(), arc['end_point'].copy()]
+
+    if divisions is None:
+        divisions = get_arc_divisions(arc)
+    start_angle = atan2(arc['start_point'][1] - center_point[1], arc['start_point'][0] - center_point[0])
+    radian_per_division = arc['sweep_radian'] / divisions
+    height = arc['start_point'][2]
+
+    vertices = [arc['start_point'].copy()]
+    for i in range(1, divisions):
+        angle = start_angle + i * radian_per_division
+        vertices.append(Vector((center_point[0] + arc_radius * math.cos(angle), center_point[1] + arc_radius * math.sin(angle), height)))
     vertices.append(arc['end_point'].copy())
 
     return vertices
 
+def generate_vertices_from_spiral(spiral, divisions=None):
+    '''
+    在spiral上等 s 间距生成顶点，divisions默认由get_spiral_divisions计算。
+    '''
+    if divisions is None:
+        divisions = get_spiral_divisions(spiral)
+
+    positions, _ = get_positions_and_headings_on_spiral_by_base_distances(spiral, np.linspace(0, spiral['spiral_length'], divisions + 1)[1:divisions])
+
+    vertices = [spiral['start_point'].copy()]
+    vertices.extend(Vector(position) for position in positions)
+    vertices.append(spiral['end_point'].copy())
+
+    return vertices
+
+def generate_vertices_from_parampoly3(parampoly3, divisions=None):
+    '''
+    在parampoly3上等距生成顶点，divisions默认由get_parampoly3_divisions计算。
+    '''
+    if divisions is None:
+        divisions = get_parampoly3_divisions(parampoly3)
+
+    parameters = get_parampoly3_parameters_by_distances(parampoly3, np.linspace(0, get_element_length(parampoly3), divisions + 1)[1:divisions])
+    positions, _ = get_positions_and_headings_on_parampoly3_by_parameters(parampoly3, parameters)
+
+    vertices = [parampoly3['start_point'].copy()]
+    vertices.extend(Vector(position) for position in positions)
+    vertices.append(parampoly3['end_point'].copy())
+
+    return vertices
+
+def update_arc_geometry_info(arc_element):
+    '''
+    用闭式解计算arc的圆心点坐标、半径、带符号的曲率、带符号的弧度值和弧长，并缓存在arc_element中。
+    arc的start_point、start_tangent或end_point发生改变后，必须调用本函数更新缓存。
+    '''
+    start_point = arc_element['start_point']
+    start_tangent = arc_element['start_tangent']
+    end_point = arc_element['end_point']
+
+    tangent_length = math.hypot(start_tangent[0], start_tangent[1])
+    tangent_x = start_tangent[0] / tangent_length
+    tangent_y = start_tangent[1] / tangent_length
+    chord_x = end_point[0] - start_point[0]
+    chord_y = end_point[1] - start_point[1]
+    chord_length_squared = chord_x * chord_x + chord_y * chord_y
+
+    cross = tangent_x * chord_y - tangent_y * chord_x # 大于0表示arc向左（逆时针）弯曲，小于0表示向右（顺时针）弯曲。
+    dot = tangent_x * chord_x + tangent_y * chord_y
+
+    curvature = 2 * cross / chord_length_squared if chord_length_squared > 0 else 0.0
+
+    if fabs(curvature) < arc_min_curvature: # 半径超过1 / arc_min_curvature的arc按直线处理，避免圆心远离原点导致float32坐标精度损失。
+        arc_element['center_point'] = None
+        arc_element['radius'] = math.inf
+        arc_element['curvature'] = 0.0
+        arc_element['sweep_radian'] = 0.0
+        arc_element['length'] = math.sqrt(chord_length_squared)
+        return
+
+    sweep_radian = 2 * atan2(cross, dot) # 弦切角的两倍即为圆心角。
+    radius = 1 / fabs(curvature)
+
+    arc_element['center_point'] = Vector((start_point[0] - tangent_y / curvature, start_point[1] + tangent_x / curvature, start_point[2]))
+    arc_element['radius'] = radius
+    arc_element['curvature'] = curvature
+    arc_element['sweep_radian'] = sweep_radian
+    arc_element['length'] = fabs(sweep_radian) * radius
+
 def get_arc_geometry_info(arc_element):
     '''
     获取arc的圆心点坐标，弧度值，半径等信息。
     '''
-    normal_vector_of_xy_plane = Vector((0.0, 0.0, 1.0))
-    infinite_line_multiplier = 10000
-
-    # 计算arc的中心点坐标
-    start_point_to_center_vector = arc_element['start_tangent'].cross(normal_vector_of_xy_plane)
-    start_point_to_center_vector.normalize()
-    math_utils.vector_scale_ref(start_point_to_center_vector, infinite_line_multiplier) 
-    start_point_to_center_vector_end_point = math_utils.vector_add(arc_element['start_point'], start_point_to_center_vector)
-    end_point_to_center_vector = arc_element['end_tangent'].cross(normal_vector_of_xy_plane)
-    end_point_to_center_vector.normalize()
-    math_utils.vector_scale_ref(end_point_to_center_vector, infinite_line_multiplier) 
-    end_point_to_center_vector_end_point = math_utils.vector_add(arc_element['end_point'], end_point_to_center_vector)
-
-    center_point = geometry.intersect_line_line(arc_element['start_point'], 
-                                                start_point_to_center_vector_end_point, 
-                                                arc_element['end_point'], 
-                                                end_point_to_center_vector_end_point)[0]
-    # 计算arc的弧度值
-    middle_point = arc_element['start_point'] + arc_element['end_point']
-    if dist(middle_point, center_point) < 0.000001 : # 当start_point_to_center_vector和end_point_to_center_vector的夹角非常接近pi的时候，acos函数会溢出。
-        arc_radian = pi
-    else:
-        arc_radian =  acos(start_point_to_center_vector.dot(end_point_to_center_vector) / (start_point_to_center_vector.magnitude * end_point_to_center_vector.magnitude))
+    if 'length' not in arc_element:
+        update_arc_geometry_info(arc_element)
+
+    return arc_element['center_point'], fabs(arc_element['sweep_radian']), arc_element['radius']
 
-    arc_radius = math_utils.vector_subtract(arc_element['start_point'], center_point).magnitude
+def get_arc_curvature(arc_element):
+    '''
+    获取arc带符号的曲率，向左弯曲为正，向右弯曲为负。
+    '''
+    if 'length' not in arc_element:
+        update_arc_geometry_info(arc_element)
 
-    return center_point, arc_radian, arc_radius
+    return arc_element['curvature']
 
 def computer_arc_end_tangent(start_point, start_tangent, end_point):
     '''
@@ -235,8 +622,27 @@ def get_element_length(element):
     if element['type'] == 'line':
         return dist(element['start_point'], element['end_point'])
     elif element['type'] == 'arc':
-        center_point, arc_radian, arc_radius = get_arc_geometry_info(element)
-        return arc_radian * arc_radius
+        if 'length' not in element:
+            update_arc_geometry_info(element)
+        return element['length']
+    elif element['type'] == 'spiral':
+        return element['spiral_length'] - element['lateral_offset'] * get_spiral_turning_radian(element)
+    elif element['type'] == 'parampoly3':
+        length_table, heading_table = get_parampoly3_arc_length_table(element)
+        return float(length_table[-1] - element['lateral_offset'] * heading_table[-1])
+
+def get_element_end_curvature(element):
+    '''
+    获取element结束点处带符号的曲率，向左弯曲为正。
+    '''
+    if element['type'] == 'line':
+        return 0.0
+    elif element['type'] == 'arc':
+        return get_arc_curvature(element)
+    elif element['type'] == 'spiral':
+        return element['end_curvature'] / (1 - element['end_curvature'] * element['lateral_offset'])
+    elif element['type'] == 'parampoly3':
+        return float(curve_array_utils.get_parampoly3_curvatures(np.array([element['poly_coefficients']]), element['lateral_offset'], np.ones(1))[0])
 
 def get_point_on_line_by_distance(line, distance):
     '''
@@ -254,11 +660,7 @@ def get_point_on_arc_by_distance(arc, distance):
     获取沿弧线distance远处点的position。
     '''
     center_point, arc_radian, arc_radius = get_arc_geometry_info(arc)
-    radian = distance / arc_radius
-
-    normal_vector =  arc['start_tangent'].cross(arc['end_tangent'])
-    if normal_vector.z < 0:
-        radian = -radian
+    radian = distance * arc['curvature'] # 曲率带符号，向右弯曲时radian为负。
 
     current_vector = math_utils.vector_subtract(arc['start_point'], center_point)
     current_vector.rotate(Matrix.Rotation(radian, 4, 'Z'))
@@ -270,90 +672,490 @@ def get_tangent_on_arc_by_distance(arc, distance):
     '''
     获取沿弧线distance远处点的tangent。
     '''
-    center_point, arc_radian, arc_radius = get_arc_geometry_info(arc)
-    radian = distance / arc_radius
-
-    normal_vector =  arc['start_tangent'].cross(arc['end_tangent'])
-    if normal_vector.z < 0:
-        radian = -radian
+    radian = distance * get_arc_curvature(arc) # 曲率带符号，向右弯曲时radian为负。
 
     result_tangent = arc['start_tangent'].copy()
     result_tangent.rotate(Matrix.Rotation(radian, 4, 'Z'))
 
     return result_tangent 
 
-def get_position_and_tangent_on_curve_by_distance(curve, distance):
-    for element in curve:
-        element_length = get_element_length(element)
+def create_spiral_element(start_point, start_tangent, start_curvature, end_curvature, spiral_length, lateral_offset=0.0):
+    spiral = CurveElement(type='spiral', start_point=start_point.copy(), start_tangent=start_tangent)
+    spiral['start_curvature'] = start_curvature
+    spiral['end_curvature'] = end_curvature
+    spiral['spiral_length'] = spiral_length
+    spiral['lateral_offset'] = lateral_offset
+    update_spiral_geometry_info(spiral)
 
-        if distance > element_length:
-            distance -= element_length
-        else:
-            if element['type'] == 'line':
-                position = get_point_on_line_by_distance(element, distance)
-                tangent = element['start_tangent']
-                return position, tangent
-            elif element['type'] == 'arc': 
-                position = get_point_on_arc_by_distance(element, distance)
-                tangent = get_tangent_on_arc_by_distance(element, distance)
-                return position, tangent
-
-def intersect_line_curve(line_point_a, line_point_b, curve, reference_point):
-    candidate_points = []
+    return spiral
 
-    for element in curve:
-        if element['type'] == 'line':
-            intersected_point = geometry.intersect_line_line(element['start_point'], 
-                                                        element['end_point'], 
-                                                        line_point_a,
-                                                        line_point_b)[0]
-
-            if check_point_on_element(intersected_point, element) == True:
-                candidate_points.append(intersected_point)
-
-        elif element['type'] == 'arc': 
-            one_side_point, another_side_point = math_utils.generate_infinite_line(line_point_a, line_point_b)
-            center_point, arc_radian, arc_radius = get_arc_geometry_info(element)
-            intersected_points = geometry.intersect_line_sphere(one_side_point, another_side_point, center_point, arc_radius)
-
-            for point in intersected_points:
-                if point != None and check_point_on_element(point, element) == True:
-                    candidate_points.append(point)
-    
-    if len(candidate_points) > 0: 
-        result_point = candidate_points[0]
-        for index in range(1, len(candidate_points)): # 当出现多个交点时，取距离reference_point最近的点。
-            if dist(candidate_points[index], reference_point) < dist(result_point, reference_point):
-                result_point = candidate_points[index]
+def get_spiral_curvature_rate(spiral):
+    return (spiral['end_curvature'] - spiral['start_curvature']) / spiral['spiral_length']
 
-        return result_point
-    else:
+def get_spiral_turning_radian(spiral):
+    '''
+    spiral首尾航向角的差值（带符号）。
+    '''
+    return (spiral['start_curvature'] + spiral['end_curvature']) / 2 * spiral['spiral_length']
+
+def get_spiral_base_distance(spiral, distance):
+    '''
+    由spiral上到起始点的距离求回旋线上到起始点的距离，见curve_array_utils.get_spiral_base_distances。
+    '''
+    return float(curve_array_utils.get_spiral_base_distances(spiral['start_curvature'], get_spiral_curvature_rate(spiral), spiral['lateral_offset'], distance))
+
+def get_positions_and_headings_on_spiral_by_base_distances(spiral, base_distances):
+    '''
+    批量获取spiral上对应回旋线长度base_distances处的position（形状为(len(base_distances), 3)的数组）和航向角。
+    '''
+    base_distances = np.asarray(base_distances, dtype=np.float64)
+    sample_number = len(base_distances)
+
+    return curve_array_utils.evaluate_spirals(np.tile(tuple(spiral['start_point']), (sample_number, 1)),
+        np.full(sample_number, atan2(spiral['start_tangent'][1], spiral['start_tangent'][0])),
+        np.full(sample_number, spiral['start_curvature']),
+        np.full(sample_number, get_spiral_curvature_rate(spiral)),
+        np.full(sample_number, spiral['lateral_offset']),
+        base_distances)
+
+def update_spiral_geometry_info(spiral_element):
+    '''
+    由spiral的start_point、start_tangent、start_curvature、end_curvature、spiral_length和lateral_offset计算end_point和end_tangent。
+    spiral的这些参数发生改变后，必须调用本函数。
+    '''
+    positions, headings = get_positions_and_headings_on_spiral_by_base_distances(spiral_element, [spiral_element['spiral_length']])
+    spiral_element['end_point'] = Vector(positions[0])
+    spiral_element['end_tangent'] = Vector((math.cos(headings[0]), math.sin(headings[0]), 0.0))
+
+def get_point_on_spiral_by_distance(spiral, distance):
+    '''
+    获取沿spiral distance远处点的position。
+    '''
+    positions, _ = get_positions_and_headings_on_spiral_by_base_distances(spiral, [get_spiral_base_distance(spiral, distance)])
+    return Vector(positions[0])
+
+def get_tangent_on_spiral_by_distance(spiral, distance):
+    '''
+    获取沿spiral distance远处点的tangent。
+    '''
+    base_distance = get_spiral_base_distance(spiral, distance)
+    start_heading = atan2(spiral['start_tangent'][1], spiral['start_tangent'][0])
+    heading = start_heading + base_distance * (spiral['start_curvature'] + 0.5 * get_spiral_curvature_rate(spiral) * base_distance)
+    return Vector((math.cos(heading), math.sin(heading), 0.0))
+
+def get_spiral_distance_of_projected_point(spiral, point):
+    '''
+    求spiral上距离point最近的点到spiral起始点的距离：先沿spiral采样找到最近的采样点，再对回旋线长度 s 用牛顿法求解 (P(s) - point)·T(s) = 0。
+    P对 s 的导数为 (1 - k * t) * T，T对 s 的导数为 k * N，N是左侧法向量，k是回旋线的曲率，t是lateral_offset。
+    投影点不在spiral内部（即最近点是spiral的端点）时返回None。
+    '''
+    spiral_length = spiral['spiral_length']
+    start_curvature = spiral['start_curvature']
+    curvature_rate = get_spiral_curvature_rate(spiral)
+    lateral_offset = spiral['lateral_offset']
+
+    divisions = 32
+    sample_distances = np.linspace(0, spiral_length, divisions + 1)
+    positions, _ = get_positions_and_headings_on_spiral_by_base_distances(spiral, sample_distances)
+    base_distance = sample_distances[np.argmin(np.hypot(positions[:, 0] - point[0], positions[:, 1] - point[1]))]
+
+    for iteration in range(0, 10):
+        positions, headings = get_positions_and_headings_on_spiral_by_base_distances(spiral, [base_distance])
+        offset_x = positions[0, 0] - point[0]
+        offset_y = positions[0, 1] - point[1]
+        cos_heading = math.cos(headings[0])
+        sin_heading = math.sin(headings[0])
+        curvature = start_curvature + curvature_rate * base_distance
+        function_value = offset_x * cos_heading + offset_y * sin_heading
+        derivative = 1 - curvature * lateral_offset + (offset_y * cos_heading - offset_x * sin_heading) * curvature
+        if derivative <= 0: # point在曲率中心的外侧太远时，牛顿法可能不收敛。
+            break
+        base_distance = min(max(base_distance - function_value / derivative, 0.0), spiral_length)
+        if fabs(function_value) < 0.000000001:
+            break
+
+    if base_distance < 0.000001 or base_distance > spiral_length - 0.000001:
         return None
+    return base_distance - lateral_offset * base_distance * (start_curvature + 0.5 * curvature_rate * base_distance)
 
-def check_point_on_element(focal_point, element):
-    if dist(focal_point, element['start_point']) < 0.000001 or dist(focal_point, element['end_point']) < 0.000001: # 当投影点和element的端点重合时，认为该投影点在element上。
-        return True
+def fit_spiral_to_end_point(start_point, start_tangent, start_curvature, end_point):
+    '''
+    求从start_point出发、起始点处切线为start_tangent、曲率为start_curvature且经过end_point的回旋线，返回(end_curvature, spiral_length)，失败时返回None。
+    以end_point对应的arc为初始值（长度为arc长度，end_curvature使航向角变化与arc相同），对end_curvature和length用牛顿法求解，
+    雅可比矩阵用差分近似。
+    '''
+    start_heading = atan2(start_tangent[1], start_tangent[0])
+    chord_x = end_point[0] - start_point[0]
+    chord_y = end_point[1] - start_point[1]
+    chord_length = math.hypot(chord_x, chord_y)
+    if chord_length < 0.000001:
+        return None
 
-    if element['type'] == 'line':
-        focal_point_to_line_start_vector = math_utils.vector_subtract(element['start_point'], focal_point)
-        focal_point_to_line_end_vector = math_utils.vector_subtract(element['end_point'], focal_point)
-        line_start_to_line_end_vector = math_utils.vector_subtract(element['end_point'], element['start_point'])
-        # 当投影点坐标在 element['start_point'] 和 element['end_point'] 之间时，返回该投影点坐标；否则投影点无效。
-        if focal_point_to_line_start_vector.magnitude < line_start_to_line_end_vector.magnitude and focal_point_to_line_end_vector.magnitude < line_start_to_line_end_vector.magnitude:
-            return True
-        else:
-            return False
+    half_sweep_radian = atan2(math.cos(start_heading) * chord_y - math.sin(start_heading) * chord_x, math.cos(start_heading) * chord_x + math.sin(start_heading) * chord_y)
+    length = chord_length if fabs(half_sweep_radian) < 0.000001 else chord_length * half_sweep_radian / math.sin(half_sweep_radian)
+    end_curvature = 4 * half_sweep_radian / length - start_curvature
+
+    def compute_residuals(end_curvatures, lengths):
+        sample_number = len(lengths)
+        displacements_x, displacements_y, _ = curve_array_utils.integrate_clothoids(np.full(sample_number, start_heading),
+            np.full(sample_number, start_curvature),
+            (end_curvatures - start_curvature) / lengths,
+            lengths)
+        return displacements_x - chord_x, displacements_y - chord_y
+
+    for iteration in range(0, 20):
+        curvature_step = 0.000001 * max(fabs(end_curvature), 1 / chord_length)
+        length_step = 0.000001 * length
+        residuals_x, residuals_y = compute_residuals(np.array([end_curvature, end_curvature + curvature_step, end_curvature]),
+            np.array([length, length, length + length_step]))
+        if math.hypot(residuals_x[0], residuals_y[0]) < 0.000001:
+            return end_curvature, length
+
+        jacobian = np.array([[(residuals_x[1] - residuals_x[0]) / curvature_step, (residuals_x[2] - residuals_x[0]) / length_step],
+                             [(residuals_y[1] - residuals_y[0]) / curvature_step, (residuals_y[2] - residuals_y[0]) / length_step]])
+        try:
+            curvature_change, length_change = np.linalg.solve(jacobian, [-residuals_x[0], -residuals_y[0]])
+        except np.linalg.LinAlgError:
+            return None
+
+        end_curvature += curvature_change
+        length = max(length + length_change, 0.5 * length)
+        if fabs(end_curvature) * length > 2 * pi: # 回旋线转过的角度过大，不是有意义的解。
+            return None
+
+    return None
+
+def create_parampoly3_element(start_point, start_tangent, poly_coefficients, lateral_offset=0.0):
+    parampoly3 = CurveElement(type='parampoly3', start_point=start_point.copy(), start_tangent=start_tangent)
+    parampoly3['poly_coefficients'] = tuple(float(coefficient) for coefficient in poly_coefficients)
+    parampoly3['lateral_offset'] = lateral_offset
+    update_parampoly3_geometry_info(parampoly3)
+
+    return parampoly3
+
+def get_parampoly3_arc_length_table(parampoly3):
+    '''
+    获取parampoly3的弧长参数化表(length_table, heading_table)，见curve_array_utils.build_parampoly3_arc_length_tables。
+    表在第一次使用时生成并缓存在element中，poly_coefficients改变后缓存自动失效。
+    '''
+    if 'arc_length_table' not in parampoly3:
+        length_tables, heading_tables = curve_array_utils.build_parampoly3_arc_length_tables(parampoly3['poly_coefficients'], curve_array_utils.parampoly3_table_size)
+        parampoly3['arc_length_table'] = (length_tables[0], heading_tables[0])
+
+    return parampoly3['arc_length_table']
+
+def get_parampoly3_parameters_by_distances(parampoly3, distances):
+    '''
+    由parampoly3上到起始点的距离distances批量求多项式参数 p。
+    '''
+    distances = np.asarray(distances, dtype=np.float64)
+    sample_number = len(distances)
+    length_table, heading_table = get_parampoly3_arc_length_table(parampoly3)
+
+    return curve_array_utils.get_parampoly3_parameters(np.tile(parampoly3['poly_coefficients'], (sample_number, 1)),
+        np.full(sample_number, parampoly3['lateral_offset']),
+        np.tile(length_table, (sample_number, 1)),
+        np.tile(heading_table, (sample_number, 1)),
+        distances)
+
+def get_positions_and_headings_on_parampoly3_by_parameters(parampoly3, parameters):
+    '''
+    批量获取parampoly3上参数parameters处的position（形状为(len(parameters), 3)的数组）和航向角。
+    '''
+    parameters = np.asarray(parameters, dtype=np.float64)
+    sample_number = len(parameters)
 
+    return curve_array_utils.evaluate_parampoly3s(np.tile(tuple(parampoly3['start_point']), (sample_number, 1)),
+        np.full(sample_number, atan2(parampoly3['start_tangent'][1], parampoly3['start_tangent'][0])),
+        np.tile(parampoly3['poly_coefficients'], (sample_number, 1)),
+        np.full(sample_number, parampoly3['lateral_offset']),
+        parameters)
+
+def update_parampoly3_geometry_info(parampoly3_element):
+    '''
+    由parampoly3的start_point、start_tangent、poly_coefficients和lateral_offset计算end_point和end_tangent。
+    parampoly3的这些参数发生改变后，必须调用本函数。
+    '''
+    positions, headings = get_positions_and_headings_on_parampoly3_by_parameters(parampoly3_element, [1.0])
+    arc_length_table = parampoly3_element.get('arc_length_table')
+    parampoly3_element['end_point'] = Vector(positions[0])
+    parampoly3_element['end_tangent'] = Vector((math.cos(headings[0]), math.sin(headings[0]), 0.0))
+    if arc_length_table is not None: # 修改end_point使缓存失效，但弧长参数化表与end_point无关。
+        parampoly3_element['arc_length_table'] = arc_length_table
+
+def get_point_on_parampoly3_by_distance(parampoly3, distance):
+    '''
+    获取沿parampoly3 distance远处点的position。
+    '''
+    positions, _ = get_positions_and_headings_on_parampoly3_by_parameters(parampoly3, get_parampoly3_parameters_by_distances(parampoly3, [distance]))
+    return Vector(positions[0])
+
+def get_tangent_on_parampoly3_by_distance(parampoly3, distance):
+    '''
+    获取沿parampoly3 distance远处点的tangent。
+    '''
+    _, headings = get_positions_and_headings_on_parampoly3_by_parameters(parampoly3, get_parampoly3_parameters_by_distances(parampoly3, [distance]))
+    return Vector((math.cos(headings[0]), math.sin(headings[0]), 0.0))
+
+def get_parampoly3_distance_of_projected_point(parampoly3, point):
+    '''
+    求parampoly3上距离point最近的点到parampoly3起始点的距离：先沿曲线采样找到最近的采样点，再对参数 p 用牛顿法求解 (P(p) - point)·T(p) = 0。
+    P对 p 的导数为 (|(u', v')| - t * θ'(p)) * T，T对 p 的导数为 θ'(p) * N，N是左侧法向量。
+    投影点不在parampoly3内部（即最近点是parampoly3的端点）时返回None。
+    '''
+    coefficients = np.array([parampoly3['poly_coefficients']])
+    lateral_offset = parampoly3['lateral_offset']
+
+    divisions = 32
+    sample_parameters = np.linspace(0, 1, divisions + 1)
+    positions, _ = get_positions_and_headings_on_parampoly3_by_parameters(parampoly3, sample_parameters)
+    parameter = sample_parameters[np.argmin(np.hypot(positions[:, 0] - point[0], positions[:, 1] - point[1]))]
+
+    for iteration in range(0, 10):
+        positions, headings = get_positions_and_headings_on_parampoly3_by_parameters(parampoly3, [parameter])
+        _, _, u_derivatives, v_derivatives, u_second_derivatives, v_second_derivatives = curve_array_utils.evaluate_parampoly3_polynomials(coefficients, np.array([parameter]))
+        squared_speed = u_derivatives[0] ** 2 + v_derivatives[0] ** 2
+        heading_derivative = (u_derivatives[0] * v_second_derivatives[0] - v_derivatives[0] * u_second_derivatives[0]) / squared_speed
+
+        offset_x = positions[0, 0] - point[0]
+        offset_y = positions[0, 1] - point[1]
+        cos_heading = math.cos(headings[0])
+        sin_heading = math.sin(headings[0])
+        function_value = offset_x * cos_heading + offset_y * sin_heading
+        derivative = math.sqrt(squared_speed) - lateral_offset * heading_derivative + (offset_y * cos_heading - offset_x * sin_heading) * heading_derivative
+        if derivative <= 0: # point在曲率中心的外侧太远时，牛顿法可能不收敛。
+            break
+        parameter = min(max(parameter - function_value / derivative, 0.0), 1.0)
+        if fabs(function_value) < 0.000000001:
+            break
+
+    if parameter < 0.000001 or parameter > 1 - 0.000001:
+        return None
+
+    length_table, heading_table = get_parampoly3_arc_length_table(parampoly3)
+    return float(curve_array_utils.get_parampoly3_distances(coefficients, np.array([lateral_offset]), length_table[np.newaxis], heading_table[np.newaxis], np.array([parameter]))[0])
+
+def fit_parampoly3_to_points(points, start_point, start_tangent):
+    '''
+    用最小二乘法把points拟合为从start_point出发、起始点处切线为start_tangent的parampoly3（见curve_array_utils.fit_parampoly3_coefficients），
+    points[0]应与start_point重合或很接近。返回(parampoly3, 最大拟合残差)。
+    '''
+    start_heading = atan2(start_tangent[1], start_tangent[0])
+    cos_start_heading = math.cos(start_heading)
+    sin_start_heading = math.sin(start_heading)
+
+    offsets = np.array([(point[0] - start_point[0], point[1] - start_point[1]) for point in points])
+    offsets[0] = 0.0
+    local_points = np.empty_like(offsets)
+    local_points[:, 0] = offsets[:, 0] * cos_start_heading + offsets[:, 1] * sin_start_heading
+    local_points[:, 1] = offsets[:, 1] * cos_start_heading - offsets[:, 0] * sin_start_heading
+
+    coefficients, residuals = curve_array_utils.fit_parampoly3_coefficients(local_points)
+    parampoly3 = create_parampoly3_element(start_point, Vector((cos_start_heading, sin_start_heading, 0.0)), coefficients)
+
+    return parampoly3, float(residuals.max())
+
+def fit_parampoly3_curve_to_points(points, tolerance=arc_tessellation_tolerance):
+    '''
+    把points（比如测绘得到的道路参考线上的点）拟合为首尾相连、切线连续的若干段parampoly3：
+    每一段从上一段的结束点和结束切线出发并经过其覆盖的最后一个点，用二分查找确定拟合残差不超过tolerance时该段最远能覆盖到的点。
+    '''
+    curve = []
+    start_index = 0
+    start_point = Vector(points[0])
+    start_tangent = (Vector(points[1]) - start_point).normalized()
+
+    while start_index < len(points) - 1:
+        parampoly3, _ = fit_parampoly3_to_points(points[start_index:start_index + 2], start_point, start_tangent)
+        lower_index = start_index + 1
+        upper_index = len(points) - 1
+        while lower_index < upper_index: # 最远的满足残差要求的点在[lower_index, upper_index]中。
+            middle_index = (lower_index + upper_index + 1) // 2
+            candidate, max_residual = fit_parampoly3_to_points(points[start_index:middle_index + 1], start_point, start_tangent)
+            if max_residual <= tolerance:
+                parampoly3 = candidate
+                lower_index = middle_index
+            else:
+                upper_index = middle_index - 1
+
+        curve.append(parampoly3)
+        start_index = lower_index
+        start_point = parampoly3['end_point']
+        start_tangent = parampoly3['end_tangent']
+
+    return curve
+
+def build_curve_length_index(curve):
+    '''
+    生成curve的累计长度表，length_index[i]是第i个element起始点处的 s 坐标，length_index[-1]是curve的总长度。
+    对同一条curve进行多次 s 坐标查询时，只需生成一次累计长度表，每次查询通过二分查找定位element。
+    分割、合并curve得到的是新的element列表，累计长度表不随curve保存，由进行查询的一方生成后传入；CurveArray中也有相同的length_index。
+    '''
+    length_index = [0.0]
+    for element in curve:
+        length_index.append(length_index[-1] + get_element_length(element))
+
+    return length_index
+
+def find_element_index_by_distance(length_index, distance):
+    '''
+    在累计长度表中二分查找 s = distance 所在element的索引，超出curve范围的distance归到第一个或最后一个element。
+    '''
+    element_index = bisect_left(length_index, distance) - 1
+    return min(max(element_index, 0), len(length_index) - 2)
+
+def get_position_and_tangent_on_curve_by_distance(curve, distance, length_index=None):
+    '''
+    获取curve上 s = distance 处的position和tangent。对同一条curve多次查询时，应传入build_curve_length_index生成的length_index。
+    '''
+    if length_index is None:
+        length_index = build_curve_length_index(curve)
+
+    element_index = find_element_index_by_distance(length_index, distance)
+    element = curve[element_index]
+    distance -= length_index[element_index]
+
+    if element['type'] == 'line':
+        position = get_point_on_line_by_distance(element, distance)
+        tangent = element['start_tangent']
+        return position, tangent
     elif element['type'] == 'arc': 
-        start_point_to_focal_point_vector = math_utils.vector_subtract(focal_point, element['start_point'])
-        end_point_to_focal_point_vector = math_utils.vector_subtract(focal_point, element['end_point'])
-        intersection_angle =  acos(start_point_to_focal_point_vector.dot(end_point_to_focal_point_vector) / (start_point_to_focal_point_vector.magnitude * end_point_to_focal_point_vector.magnitude))
+        position = get_point_on_arc_by_distance(element, distance)
+        tangent = get_tangent_on_arc_by_distance(element, distance)
+        return position, tangent
+    elif element['type'] == 'spiral':
+        position = get_point_on_spiral_by_distance(element, distance)
+        tangent = get_tangent_on_spiral_by_distance(element, distance)
+        return position, tangent
+    elif element['type'] == 'parampoly3':
+        parameters = get_parampoly3_parameters_by_distances(element, [distance])
+        positions, headings = get_positions_and_headings_on_parampoly3_by_parameters(element, parameters)
+        return Vector(positions[0]), Vector((math.cos(headings[0]), math.sin(headings[0]), 0.0))
+
+def curve_to_curve_array(curve):
+    '''
+    把dict形式的curve转换为CurveArray（见curve_array_utils），供批量计算使用。
+    OffsetCurve直接由其base_curve的CurveArray偏移得到，不生成偏移后的element。
+    '''
+    if isinstance(curve, OffsetCurve):
+        return curve_to_curve_array(curve.base_curve).offset(curve.offset)
+
+    element_number = len(curve)
+    element_types = np.empty(element_number, dtype=np.int8)
+    start_points = np.empty((element_number, 3))
+    end_points = np.empty((element_number, 3))
+    start_headings = np.empty(element_number)
+    curvatures = np.zeros(element_number)
+    lengths = np.empty(element_number)
+    curvature_rates = np.zeros(element_number)
+    lateral_offsets = np.zeros(element_number)
+    poly_coefficients = np.zeros((element_number, 8))
+
+    for index, element in enumerate(curve):
+        element_types[index] = curve_array_utils.element_type_codes[element['type']]
+        start_points[index] = element['start_point']
+        end_points[index] = element['end_point']
+        start_headings[index] = atan2(element['start_tangent'][1], element['start_tangent'][0])
+        if element['type'] == 'arc':
+            curvatures[index] = get_arc_curvature(element)
+        elif element['type'] == 'spiral':
+            curvatures[index] = element['start_curvature']
+            curvature_rates[index] = get_spiral_curvature_rate(element)
+            lateral_offsets[index] = element['lateral_offset']
+        elif element['type'] == 'parampoly3':
+            poly_coefficients[index] = element['poly_coefficients']
+            lateral_offsets[index] = element['lateral_offset']
+        lengths[index] = get_element_length(element)
+
+    return curve_array_utils.CurveArray(element_types, start_points, end_points, start_headings, curvatures, lengths, curvature_rates, lateral_offsets, poly_coefficients)
+
+def curve_array_to_curve(curve_array):
+    '''
+    把CurveArray转换为dict形式的curve。
+    '''
+    curve = []
+    end_headings = curve_array.get_end_headings()
+    base_lengths = curve_array.get_base_lengths()
+
+    for index in range(0, len(curve_array)):
+        element = CurveElement(type=curve_array_utils.element_type_names[curve_array.element_types[index]],
+            start_point=Vector(curve_array.start_points[index]),
+            start_tangent=Vector((math.cos(curve_array.start_headings[index]), math.sin(curve_array.start_headings[index]), 0.0)),
+            end_point=Vector(curve_array.end_points[index]),
+            end_tangent=Vector((math.cos(end_headings[index]), math.sin(end_headings[index]), 0.0)))
+        if element['type'] == 'arc':
+            update_arc_geometry_info(element)
+        elif element['type'] == 'spiral':
+            element['start_curvature'] = curve_array.curvatures[index]
+            element['end_curvature'] = curve_array.curvatures[index] + curve_array.curvature_rates[index] * base_lengths[index]
+            element['spiral_length'] = base_lengths[index]
+            element['lateral_offset'] = curve_array.lateral_offsets[index]
+        elif element['type'] == 'parampoly3':
+            element['poly_coefficients'] = tuple(curve_array_utils.normalize_parampoly3_coefficients(curve_array.poly_coefficients[index]))
+            element['lateral_offset'] = curve_array.lateral_offsets[index]
+        curve.append(element)
+
+    return curve
+
+def get_positions_and_tangents_on_curve_by_distances(curve, distances, curve_array=None):
+    '''
+    批量获取curve上 s = distances 处的position和tangent，distances是一维numpy数组。
+    返回形状为(len(distances), 3)的positions和tangents数组，tangents是单位向量。
+    对同一条curve多次查询时，应传入curve_to_curve_array生成的curve_array。
+    '''
+    if curve_array is None:
+        curve_array = curve_to_curve_array(curve)
 
-        # 当投影点在arc上时，投影点有效；当投影点在arc之外时，投影点无效。
-        if intersection_angle > pi / 2:
-            return True
-        else:
-            return False
+    return curve_array.evaluate(distances)
+
+def build_curve_spatial_index(curve):
+    '''
+    为curve生成求交和投影用的空间索引，即预先生成了层次包围盒的CurveArray（见CurveArray.get_bounding_box_levels）。
+    对同一条curve多次求交或投影时，只需生成一次空间索引。
+    '''
+    spatial_index = curve_to_curve_array(curve)
+    spatial_index.get_bounding_box_levels()
+
+    return spatial_index
+
+def intersect_lines_curve(origins, directions, curve, spatial_index=None, reference_points=None):
+    '''
+    批量计算多条直线（origins[i] + t * directions[i]，t可正可负）与curve的交点，每条直线取距离reference_points[i]最近的交点，
+    reference_points默认为origins。返回形状为(len(origins), 3)的交点数组，没有交点的行为nan。
+    '''
+    if spatial_index is None:
+        spatial_index = build_curve_spatial_index(curve)
+
+    return spatial_index.intersect_lines(origins, directions, reference_points)
+
+def sample_lane_widths(center_lane_boundary, lane_boundary, adjacent_lane_boundary, distances, center_lane_boundary_curve_array=None, lane_boundary_spatial_index=None, adjacent_lane_boundary_spatial_index=None):
+    '''
+    批量采样车道宽度：在center_lane_boundary上 s = distances 处沿 t 方向作直线，分别与lane_boundary和adjacent_lane_boundary求交，交点间的距离即为车道宽度。
+    返回widths以及两条边界上的交点数组，采样失败的位置为nan。
+    '''
+    if center_lane_boundary_curve_array is None:
+        center_lane_boundary_curve_array = curve_to_curve_array(center_lane_boundary)
+    if lane_boundary_spatial_index is None:
+        lane_boundary_spatial_index = build_curve_spatial_index(lane_boundary)
+    if adjacent_lane_boundary_spatial_index is None:
+        adjacent_lane_boundary_spatial_index = build_curve_spatial_index(adjacent_lane_boundary)
+
+    return curve_array_utils.sample_lane_widths(center_lane_boundary_curve_array, lane_boundary_spatial_index, adjacent_lane_boundary_spatial_index, distances)
+
+def intersect_line_curve(line_point_a, line_point_b, curve, reference_point, spatial_index=None):
+    '''
+    求过line_point_a和line_point_b的直线与curve的交点，有多个交点时取距离reference_point最近的点，没有交点时返回None。
+    对同一条curve多次求交时，应传入build_curve_spatial_index生成的spatial_index。
+    '''
+    origins = np.array([tuple(line_point_a)])
+    directions = np.array([tuple(line_point_b)]) - origins
+    reference_points = np.array([tuple(reference_point)])
+    intersected_points = intersect_lines_curve(origins, directions, curve, spatial_index, reference_points)
+
+    if np.isnan(intersected_points[0, 0]):
+        return None
+    else:
+        return Vector(intersected_points[0])
 
 def split_line(line, split_point):
     '''
@@ -376,89 +1178,261 @@ def split_arc(arc, split_point):
     split_point_to_center_point_vector = math_utils.vector_subtract(center_point, split_point)
     tangent_at_split_point = normal_vector_of_xy_plane.cross(split_point_to_center_point_vector)
 
-    normal_vector =  arc['start_tangent'].cross(arc['end_tangent'])
-    if normal_vector.z > 0:
+    if arc['curvature'] > 0:
         math_utils.vector_scale_ref(tangent_at_split_point, -1)
 
     pre_arc = arc.copy()
     pre_arc['end_point'] = split_point.copy()
     pre_arc['end_tangent'] = tangent_at_split_point.copy()
+    update_arc_geometry_info(pre_arc)
 
     next_arc = arc.copy()
     next_arc['start_point'] = split_point.copy()
     next_arc['start_tangent'] = tangent_at_split_point.copy()
+    update_arc_geometry_info(next_arc)
 
     return pre_arc, next_arc
 
-def split_reference_line_segment(curve_elements, split_point):
+def split_spiral(spiral, split_point):
     '''
-    把curve_elements在split_point处一分为二。
+    把spiral element在split_point处一分为二，split_point必须在spiral上。
     '''
-    pre_segment = []
-    next_segment = []
+    split_distance = get_spiral_distance_of_projected_point(spiral, split_point)
 
-    projected_point = None
+    pre_spiral = get_sub_element_by_distance(spiral, 0.0, split_distance)
+    pre_spiral['end_point'] = split_point.copy()
+    next_spiral = get_sub_element_by_distance(spiral, split_distance, get_element_length(spiral))
+    next_spiral['start_point'] = split_point.copy()
+    next_spiral['end_point'] = spiral['end_point'].copy()
 
-    for element in curve_elements:
-        if projected_point != None:
-            next_segment.append(element)
-            continue
+    return pre_spiral, next_spiral
 
-        if element['type'] == 'line':
-            projected_point = math_utils.project_point_onto_finite_line(split_point, element['start_point'], element['end_point'])
-            if projected_point != None:
-                pre_line, next_line = split_line(element, projected_point)
-                pre_segment.append(pre_line)
-                next_segment.append(next_line)
-            else:
-                pre_segment.append(element)
-        elif element['type'] == 'arc':
-            projected_point = math_utils.project_point_onto_finite_arc(split_point, element)
-            if projected_point != None:
-                pre_arc, next_arc = split_arc(element, projected_point)
-                pre_segment.append(pre_arc)
-                next_segment.append(next_arc)
-            else:
-                pre_segment.append(element)
+def split_parampoly3(parampoly3, split_point):
+    '''
+    把parampoly3 element在split_point处一分为二，split_point必须在parampoly3上。
+    '''
+    split_distance = get_parampoly3_distance_of_projected_point(parampoly3, split_point)
+
+    pre_parampoly3 = get_sub_element_by_distance(parampoly3, 0.0, split_distance)
+    pre_parampoly3['end_point'] = split_point.copy()
+    next_parampoly3 = get_sub_element_by_distance(parampoly3, split_distance, get_element_length(parampoly3))
+    next_parampoly3['start_point'] = split_point.copy()
+    next_parampoly3['end_point'] = parampoly3['end_point'].copy()
+
+    return pre_parampoly3, next_parampoly3
+
+def locate(curve, points, spatial_index=None):
+    '''
+    把points转换为curve的参考线坐标(s, t)，t是点到curve的带符号距离（左侧为正），见CurveArray.locate。
+    points是单个点（Vector或长度为3的序列）时返回(s, t, element_index)三个数值，points是形状为(n, 3)的数组时返回三个长度为n的数组。
+    对同一条curve多次定位时，应传入build_curve_spatial_index生成的spatial_index。
+    '''
+    if spatial_index is None:
+        spatial_index = build_curve_spatial_index(curve)
+
+    if isinstance(points, Vector) or np.ndim(points) == 1:
+        s, t, element_indexes = spatial_index.locate(np.array([tuple(points)]))
+        return float(s[0]), float(t[0]), int(element_indexes[0])
+
+    return spatial_index.locate(points)
+
+def project_point_onto_curve(curve, point, spatial_index=None):
+    '''
+    把point投影到curve上距离point最近的点，返回(投影点, element索引)。
+    投影点落在element的端点上时（point超出curve首尾范围，或位于两个element外侧的夹角区域内）投影失败，返回(None, None)。
+    '''
+    if spatial_index is None:
+        spatial_index = build_curve_spatial_index(curve)
+
+    if len(curve) == 0:
+        return None, None
+
+    s, _, element_index = locate(curve, point, spatial_index)
+    local_distance = s - spatial_index.length_index[element_index]
+    if local_distance < 0.000001 or local_distance > spatial_index.lengths[element_index] - 0.000001:
+        return None, None
+
+    positions, _ = spatial_index.evaluate(np.array([s]))
+
+    return Vector(positions[0]), element_index
+
+def split_reference_line_segment(curve_elements, split_point, spatial_index=None):
+    '''
+    把curve_elements在split_point处一分为二，split_point被投影到距离它最近的element上。
+    '''
+    projected_point, element_index = project_point_onto_curve(curve_elements, split_point, spatial_index)
+    if projected_point == None:
+        return None, curve_elements[:], []
+
+    element = curve_elements[element_index]
+    if element['type'] == 'line':
+        pre_element, next_element = split_line(element, projected_point)
+    elif element['type'] == 'arc':
+        pre_element, next_element = split_arc(element, projected_point)
+    elif element['type'] == 'spiral':
+        pre_element, next_element = split_spiral(element, projected_point)
+    elif element['type'] == 'parampoly3':
+        pre_element, next_element = split_parampoly3(element, projected_point)
+
+    pre_segment = curve_elements[:element_index]
+    pre_segment.append(pre_element)
+    next_segment = [next_element]
+    next_segment.extend(curve_elements[element_index + 1:])
 
     return projected_point, pre_segment, next_segment
 
+def merge_split_elements(pre_element, next_element):
+    '''
+    把由同一个element分割得到的pre_element和next_element合并为一个新的element，pre_element和next_element不被修改。
+    '''
+    merged_element = pre_element.copy()
+    merged_element['end_point'] = next_element['end_point']
+    merged_element['end_tangent'] = next_element['end_tangent']
+    if merged_element['type'] == 'arc':
+        update_arc_geometry_info(merged_element)
+    elif merged_element['type'] == 'spiral':
+        merged_element['end_curvature'] = next_element['end_curvature']
+        merged_element['spiral_length'] = pre_element['spiral_length'] + next_element['spiral_length']
+    elif merged_element['type'] == 'parampoly3':
+        # pre_element的多项式曲线延长到原参数范围即为原曲线：分割点处两段对 p 的导数之比等于两段参数范围之比。
+        pre_coefficients = pre_element['poly_coefficients']
+        pre_end_speed = math.hypot(pre_coefficients[1] + 2 * pre_coefficients[2] + 3 * pre_coefficients[3], pre_coefficients[5] + 2 * pre_coefficients[6] + 3 * pre_coefficients[7])
+        next_start_speed = math.hypot(next_element['poly_coefficients'][1], next_element['poly_coefficients'][5])
+        parameter_scale = (pre_end_speed + next_start_speed) / pre_end_speed
+        merged_element['poly_coefficients'] = tuple(coefficient * parameter_scale ** (index % 4) for index, coefficient in enumerate(pre_coefficients))
+        merged_element['end_point'] = next_element['end_point']
+
+    return merged_element
+
 def merge_reference_line_segment(pre_segment, next_segment):
     '''
-    把pre_segment和next_segment合并为一个segment，即将pre_segment的最后一个element和next_segment的第一个element合并。
+    把pre_segment和next_segment合并为一个segment，即将pre_segment的最后一个element和next_segment的第一个element合并（见merge_split_elements）。
+    '''
+    result_segment = pre_segment[:len(pre_segment) - 1]
+    result_segment.append(merge_split_elements(pre_segment[len(pre_segment) - 1], next_segment[0]))
+    result_segment.extend(next_segment[1:])
+
+    return result_segment
+
+def is_straight_element(element):
     '''
-    result_segment = []
+    判断element是否为直线：line，或者退化为直线的arc。
+    '''
+    return element['type'] == 'line' or (element['type'] == 'arc' and get_arc_curvature(element) == 0)
 
-    pre_segment_len = len(pre_segment)
-    next_segment_len = len(next_segment)
-    pre_last_element = pre_segment[pre_segment_len - 1]
-    next_first_element = next_segment[0]
+def merge_adjacent_elements(pre_element, next_element, tolerance=simplify_curve_tolerance):
+    '''
+    pre_element和next_element首尾相接，并且可以用一个element表示时，返回合并得到的element，否则返回None。
+    共线的两个直线合并为line，圆心和半径相同的两个arc合并为arc，曲率连续、曲率变化率和lateral_offset相同的两个spiral合并为spiral，parampoly3不合并。
+    各项判断条件都换算为距离，与tolerance比较。
+    '''
+    if dist(pre_element['end_point'], next_element['start_point']) > tolerance:
+        return None
 
-    for index in range(0, pre_segment_len - 1):
-        result_segment.append(pre_segment[index])
+    if is_straight_element(pre_element) and is_straight_element(next_element):
+        direction = (pre_element['end_point'] - pre_element['start_point']).to_2d().normalized()
+        for point in (next_element['start_point'], next_element['end_point']):
+            offset = (point - pre_element['start_point']).to_2d()
+            if fabs(direction.cross(offset)) > tolerance: # 点到pre_element所在直线的距离超过tolerance。
+                return None
+        if direction.dot((next_element['end_point'] - next_element['start_point']).to_2d()) <= 0:
+            return None
+
+        return CurveElement(type='line', start_point=pre_element['start_point'].copy(), start_tangent=pre_element['start_tangent'], 
+            end_point=next_element['end_point'].copy(), end_tangent=pre_element['start_tangent'])
+
+    elif pre_element['type'] == 'arc' and next_element['type'] == 'arc':
+        pre_center_point, _, pre_radius = get_arc_geometry_info(pre_element)
+        next_center_point, _, next_radius = get_arc_geometry_info(next_element)
+        if get_arc_curvature(pre_element) * get_arc_curvature(next_element) < 0:
+            return None
+        if dist(pre_center_point, next_center_point) > tolerance or fabs(pre_radius - next_radius) > tolerance:
+            return None
+
+        sweep_radian = pre_element['sweep_radian'] + next_element['sweep_radian']
+        if fabs(sweep_radian) > 2 * pi - 0.001: # 合并后的arc不能接近整圆，否则由首尾点无法确定arc。
+            return None
+
+        merged_element = CurveElement(type='arc', start_point=pre_element['start_point'].copy(), start_tangent=pre_element['start_tangent'], 
+            end_point=next_element['end_point'].copy(), end_tangent=next_element['end_tangent'])
+        update_arc_geometry_info(merged_element)
+        if fabs(merged_element['sweep_radian'] - sweep_radian) * pre_radius > tolerance:
+            return None
+
+        return merged_element
+
+    elif pre_element['type'] == 'spiral' and next_element['type'] == 'spiral':
+        next_length = next_element['spiral_length']
+        if fabs(pre_element['lateral_offset'] - next_element['lateral_offset']) > tolerance:
+            return None
+        if fabs(pre_element['end_curvature'] - next_element['start_curvature']) * next_length * next_length / 2 > tolerance:
+            return None
+        if fabs(get_spiral_curvature_rate(pre_element) - get_spiral_curvature_rate(next_element)) * next_length ** 3 / 6 > tolerance:
+            return None
+        pre_end_tangent = pre_element['end_tangent'].to_2d()
+        next_start_tangent = next_element['start_tangent'].to_2d()
+        if fabs(atan2(pre_end_tangent.cross(next_start_tangent), pre_end_tangent.dot(next_start_tangent))) * next_length > tolerance:
+            return None
+
+        merged_element = create_spiral_element(pre_element['start_point'], pre_element['start_tangent'], pre_element['start_curvature'], 
+            next_element['end_curvature'], pre_element['spiral_length'] + next_length, pre_element['lateral_offset'])
+        if dist(merged_element['end_point'], next_element['end_point']) > tolerance:
+            return None
+
+        return merged_element
+
+    return None
+
+def simplify_curve(curve, tolerance=simplify_curve_tolerance):
+    '''
+    反复分段、合并道路和调整车道边界后，curve中会留下共线的line、同一个圆上的arc片段以及很短的element，
+    本函数删除长度小于tolerance的element，并把可以合并的相邻element合并（见merge_adjacent_elements），返回新的element列表，curve本身不被修改。
+    只简化curve内部的element：第一个和最后一个element可能是分段时被分割的element的一部分，之后要与相邻curve的element合并（见merge_split_elements），
+    因此既不删除也不与其它element合并。只遍历一次curve，每个内部element只与上一个内部element的合并结果比较。
+    连续删除多个短element时，只有删除后上一个保留的element的结束点与下一个element的起始点之间的缺口仍小于tolerance时才删除，保证curve的连续性。
+    '''
+    if len(curve) <= 2:
+        return list(curve)
 
-    merged_element = pre_last_element.copy()
-    merged_element['end_point'] = next_first_element['end_point']
-    merged_element['end_tangent'] = next_first_element['end_tangent']
-    result_segment.append(merged_element)
+    simplified_curve = [curve[0]]
+    for element in curve[1:len(curve) - 1]:
+        if get_element_length(element) < tolerance and dist(simplified_curve[-1]['end_point'], element['end_point']) < tolerance:
+            continue
 
-    for index in range(1, next_segment_len):
-        result_segment.append(next_segment[index])
+        if len(simplified_curve) > 1:
+            merged_element = merge_adjacent_elements(simplified_curve[-1], element, tolerance)
+            if merged_element is not None:
+                simplified_curve[-1] = merged_element
+                continue
 
-    return result_segment
+        simplified_curve.append(element)
+
+    simplified_curve.append(curve[len(curve) - 1])
+
+    return simplified_curve
 
-def get_interseted_point_at_curve_distance(center_lane_boundary, curve_distance, target_boundary):
+def get_interseted_point_at_curve_distance(center_lane_boundary, curve_distance, target_boundary, length_index=None):
     '''
     在center_lane_boundary上 s = curve_distance的位置沿 t 方向发出一条射线，得到该射线与target_boundary的交点。
     此处 s 和 t 的意义对应高精度地图格式中参考线坐标系中 s 坐标和 t 坐标的意义。
+    length_index是center_lane_boundary的累计长度表。
+    '''
+    position, tangent = get_position_and_tangent_on_curve_by_distance(center_lane_boundary, curve_distance, length_index)
+
+    return get_interseted_point_along_normal(position, tangent, target_boundary)
+
+def get_interseted_point_along_normal(position, tangent, target_boundary, spatial_index=None):
+    '''
+    在position处沿tangent的法线方向发出一条射线，得到该射线与target_boundary的交点。
+    position和tangent可以是Vector，也可以是get_positions_and_tangents_on_curve_by_distances返回数组中的一行。
+    spatial_index是target_boundary的空间索引。
     '''
     normal_vector_of_xy_plane = Vector((0.0, 0.0, 1.0))
-    position, tangent = get_position_and_tangent_on_curve_by_distance(center_lane_boundary, curve_distance)
-    direction = normal_vector_of_xy_plane.cross(tangent).normalized()
-    line_point_a = position
-    line_point_b = math_utils.vector_add(position, direction)
+    line_point_a = Vector(position)
+    direction = normal_vector_of_xy_plane.cross(Vector(tangent)).normalized()
+    line_point_b = math_utils.vector_add(line_point_a, direction)
 
-    return intersect_line_curve(line_point_a, line_point_b, target_boundary, line_point_a)
+    return intersect_line_curve(line_point_a, line_point_b, target_boundary, line_point_a, spatial_index)
 
 
     
@@ -1,16 +1,41 @@
-from math import dist, sqrt
-from scipy.optimize import curve_fit
+import os
+import sys
+import copy
+import importlib
+import multiprocessing
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
 
 from numpy import power
+from mathutils import Vector
 
 from . import draw_utils
 from . import math_utils
 from . import basic_element_utils
+from . import curve_array_utils
 from .. import map_scene_data
 
+auto_segment_tolerance = 0.02 # 自动分段时车道宽度拟合结果允许的最大偏差（米）。
+auto_segment_sampling_interval = 0.5 # 自动分段时沿center_lane_boundary缓存车道宽度采样的间距（米）。
+parallel_refit_min_sections = 256 # 需要重新拟合的curve_fit_section少于此数量时不启动进程池，进程启动和传递数据的开销超过并行的收益。
+
 def cubic_curve_function(x, a, b, c, d):
     return a + b*x + c*power(x,2) + d*power(x,3) # 此处不能用math包里面的pow函数，因为math包里面的pow函数不能接受以数组形式传入的x。
-    
+
+def fit_cubic_curve_factors(x_array, y_array):
+    '''
+    用线性最小二乘直接求解三次曲线 y = a + b*x + c*x^2 + d*x^3 的系数，返回数组[a, b, c, d]，见fit_cubic_curve_factors_in_batch。
+    '''
+    return fit_cubic_curve_factors_in_batch(np.asarray(x_array)[np.newaxis], np.asarray(y_array)[np.newaxis])[0]
+
+def fit_cubic_curve_factors_in_batch(x_arrays, y_arrays):
+    '''
+    对多组采样点同时求解三次曲线系数，见curve_array_utils.fit_cubic_polynomials。
+    '''
+    return curve_array_utils.fit_cubic_polynomials(x_arrays, y_arrays)
+
 def draw_static_segmenting_line_for_curve_fitting(road_id, section_id, lane_id):
     remove_static_segmenting_line_for_curve_fitting(road_id, section_id, lane_id)
 
@@ -19,20 +44,16 @@ def draw_static_segmenting_line_for_curve_fitting(road_id, section_id, lane_id):
     lane_section = lane_sections[section_id]
     lane = lane_section['lanes'][lane_id]
 
+    lane_boundary, adjacent_lane_boundary = get_lane_boundaries(lane_section, lane_id)
+
     curve_fit_sections = lane['curve_fit_sections']
     for index in range(1, len(curve_fit_sections)):
         curve_fit_section = curve_fit_sections[index]
 
-        if lane_id > 0: # 左侧车道
-            lane_boundary = lane_section['lanes'][lane_id]['boundary_curve_elements']
-            adjacent_lane_boundary = lane_section['lanes'][lane_id - 1]['boundary_curve_elements']
-        elif lane_id < 0: # 右侧车道
-            lane_boundary = lane_section['lanes'][lane_id]['boundary_curve_elements']
-            adjacent_lane_boundary = lane_section['lanes'][lane_id + 1]['boundary_curve_elements']
-
-        curve_length = basic_element_utils.computer_curve_length(curve_fit_section)
-        intersected_point_on_lane_boundary = basic_element_utils.get_interseted_point_at_curve_distance(curve_fit_section, 0.001 * curve_length, lane_boundary)
-        intersected_point_on_adjacent_lane_boundary = basic_element_utils.get_interseted_point_at_curve_distance(curve_fit_section, 0.001 * curve_length, adjacent_lane_boundary)
+        length_index = basic_element_utils.build_curve_length_index(curve_fit_section) # 同一个section上的两次查询共用累计长度表。
+        curve_length = length_index[-1]
+        intersected_point_on_lane_boundary = basic_element_utils.get_interseted_point_at_curve_distance(curve_fit_section, 0.001 * curve_length, lane_boundary, length_index)
+        intersected_point_on_adjacent_lane_boundary = basic_element_utils.get_interseted_point_at_curve_distance(curve_fit_section, 0.001 * curve_length, adjacent_lane_boundary, length_index)
         if intersected_point_on_lane_boundary != None and intersected_point_on_adjacent_lane_boundary != None:
             draw_utils.draw_line('static_segmenting_line_for_curve_fitting_' + str(road_id) + '_' + str(section_id) + '_' + str(lane_id) + '_' + str(draw_utils.generate_unique_id()), 
                 intersected_point_on_lane_boundary, 
@@ -41,76 +62,286 @@ def draw_static_segmenting_line_for_curve_fitting(road_id, section_id, lane_id):
 def remove_static_segmenting_line_for_curve_fitting(road_id, section_id, lane_id):
     draw_utils.remove_line_by_feature('static_segmenting_line_for_curve_fitting_' + str(road_id) + '_' + str(section_id) + '_' + str(lane_id))
 
-def prepare_arrays_for_curve_fit(center_lane_boundary, lane_boundary, adjacent_lane_boundary):
-    x_array = [] # 保存 s 坐标
-    y_array = [] # 保存车道在采样位置的宽度值
+def get_sampling_distances_for_curve_fit(curve_length):
+    '''
+    沿center_lane_boundary采样的 s 坐标，见curve_array_utils.get_curve_fit_sampling_distances。
+    '''
+    return curve_array_utils.get_curve_fit_sampling_distances(curve_length)
 
-    curve_length = basic_element_utils.computer_curve_length(center_lane_boundary)
-    divisions = 20 # 沿center_lane_boundary采样20个点
-    sampling_step = curve_length / divisions
+def get_lane_boundaries(lane_section, lane_id):
+    '''
+    返回车道的外侧边界和内侧（与之相邻的）边界。
+    '''
+    if lane_id > 0: # 左侧车道
+        return lane_section['lanes'][lane_id]['boundary_curve_elements'], lane_section['lanes'][lane_id - 1]['boundary_curve_elements']
+    else: # 右侧车道
+        return lane_section['lanes'][lane_id]['boundary_curve_elements'], lane_section['lanes'][lane_id + 1]['boundary_curve_elements']
 
-    def prepare_array_item(curve_distance):
-        intersected_point_on_lane_boundary = basic_element_utils.get_interseted_point_at_curve_distance(center_lane_boundary, curve_distance, lane_boundary)
-        intersected_point_on_adjacent_lane_boundary = basic_element_utils.get_interseted_point_at_curve_distance(center_lane_boundary, curve_distance, adjacent_lane_boundary)
-        
-        if intersected_point_on_lane_boundary != None and intersected_point_on_adjacent_lane_boundary != None:
-            sampled_width = dist(intersected_point_on_lane_boundary, intersected_point_on_adjacent_lane_boundary)
-            x_array.append(curve_distance)
-            y_array.append(sampled_width)
+def sample_widths_for_curve_fit(lane_section, lane_id, section_indexes=None):
+    '''
+    沿车道的curve_fit_section采样车道宽度，section_indexes为None时采样所有curve_fit_section，否则只采样其中指定的几个。
+    返回形状都为(curve_fit_section数量, 采样点数)的 s 坐标数组和宽度数组，采样失败的位置宽度为nan。
+    车道两侧边界的空间索引只生成一次，供所有curve_fit_section共用。
+    '''
+    curve_fit_sections = lane_section['lanes'][lane_id]['curve_fit_sections']
+    if section_indexes is None:
+        section_indexes = range(len(curve_fit_sections))
+
+    lane_boundary, adjacent_lane_boundary = get_lane_boundaries(lane_section, lane_id)
+    lane_boundary_spatial_index = basic_element_utils.build_curve_spatial_index(lane_boundary)
+    adjacent_lane_boundary_spatial_index = basic_element_utils.build_curve_spatial_index(adjacent_lane_boundary)
 
-    curve_distance = 0.001 * curve_length # 从一个非常接近起始点的位置开始采样，避免采样失败。
-    prepare_array_item(curve_distance)
+    x_arrays = []
+    y_arrays = []
+    for section_index in section_indexes:
+        center_lane_boundary = curve_fit_sections[section_index]
+        center_lane_boundary_curve_array = basic_element_utils.curve_to_curve_array(center_lane_boundary)
+        sampling_distances = get_sampling_distances_for_curve_fit(center_lane_boundary_curve_array.get_length())
+        sampled_widths, _, _ = basic_element_utils.sample_lane_widths(center_lane_boundary, lane_boundary, adjacent_lane_boundary, sampling_distances, 
+            center_lane_boundary_curve_array, lane_boundary_spatial_index, adjacent_lane_boundary_spatial_index)
 
-    for index in range(1, divisions):
-        curve_distance = sampling_step * index
-        prepare_array_item(curve_distance)
+        x_arrays.append(sampling_distances) # 保存 s 坐标
+        y_arrays.append(sampled_widths) # 保存车道在采样位置的宽度值
 
-    curve_distance = 0.999 * curve_length # 从一个非常接近结束点的位置开始采样，避免采样失败。
-    prepare_array_item(curve_distance)
+    return np.array(x_arrays, ndmin=2), np.array(y_arrays, ndmin=2)
 
-    return x_array, y_array
+def get_curve_fit_identity(curve):
+    '''
+    curve的标识(offset, elements)：elements是curve中所有element对象组成的tuple，OffsetCurve取其base_curve的element和偏移距离。
+    element生成后不会被原地修改（分割、合并、简化都产生新的element），因此两个标识中的element对象都相同时curve的几何形状没有变化。
+    标识持有element的引用，这些element不会被回收，用id比较标识是安全的（见get_curve_fit_identity_key）。
+    '''
+    if isinstance(curve, basic_element_utils.OffsetCurve):
+        return curve.offset, tuple(curve.base_curve)
+
+    return 0.0, tuple(curve)
+
+def get_curve_fit_identity_key(identity):
+    offset, elements = identity
+    return offset, tuple(id(element) for element in elements)
+
+def find_changed_curve_fit_sections(lane_section, lane_id):
+    '''
+    对照车道上次拟合时记录的curve_fit_cache，找出几何形状或车道边界发生了变化、需要重新拟合的curve_fit_section。
+    返回(changed_indexes, cubic_curve_factors_per_width, curve_fit_cache)：cubic_curve_factors_per_width中未变化的section沿用原来的拟合系数，
+    变化的section为None，待重新拟合后填入；curve_fit_cache是拟合后应记录到车道中的标识。
+    车道边界变化时所有section都需要重新拟合；从文件读入的车道没有curve_fit_cache，也全部重新拟合。
+    '''
+    lane = lane_section['lanes'][lane_id]
+    lane_boundary, adjacent_lane_boundary = get_lane_boundaries(lane_section, lane_id)
+    boundary_identities = (get_curve_fit_identity(lane_boundary), get_curve_fit_identity(adjacent_lane_boundary))
+    section_identities = [get_curve_fit_identity(curve_fit_section) for curve_fit_section in lane['curve_fit_sections']]
+
+    previous_factors = {}
+    curve_fit_cache = lane.get('curve_fit_cache')
+    if curve_fit_cache != None and len(curve_fit_cache['sections']) == len(lane['cubic_curve_factors_per_width']) and \
+        [get_curve_fit_identity_key(identity) for identity in curve_fit_cache['boundaries']] == [get_curve_fit_identity_key(identity) for identity in boundary_identities]:
+        for identity, cubic_curve_factors in zip(curve_fit_cache['sections'], lane['cubic_curve_factors_per_width']):
+            previous_factors[get_curve_fit_identity_key(identity)] = cubic_curve_factors
+
+    cubic_curve_factors_per_width = [previous_factors.get(get_curve_fit_identity_key(identity)) for identity in section_identities]
+    changed_indexes = [index for index, cubic_curve_factors in enumerate(cubic_curve_factors_per_width) if cubic_curve_factors is None]
+
+    return changed_indexes, cubic_curve_factors_per_width, {'boundaries': boundary_identities, 'sections': section_identities}
 
 def show_cubic_curve_points(lane_identification, cubic_curve_factors, center_lane_boundary, lane_boundary, adjacent_lane_boundary):
     a, b, c, d = cubic_curve_factors
-    curve_length = basic_element_utils.computer_curve_length(center_lane_boundary)
+    center_lane_boundary_curve_array = basic_element_utils.curve_to_curve_array(center_lane_boundary)
     divisions = 50 # 显示50个拟合结果参考点
-    sampling_step = curve_length / divisions
-    for index in range(1, divisions):
-        curve_distance = sampling_step * index
-        intersected_point_on_lane_boundary = basic_element_utils.get_interseted_point_at_curve_distance(center_lane_boundary, curve_distance, lane_boundary)
-        intersected_point_on_adjacent_lane_boundary = basic_element_utils.get_interseted_point_at_curve_distance(center_lane_boundary, curve_distance, adjacent_lane_boundary)
-        
-        if intersected_point_on_lane_boundary != None and intersected_point_on_adjacent_lane_boundary != None:
-            direction = math_utils.vector_subtract(intersected_point_on_lane_boundary, intersected_point_on_adjacent_lane_boundary)
-            direction.normalize()
-            math_utils.vector_scale_ref(direction, cubic_curve_function(curve_distance, a, b, c, d))
-            check_point = math_utils.vector_add(intersected_point_on_adjacent_lane_boundary, direction)
-            draw_utils.draw_point('cubic_curve_point_' + lane_identification + '_' + str(draw_utils.generate_unique_id()), check_point)
+    sampling_distances = np.linspace(0, center_lane_boundary_curve_array.get_length(), divisions + 1)[1:divisions]
+    sampled_widths, intersected_points_on_lane_boundary, intersected_points_on_adjacent_lane_boundary = basic_element_utils.sample_lane_widths(center_lane_boundary, 
+        lane_boundary, 
+        adjacent_lane_boundary, 
+        sampling_distances, 
+        center_lane_boundary_curve_array)
+
+    for index in range(0, len(sampling_distances)):
+        if np.isnan(sampled_widths[index]):
+            continue
+
+        direction = Vector(intersected_points_on_lane_boundary[index] - intersected_points_on_adjacent_lane_boundary[index])
+        direction.normalize()
+        math_utils.vector_scale_ref(direction, cubic_curve_function(sampling_distances[index], a, b, c, d))
+        check_point = math_utils.vector_add(intersected_points_on_adjacent_lane_boundary[index], direction)
+        draw_utils.draw_point('cubic_curve_point_' + lane_identification + '_' + str(draw_utils.generate_unique_id()), check_point)
 
 def hide_cubic_curve_points(lane_identification):
     draw_utils.remove_point_by_feature('cubic_curve_point_' + lane_identification)
 
 def update_cubic_curve_factors(lane_section, lane_id):
+    '''
+    更新车道的宽度三次曲线拟合系数，只重新拟合发生了变化的curve_fit_section（见find_changed_curve_fit_sections）。
+    '''
     lane = lane_section['lanes'][lane_id]
-    lane['cubic_curve_factors_per_width'].clear()
-    curve_fit_sections = lane['curve_fit_sections']
+    changed_indexes, cubic_curve_factors_per_width, lane['curve_fit_cache'] = find_changed_curve_fit_sections(lane_section, lane_id)
 
-    center_lane_boundary = None
-    lane_boundary = None
-    adjacent_lane_boundary = None
+    if len(changed_indexes) > 0:
+        x_arrays, y_arrays = sample_widths_for_curve_fit(lane_section, lane_id, changed_indexes)
+        for section_index, cubic_curve_factors in zip(changed_indexes, fit_cubic_curve_factors_in_batch(x_arrays, y_arrays)):
+            cubic_curve_factors_per_width[section_index] = cubic_curve_factors
 
-    if lane_id > 0: # 左侧车道
-        lane_boundary = lane_section['lanes'][lane_id]['boundary_curve_elements']
-        adjacent_lane_boundary = lane_section['lanes'][lane_id - 1]['boundary_curve_elements']
-    elif lane_id < 0: # 右侧车道
-        lane_boundary = lane_section['lanes'][lane_id]['boundary_curve_elements']
-        adjacent_lane_boundary = lane_section['lanes'][lane_id + 1]['boundary_curve_elements']
-
-    for section in curve_fit_sections:
-        center_lane_boundary = section
-        x_array, y_array = prepare_arrays_for_curve_fit(center_lane_boundary, lane_boundary, adjacent_lane_boundary)
-        cubic_curve_factors, _ = curve_fit(cubic_curve_function, x_array, y_array)
-        lane['cubic_curve_factors_per_width'].append(cubic_curve_factors)
+    lane['cubic_curve_factors_per_width'][:] = cubic_curve_factors_per_width
+
+def fit_lane_widths_in_processes(road_tasks, max_workers=None):
+    '''
+    用ProcessPoolExecutor按道路并行执行curve_array_utils.fit_lane_widths，返回(每条道路的拟合系数数组组成的列表, None)。
+    本插件的包导入时依赖bpy，子进程不能通过包导入curve_array_utils；curve_array_utils只依赖numpy，
+    因此进程池运行期间临时把utils目录加入sys.path（spawn方式启动的子进程沿用父进程的sys.path），把curve_array_utils作为独立模块导入，
+    结束后恢复sys.path并移除该独立模块，不影响Blender中的其它插件。进程池无法启动或子进程意外退出时返回(None, 异常)，由调用者在当前进程中拟合。
+    '''
+    utils_directory = os.path.dirname(os.path.abspath(__file__))
+    worker_count = max_workers or os.cpu_count() or 1
+
+    sys.path.insert(0, utils_directory)
+    try:
+        standalone_curve_array_utils = importlib.import_module('curve_array_utils')
+        with concurrent.futures.ProcessPoolExecutor(worker_count, mp_context=multiprocessing.get_context('spawn')) as executor:
+            return list(executor.map(standalone_curve_array_utils.fit_lane_widths, road_tasks, chunksize=max(len(road_tasks) // (4 * worker_count), 1))), None
+    except (BrokenProcessPool, OSError) as error:
+        return None, error
+    finally:
+        sys.path.remove(utils_directory)
+        sys.modules.pop('curve_array_utils', None)
+
+def refit_all(map_data, max_workers=None):
+    '''
+    更新地图中所有车道的宽度三次曲线拟合系数，只重新拟合发生了变化的curve_fit_section（见find_changed_curve_fit_sections）。
+    各道路需要拟合的边界和curve_fit_section转换为CurveArray的数组（见CurveArray.to_arrays），需要拟合的section数量不少于parallel_refit_min_sections时，
+    用max_workers个子进程按道路并行采样和拟合（max_workers为None时使用所有CPU核心，为1时不启动进程池），
+    否则或者并行失败时在当前进程中用一次批量求解拟合全部section。结果写回各车道的cubic_curve_factors_per_width，
+    返回(重新拟合的curve_fit_section数量, 并行拟合失败时的异常)，没有失败时异常为None，由调用者决定是否提示用户。
+    '''
+    road_tasks = []
+    fit_targets = []
+    for road_data in map_data.values():
+        lane_tasks = []
+        for lane_section in road_data['lane_sections']:
+            lane_ids = list(range(lane_section['left_most_lane_index'], 0, -1)) + list(range(lane_section['right_most_lane_index'], 0, 1))
+            for lane_id in lane_ids:
+                lane = lane_section['lanes'][lane_id]
+                changed_indexes, cubic_curve_factors_per_width, lane['curve_fit_cache'] = find_changed_curve_fit_sections(lane_section, lane_id)
+                lane['cubic_curve_factors_per_width'][:] = cubic_curve_factors_per_width
+                if len(changed_indexes) == 0:
+                    continue
+
+                lane_boundary, adjacent_lane_boundary = get_lane_boundaries(lane_section, lane_id)
+                curve_fit_sections = lane['curve_fit_sections']
+                lane_tasks.append((basic_element_utils.curve_to_curve_array(lane_boundary).to_arrays(), 
+                    basic_element_utils.curve_to_curve_array(adjacent_lane_boundary).to_arrays(), 
+                    [basic_element_utils.curve_to_curve_array(curve_fit_sections[index]).to_arrays() for index in changed_indexes]))
+                fit_targets.append((lane, changed_indexes))
+
+        if len(lane_tasks) > 0:
+            road_tasks.append(lane_tasks)
+
+    section_count = sum(len(changed_indexes) for _, changed_indexes in fit_targets)
+    if section_count == 0:
+        return 0, None
+
+    road_factors = None
+    parallel_error = None
+    if max_workers != 1 and len(road_tasks) > 1 and section_count >= parallel_refit_min_sections:
+        road_factors, parallel_error = fit_lane_widths_in_processes(road_tasks, max_workers)
+    if road_factors is None:
+        road_factors = [curve_array_utils.fit_lane_widths([lane_task for lane_tasks in road_tasks for lane_task in lane_tasks])]
+    cubic_curve_factors = np.concatenate(road_factors) # 各道路的结果按道路、车道、section的顺序依次排列，与fit_targets一致。
+
+    row_index = 0
+    for lane, changed_indexes in fit_targets:
+        for section_index in changed_indexes:
+            lane['cubic_curve_factors_per_width'][section_index] = cubic_curve_factors[row_index]
+            row_index += 1
+
+    return row_index, parallel_error
+
+def get_curve_fit_residual(section_start_distance, section_end_distance, cached_distances, cached_widths):
+    '''
+    用缓存的宽度采样检查 s 坐标从section_start_distance到section_end_distance的curve_fit_section的拟合偏差。
+    拟合用的采样点与update_cubic_curve_factors相同（见get_sampling_distances_for_curve_fit），其宽度由缓存的采样线性插值得到，
+    返回拟合得到的三次曲线与区间内所有缓存采样之间的最大偏差。
+    '''
+    sampling_distances = get_sampling_distances_for_curve_fit(section_end_distance - section_start_distance)
+    sampled_widths = np.interp(section_start_distance + sampling_distances, cached_distances, cached_widths)
+    a, b, c, d = fit_cubic_curve_factors(sampling_distances, sampled_widths)
+
+    in_section = (cached_distances >= section_start_distance) & (cached_distances <= section_end_distance)
+    residuals = cubic_curve_function(cached_distances[in_section] - section_start_distance, a, b, c, d) - cached_widths[in_section]
+
+    return np.abs(residuals).max(initial=0.0)
+
+def find_curve_fit_split_distances(cached_distances, cached_widths, curve_length, tolerance=auto_segment_tolerance):
+    '''
+    根据缓存的宽度采样，贪心地确定curve_fit_sections的分段位置：每个curve_fit_section从上一个分段位置开始，
+    用二分查找在缓存的采样点中找到拟合偏差不超过tolerance的最远分段位置。每个curve_fit_section至少包含4个缓存采样点，
+    因此宽度突变处也不会无限细分。返回分段位置的 s 坐标列表，所有检查都只使用缓存的采样，不重新采样。
+    '''
+    split_distances = []
+    section_start_distance = 0.0
+    start_index = 0
+    while get_curve_fit_residual(section_start_distance, curve_length, cached_distances, cached_widths) > tolerance:
+        good_index = start_index + 3
+        bad_index = len(cached_distances) - 1
+        if good_index >= bad_index:
+            break
+
+        if get_curve_fit_residual(section_start_distance, cached_distances[good_index], cached_distances, cached_widths) <= tolerance:
+            while bad_index - good_index > 1:
+                middle_index = (good_index + bad_index) // 2
+                if get_curve_fit_residual(section_start_distance, cached_distances[middle_index], cached_distances, cached_widths) <= tolerance:
+                    good_index = middle_index
+                else:
+                    bad_index = middle_index
+
+        section_start_distance = float(cached_distances[good_index])
+        split_distances.append(section_start_distance)
+        start_index = good_index
+
+    return split_distances
+
+def auto_segment_curve_fit_sections(lane_section, lane_id, tolerance=auto_segment_tolerance):
+    '''
+    自动对车道进行三次曲线拟合分段：沿center_lane_boundary按auto_segment_sampling_interval的间距采样一次车道宽度并缓存，
+    由find_curve_fit_split_distances确定分段位置并移离element连接点（见basic_element_utils.move_split_distances_off_joints），再用basic_element_utils.split_curve_at一次切开center_lane_boundary，
+    替换车道原来的curve_fit_sections。拟合系数不在此更新，由调用者调用update_cubic_curve_factors或refit_all。返回分段数量。
+    '''
+    center_lane_boundary = lane_section['lanes'][0]['boundary_curve_elements']
+    lane_boundary, adjacent_lane_boundary = get_lane_boundaries(lane_section, lane_id)
+
+    center_lane_boundary_curve_array = basic_element_utils.curve_to_curve_array(center_lane_boundary)
+    curve_length = center_lane_boundary_curve_array.get_length()
+    divisions = max(int(np.ceil(curve_length / auto_segment_sampling_interval)), 1)
+    sampling_distances = np.linspace(0, curve_length, divisions + 1)
+    sampling_distances[0] = 0.001 * curve_length
+    sampling_distances[divisions] = 0.999 * curve_length
+    sampled_widths, _, _ = basic_element_utils.sample_lane_widths(center_lane_boundary, lane_boundary, adjacent_lane_boundary, sampling_distances, center_lane_boundary_curve_array)
+
+    sampled = ~np.isnan(sampled_widths)
+    if np.count_nonzero(sampled) < 2:
+        split_distances = []
+    else:
+        split_distances = find_curve_fit_split_distances(sampling_distances[sampled], sampled_widths[sampled], curve_length, tolerance)
+
+    length_index = list(center_lane_boundary_curve_array.length_index)
+    split_distances = basic_element_utils.move_split_distances_off_joints(length_index, split_distances) # 保证右键回退分段时可以合并相邻的两段。
+    curve_fit_sections = basic_element_utils.split_curve_at(copy.deepcopy(center_lane_boundary), split_distances, length_index)
+    lane_section['lanes'][lane_id]['curve_fit_sections'] = [section for section in curve_fit_sections if len(section) > 0]
+
+    return len(lane_section['lanes'][lane_id]['curve_fit_sections'])
+
+def auto_segment_all_curve_fit_sections(map_data, tolerance=auto_segment_tolerance):
+    '''
+    对地图中所有车道自动进行三次曲线拟合分段（见auto_segment_curve_fit_sections），然后用refit_all一次更新所有拟合系数。返回分段总数。
+    '''
+    section_count = 0
+    for road_data in map_data.values():
+        for lane_section in road_data['lane_sections']:
+            lane_ids = list(range(lane_section['left_most_lane_index'], 0, -1)) + list(range(lane_section['right_most_lane_index'], 0, 1))
+            for lane_id in lane_ids:
+                section_count += auto_segment_curve_fit_sections(lane_section, lane_id, tolerance)
+
+    refit_all(map_data)
+
+    return section_count
 
 def draw_cubic_curve_fitting_result(road_id, section_id, lane_id):
     road_data = map_scene_data.get_road_data(road_id)
@@ -122,15 +353,7 @@ def draw_cubic_curve_fitting_result(road_id, section_id, lane_id):
     hide_cubic_curve_points(lane_identification) # 清除之前绘制的拟合结果参考点。
 
     center_lane_boundary = None
-    lane_boundary = None
-    adjacent_lane_boundary = None
-
-    if lane_id > 0: # 左侧车道
-        lane_boundary = lane_section['lanes'][lane_id]['boundary_curve_elements']
-        adjacent_lane_boundary = lane_section['lanes'][lane_id - 1]['boundary_curve_elements']
-    elif lane_id < 0: # 右侧车道
-        lane_boundary = lane_section['lanes'][lane_id]['boundary_curve_elements']
-        adjacent_lane_boundary = lane_section['lanes'][lane_id + 1]['boundary_curve_elements']
+    lane_boundary, adjacent_lane_boundary = get_lane_boundaries(lane_section, lane_id)
 
     curve_fit_sections = lane['curve_fit_sections']
     for index in range(0, len(curve_fit_sections)):
@@ -0,0 +1,1150 @@
+import numpy as np
+
+from math import ceil, pi
+
+'''
+本模块只依赖numpy，不依赖bpy和mathutils。
+element和dict形式的curve之间的转换见basic_element_utils.curve_to_curve_array和basic_element_utils.curve_array_to_curve。
+'''
+
+element_type_codes = {
+    'line': 0,
+    'arc': 1,
+    'spiral': 2,
+    'parampoly3': 3
+}
+
+element_type_names = ('line', 'arc', 'spiral', 'parampoly3')
+
+gauss_legendre_nodes, gauss_legendre_weights = np.polynomial.legendre.leggauss(8)
+
+parampoly3_table_size = 33
+
+def check_angles_in_sweeps(angles, start_angles, sweep_radians, angle_tolerances):
+    '''
+    批量判断角度angles是否落在从start_angles开始、转过带符号的圆心角sweep_radians（逆时针为正）的区间内，两端各放宽angle_tolerances。
+    只比较相对起始角的转角，不依赖点到arc首尾点的夹角，因此对任意大小的半径和圆心角都有效。
+    '''
+    relative_angles = np.mod(np.copysign(1.0, sweep_radians) * (angles - start_angles) + angle_tolerances, 2 * pi) - angle_tolerances
+    return relative_angles <= np.abs(sweep_radians) + angle_tolerances
+
+def intersect_rays_segments(origins, directions, segment_starts, segment_ends, two_sided=False, tolerance=0.000001):
+    '''
+    批量计算xy平面上射线 origins[i] + t * directions[i]（t >= 0）与线段 segment_starts[i] → segment_ends[i] 的交点，directions为单位向量。
+    two_sided为True时求直线（t可正可负）与线段的交点。线段两端各放宽tolerance的距离。
+    返回(distances, valid)，distances为交点对应的 t，valid为False的行没有交点（包括射线与线段平行的情况）。
+    '''
+    origins = origins[:, :2]
+    directions = directions[:, :2]
+    segment_vectors = segment_ends[:, :2] - segment_starts[:, :2]
+    start_offsets = segment_starts[:, :2] - origins
+
+    denominators = directions[:, 0] * segment_vectors[:, 1] - directions[:, 1] * segment_vectors[:, 0]
+    valid = np.abs(denominators) > 0.000000001
+    denominators = np.where(valid, denominators, 1.0)
+    distances = (start_offsets[:, 0] * segment_vectors[:, 1] - start_offsets[:, 1] * segment_vectors[:, 0]) / denominators
+    segment_parameters = (start_offsets[:, 0] * directions[:, 1] - start_offsets[:, 1] * directions[:, 0]) / denominators
+    parameter_tolerances = tolerance / np.maximum(np.linalg.norm(segment_vectors, axis=1), tolerance)
+    valid &= (segment_parameters >= -parameter_tolerances) & (segment_parameters <= 1 + parameter_tolerances)
+    if not two_sided:
+        valid &= distances >= -tolerance
+
+    return distances, valid
+
+def intersect_rays_arcs(origins, directions, centers, radii, start_angles, sweep_radians, two_sided=False, tolerance=0.000001):
+    '''
+    批量计算xy平面上射线 origins[i] + t * directions[i]（t >= 0）与arc的交点，directions为单位向量，
+    arc由圆心centers、半径radii、起始角start_angles和带符号的圆心角sweep_radians确定。two_sided为True时求直线与arc的交点。
+    先解射线与圆的二次方程：判别式用 (r - h)(r + h)（h为圆心到直线的距离）计算，较小的根用 c / q 计算，避免大半径或射线起点靠近圆时的相消误差；
+    再用check_angles_in_sweeps检查交点是否落在arc的圆心角范围内，两端各放宽tolerance的弧长。
+    返回(distances, valid)，形状均为(n, 2)，每行对应射线与圆的两个交点。
+    '''
+    origins = origins[:, :2]
+    directions = directions[:, :2]
+    center_offsets = origins - centers[:, :2]
+    center_distances = np.linalg.norm(center_offsets, axis=1)
+
+    half_b = np.einsum('ij,ij->i', center_offsets, directions)
+    line_distances = np.abs(center_offsets[:, 0] * directions[:, 1] - center_offsets[:, 1] * directions[:, 0])
+    discriminants = (radii - line_distances) * (radii + line_distances)
+    has_root = discriminants >= 0
+    roots = np.sqrt(np.where(has_root, discriminants, 0.0))
+
+    q = -half_b - np.copysign(roots, half_b)
+    c = (center_distances - radii) * (center_distances + radii)
+    distances = np.empty((len(origins), 2))
+    distances[:, 0] = q
+    distances[:, 1] = np.where(q != 0, c / np.where(q != 0, q, 1.0), 0.0)
+
+    angle_tolerances = tolerance / radii
+    valid = np.empty(distances.shape, dtype=bool)
+    for column in range(2):
+        points_x = origins[:, 0] + distances[:, column] * directions[:, 0]
+        points_y = origins[:, 1] + distances[:, column] * directions[:, 1]
+        angles = np.arctan2(points_y - centers[:, 1], points_x - centers[:, 0])
+        valid[:, column] = has_root & check_angles_in_sweeps(angles, start_angles, sweep_radians, angle_tolerances)
+    if not two_sided:
+        valid &= distances >= -tolerance
+
+    return distances, valid
+
+def find_overlapping_box_pairs(bounding_boxes):
+    '''
+    用排序扫描区间找出xy平面上相互重叠的包围盒对，bounding_boxes形状为(n, 4)，每行为(min_x, min_y, max_x, max_y)：
+    把包围盒按其在扫描轴（所有包围盒总范围较长的坐标轴）上的区间起点排序，每个包围盒只与区间起点落在其区间内的包围盒组成候选对，
+    再用另一个坐标轴上的区间筛选。时间复杂度为O(n log n + 候选对数量)。
+    返回(first_indexes, second_indexes)，first_indexes < second_indexes。
+    '''
+    lower_bounds = bounding_boxes[:, :2]
+    upper_bounds = bounding_boxes[:, 2:]
+    sweep_axis = int(np.argmax(upper_bounds.max(axis=0) - lower_bounds.min(axis=0)))
+    other_axis = 1 - sweep_axis
+
+    order = np.argsort(lower_bounds[:, sweep_axis], kind='stable')
+    range_starts = np.arange(1, len(order) + 1)
+    range_ends = np.searchsorted(lower_bounds[order, sweep_axis], upper_bounds[order, sweep_axis], side='right')
+    counts = np.maximum(range_ends - range_starts, 0)
+
+    first_positions = np.repeat(np.arange(len(order)), counts)
+    second_positions = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(range_starts, counts)
+    first_indexes = np.minimum(order[first_positions], order[second_positions])
+    second_indexes = np.maximum(order[first_positions], order[second_positions])
+
+    overlapped = (lower_bounds[first_indexes, other_axis] <= upper_bounds[second_indexes, other_axis]) & (lower_bounds[second_indexes, other_axis] <= upper_bounds[first_indexes, other_axis])
+
+    return first_indexes[overlapped], second_indexes[overlapped]
+
+def get_segment_bounding_boxes(segment_starts, segment_ends):
+    return np.column_stack((np.minimum(segment_starts, segment_ends), np.maximum(segment_starts, segment_ends)))
+
+def intersect_segment_pairs(first_starts, first_ends, second_starts, second_ends):
+    '''
+    批量计算xy平面上线段对的交点，返回(first_parameters, second_parameters, valid)，parameters为交点在线段上的位置（0到1），平行的线段对valid为False。
+    '''
+    first_vectors = first_ends - first_starts
+    second_vectors = second_ends - second_starts
+    start_offsets = second_starts - first_starts
+    denominators = first_vectors[:, 0] * second_vectors[:, 1] - first_vectors[:, 1] * second_vectors[:, 0]
+    valid = np.abs(denominators) > 0.000000000001
+    denominators = np.where(valid, denominators, 1.0)
+    first_parameters = (start_offsets[:, 0] * second_vectors[:, 1] - start_offsets[:, 1] * second_vectors[:, 0]) / denominators
+    second_parameters = (start_offsets[:, 0] * first_vectors[:, 1] - start_offsets[:, 1] * first_vectors[:, 0]) / denominators
+    valid &= (first_parameters >= 0) & (first_parameters <= 1) & (second_parameters >= 0) & (second_parameters <= 1)
+
+    return first_parameters, second_parameters, valid
+
+def find_polyline_self_intersections(points, min_index_gap=2):
+    '''
+    找出折线points（形状为(n, 2)）中不相邻线段之间的交点，不做两两比较，先用find_overlapping_box_pairs找出包围盒重叠的线段对，再对这些线段对批量求交。
+    线段序号相差小于min_index_gap的线段对不参与求交。
+    返回(first_segment_indexes, second_segment_indexes, first_parameters, second_parameters)，first_segment_indexes < second_segment_indexes，
+    parameters为交点在线段上的位置（0到1）。
+    '''
+    first_segment_indexes, second_segment_indexes = find_overlapping_box_pairs(get_segment_bounding_boxes(points[:-1], points[1:]))
+    candidate = second_segment_indexes - first_segment_indexes >= min_index_gap
+    first_segment_indexes = first_segment_indexes[candidate]
+    second_segment_indexes = second_segment_indexes[candidate]
+
+    first_parameters, second_parameters, valid = intersect_segment_pairs(points[first_segment_indexes], points[first_segment_indexes + 1], points[second_segment_indexes], points[second_segment_indexes + 1])
+
+    return first_segment_indexes[valid], second_segment_indexes[valid], first_parameters[valid], second_parameters[valid]
+
+def merge_intervals(intervals):
+    '''
+    合并形状为(n, 2)的区间数组中重叠的区间，返回按起点排序、互不重叠的区间数组。
+    '''
+    if len(intervals) == 0:
+        return np.empty((0, 2))
+
+    intervals = intervals[np.argsort(intervals[:, 0], kind='stable')]
+    running_ends = np.maximum.accumulate(intervals[:, 1])
+    group_starts = np.flatnonzero(np.concatenate(([True], intervals[1:, 0] > running_ends[:-1])))
+
+    return np.column_stack((intervals[group_starts, 0], np.maximum.reduceat(intervals[:, 1], group_starts)))
+
+def integrate_clothoids(start_headings, start_curvatures, curvature_rates, distances, max_panels=64):
+    '''
+    批量计算回旋线（clothoid，曲率随 s 线性变化）上距离起始点distances处相对起始点的位移和航向角，参数都是形状相同的一维数组。
+    航向角为 θ(s) = θ0 + k0 * s + c * s² / 2，位移为 ∫(cos θ, sin θ)ds（Fresnel积分），用分段Gauss-Legendre求积计算：
+    把[0, s]等分为若干段，使每段上航向角的变化不超过1弧度，每段取8个节点，结果可以达到double精度。
+    分段数最多为max_panels，航向角变化超过max_panels弧度的回旋线（实际道路中不会出现）精度会下降。
+    返回(displacements_x, displacements_y, headings)。
+    '''
+    distances = np.asarray(distances, dtype=np.float64)
+    end_curvatures = start_curvatures + curvature_rates * distances
+    max_turning_radians = np.maximum(np.abs(start_curvatures), np.abs(end_curvatures)) * np.abs(distances)
+    panels = min(max(ceil(max_turning_radians.max(initial=0.0)), 1), max_panels)
+
+    fractions = ((np.arange(panels)[:, np.newaxis] + 0.5 * (gauss_legendre_nodes + 1)) / panels).ravel()
+    weights = np.tile(0.5 * gauss_legendre_weights, panels) / panels
+
+    node_distances = distances[:, np.newaxis] * fractions
+    node_headings = start_headings[:, np.newaxis] + node_distances * (start_curvatures[:, np.newaxis] + 0.5 * curvature_rates[:, np.newaxis] * node_distances)
+    displacements_x = distances * (np.cos(node_headings) @ weights)
+    displacements_y = distances * (np.sin(node_headings) @ weights)
+    headings = start_headings + distances * (start_curvatures + 0.5 * curvature_rates * distances)
+
+    return displacements_x, displacements_y, headings
+
+def get_spiral_base_distances(start_curvatures, curvature_rates, lateral_offsets, distances):
+    '''
+    spiral是与一条回旋线保持lateral_offset距离（向左为正）的曲线，lateral_offset为0时就是回旋线本身。
+    spiral上的长度 d 与回旋线上的长度 s 满足 d = s - t * (k0 * s + c * s² / 2)，其中k0、c是回旋线的起始曲率和曲率变化率，
+    本函数由 d 求 s，使用数值稳定的求根公式，t为0时 s = d。
+    '''
+    linear_factors = 1 - lateral_offsets * start_curvatures
+    discriminants = np.maximum(linear_factors * linear_factors - 2 * lateral_offsets * curvature_rates * distances, 0)
+    return 2 * distances / (linear_factors + np.sqrt(discriminants))
+
+def evaluate_spirals(start_points, start_headings, start_curvatures, curvature_rates, lateral_offsets, base_distances):
+    '''
+    批量获取spiral上对应回旋线长度base_distances处的position（形状为(n, 3)的数组）和航向角，start_points是spiral（而不是回旋线）的起始点。
+    spiral上的点等于回旋线上的点沿左侧法向量 (-sin θ, cos θ) 偏移lateral_offset，航向角与回旋线相同。
+    '''
+    displacements_x, displacements_y, headings = integrate_clothoids(start_headings, start_curvatures, curvature_rates, base_distances)
+
+    positions = np.array(start_points, dtype=np.float64).reshape(-1, 3)
+    positions[:, 0] += displacements_x - lateral_offsets * (np.sin(headings) - np.sin(start_headings))
+    positions[:, 1] += displacements_y + lateral_offsets * (np.cos(headings) - np.cos(start_headings))
+
+    return positions, headings
+
+def evaluate_parampoly3_polynomials(coefficients, parameters):
+    '''
+    coefficients形状为(n, 8)，依次为au、bu、cu、du、av、bv、cv、dv，u(p) = au + bu * p + cu * p² + du * p³，v(p)同理，p在[0, 1]内。
+    parameters的形状为(n,)或(n, m)。返回(u, v, u', v', u'', v'')，都是对 p 的导数，形状与parameters相同。
+    '''
+    coefficients = np.asarray(coefficients, dtype=np.float64)
+    if np.ndim(parameters) == 2:
+        coefficients = coefficients[:, np.newaxis, :]
+    au, bu, cu, du, av, bv, cv, dv = np.moveaxis(coefficients, -1, 0)
+    p = parameters
+
+    u = au + p * (bu + p * (cu + p * du))
+    v = av + p * (bv + p * (cv + p * dv))
+    u_derivatives = bu + p * (2 * cu + 3 * p * du)
+    v_derivatives = bv + p * (2 * cv + 3 * p * dv)
+    u_second_derivatives = 2 * cu + 6 * p * du
+    v_second_derivatives = 2 * cv + 6 * p * dv
+
+    return u, v, u_derivatives, v_derivatives, u_second_derivatives, v_second_derivatives
+
+def integrate_parampoly3_speeds(coefficients, lower_parameters, upper_parameters):
+    '''
+    用8个节点的Gauss-Legendre求积计算parampoly3在参数区间[lower_parameters, upper_parameters]上的弧长 ∫|(u', v')|dp。
+    '''
+    half_spans = 0.5 * (upper_parameters - lower_parameters)
+    node_parameters = (lower_parameters + half_spans)[:, np.newaxis] + half_spans[:, np.newaxis] * gauss_legendre_nodes
+    _, _, u_derivatives, v_derivatives, _, _ = evaluate_parampoly3_polynomials(coefficients, node_parameters)
+    return half_spans * (np.hypot(u_derivatives, v_derivatives) @ gauss_legendre_weights)
+
+def build_parampoly3_arc_length_tables(coefficients, table_size=33):
+    '''
+    parampoly3的弧长参数化表：把 p 的范围[0, 1]等分为table_size - 1段，逐段求积得到各节点处的弧长length_tables，
+    同时记录各节点处相对起始点的航向角变化量heading_tables（已展开，不会在±pi处跳变），形状都是(n, table_size)。
+    parampoly3偏移lateral_offset后，节点处的长度为 length_tables - lateral_offset * heading_tables，因此同一张表适用于任意偏移。
+    '''
+    coefficients = np.asarray(coefficients, dtype=np.float64).reshape(-1, 8)
+    table_parameters = np.linspace(0, 1, table_size)
+    lower_parameters = np.tile(table_parameters[:-1], len(coefficients))
+    upper_parameters = np.tile(table_parameters[1:], len(coefficients))
+    panel_lengths = integrate_parampoly3_speeds(np.repeat(coefficients, table_size - 1, axis=0), lower_parameters, upper_parameters).reshape(-1, table_size - 1)
+
+    length_tables = np.zeros((len(coefficients), table_size))
+    np.cumsum(panel_lengths, axis=1, out=length_tables[:, 1:])
+
+    _, _, u_derivatives, v_derivatives, _, _ = evaluate_parampoly3_polynomials(coefficients, np.tile(table_parameters, (len(coefficients), 1)))
+    heading_tables = np.unwrap(np.arctan2(v_derivatives, u_derivatives), axis=1)
+    heading_tables -= heading_tables[:, :1]
+
+    return length_tables, heading_tables
+
+def get_parampoly3_distances(coefficients, lateral_offsets, length_tables, heading_tables, parameters):
+    '''
+    由参数 p 求parampoly3（偏移lateral_offsets后）上到起始点的长度 d(p) = s(p) - t * (θ(p) - θ(0))：
+    s(p)和θ(p)由弧长参数化表中 p 所在区间起点处的值加上区间内的求积和航向角变化量得到。
+    '''
+    table_size = length_tables.shape[1]
+    rows = np.arange(len(parameters))
+    interval_indexes = np.clip(np.floor(parameters * (table_size - 1)).astype(np.intp), 0, table_size - 2)
+    lower_parameters = interval_indexes / (table_size - 1)
+
+    _, _, lower_u_derivatives, lower_v_derivatives, _, _ = evaluate_parampoly3_polynomials(coefficients, lower_parameters)
+    _, _, u_derivatives, v_derivatives, _, _ = evaluate_parampoly3_polynomials(coefficients, parameters)
+    heading_changes = np.mod(np.arctan2(v_derivatives, u_derivatives) - np.arctan2(lower_v_derivatives, lower_u_derivatives) + pi, 2 * pi) - pi
+    base_distances = length_tables[rows, interval_indexes] + integrate_parampoly3_speeds(coefficients, lower_parameters, parameters)
+
+    return base_distances - lateral_offsets * (heading_tables[rows, interval_indexes] + heading_changes)
+
+def get_parampoly3_parameters(coefficients, lateral_offsets, length_tables, heading_tables, distances):
+    '''
+    由parampoly3（偏移lateral_offsets后）上的长度distances求参数 p：先在弧长参数化表中查找所在区间并线性插值得到初值，
+    再在该区间内用牛顿法求解 d(p) = distance（见get_parampoly3_distances），d'(p) = |(u', v')| - t * θ'(p)。
+    '''
+    distances = np.asarray(distances, dtype=np.float64)
+    distance_tables = length_tables - lateral_offsets[:, np.newaxis] * heading_tables
+    table_size = distance_tables.shape[1]
+    rows = np.arange(len(distances))
+
+    interval_indexes = np.clip((distance_tables <= distances[:, np.newaxis]).sum(axis=1) - 1, 0, table_size - 2)
+    lower_distances = distance_tables[rows, interval_indexes]
+    upper_distances = distance_tables[rows, interval_indexes + 1]
+    interval_lengths = np.where(upper_distances > lower_distances, upper_distances - lower_distances, 1.0)
+    lower_parameters = interval_indexes / (table_size - 1)
+    upper_parameters = (interval_indexes + 1) / (table_size - 1)
+    parameters = lower_parameters + (upper_parameters - lower_parameters) * np.clip((distances - lower_distances) / interval_lengths, 0, 1)
+
+    for iteration in range(0, 3):
+        current_distances = get_parampoly3_distances(coefficients, lateral_offsets, length_tables, heading_tables, parameters)
+        _, _, u_derivatives, v_derivatives, u_second_derivatives, v_second_derivatives = evaluate_parampoly3_polynomials(coefficients, parameters)
+        squared_speeds = np.maximum(u_derivatives * u_derivatives + v_derivatives * v_derivatives, 0.000000000001)
+        heading_derivatives = (u_derivatives * v_second_derivatives - v_derivatives * u_second_derivatives) / squared_speeds
+        distance_derivatives = np.maximum(np.sqrt(squared_speeds) - lateral_offsets * heading_derivatives, 0.000001)
+        parameters = np.clip(parameters - (current_distances - distances) / distance_derivatives, lower_parameters, upper_parameters)
+
+    return parameters
+
+def evaluate_parampoly3s(start_points, start_headings, coefficients, lateral_offsets, parameters):
+    '''
+    批量获取parampoly3上参数parameters处的position（形状为(n, 3)的数组）和航向角，start_points和start_headings是偏移后曲线的起始点和起始航向角。
+    (u, v)所在局部坐标系的原点是多项式曲线的起始点，u轴方向为 start_heading - atan2(bv, bu)；偏移后的点等于多项式曲线上的点沿左侧法向量偏移lateral_offset。
+    '''
+    coefficients = np.asarray(coefficients, dtype=np.float64).reshape(-1, 8)
+    u, v, u_derivatives, v_derivatives, _, _ = evaluate_parampoly3_polynomials(coefficients, parameters)
+    frame_headings = start_headings - np.arctan2(coefficients[:, 5], coefficients[:, 1])
+    headings = frame_headings + np.arctan2(v_derivatives, u_derivatives)
+
+    local_u = u - coefficients[:, 0]
+    local_v = v - coefficients[:, 4]
+    cos_frame_headings = np.cos(frame_headings)
+    sin_frame_headings = np.sin(frame_headings)
+
+    positions = np.array(start_points, dtype=np.float64).reshape(-1, 3)
+    positions[:, 0] += local_u * cos_frame_headings - local_v * sin_frame_headings - lateral_offsets * (np.sin(headings) - np.sin(start_headings))
+    positions[:, 1] += local_u * sin_frame_headings + local_v * cos_frame_headings + lateral_offsets * (np.cos(headings) - np.cos(start_headings))
+
+    return positions, headings
+
+def get_parampoly3_curvatures(coefficients, lateral_offsets, parameters):
+    '''
+    parampoly3（偏移lateral_offsets后）在参数parameters处的曲率 k / (1 - k * t)，k = (u'v'' - v'u'') / |(u', v')|³。
+    '''
+    _, _, u_derivatives, v_derivatives, u_second_derivatives, v_second_derivatives = evaluate_parampoly3_polynomials(coefficients, parameters)
+    speeds = np.maximum(np.hypot(u_derivatives, v_derivatives), 0.000001)
+    curvatures = (u_derivatives * v_second_derivatives - v_derivatives * u_second_derivatives) / speeds ** 3
+    return curvatures / (1 - curvatures * lateral_offsets)
+
+def split_parampoly3_coefficients(coefficients, parameter):
+    '''
+    把parampoly3在参数parameter处一分为二，返回两段各自重新参数化到[0, 1]后的系数(pre_coefficients, next_coefficients)，
+    两段沿用原来的局部坐标系，多项式曲线本身不变。
+    '''
+    au, bu, cu, du, av, bv, cv, dv = coefficients
+    p = parameter
+    r = 1 - parameter
+    pre_coefficients = np.array([au, bu * p, cu * p * p, du * p ** 3, av, bv * p, cv * p * p, dv * p ** 3])
+    next_coefficients = np.array([au + p * (bu + p * (cu + p * du)),
+        r * (bu + p * (2 * cu + 3 * p * du)),
+        r * r * (cu + 3 * p * du),
+        r ** 3 * du,
+        av + p * (bv + p * (cv + p * dv)),
+        r * (bv + p * (2 * cv + 3 * p * dv)),
+        r * r * (cv + 3 * p * dv),
+        r ** 3 * dv])
+
+    return pre_coefficients, next_coefficients
+
+def normalize_parampoly3_coefficients(coefficients):
+    '''
+    把parampoly3的局部坐标系平移、旋转到多项式曲线的起始点和起始切线方向上，使 au = av = bv = 0，
+    这是OpenDRIVE中G1连续的paramPoly3的标准形式，曲线本身不变。
+    '''
+    au, bu, cu, du, av, bv, cv, dv = coefficients
+    rotation = np.arctan2(bv, bu)
+    cos_rotation = np.cos(rotation)
+    sin_rotation = np.sin(rotation)
+
+    normalized_coefficients = np.zeros(8)
+    for index, (u_coefficient, v_coefficient) in enumerate(((bu, bv), (cu, cv), (du, dv)), 1):
+        normalized_coefficients[index] = cos_rotation * u_coefficient + sin_rotation * v_coefficient
+        normalized_coefficients[index + 4] = -sin_rotation * u_coefficient + cos_rotation * v_coefficient
+    normalized_coefficients[5] = 0.0
+
+    return normalized_coefficients
+
+def fit_parampoly3_coefficients(local_points):
+    '''
+    用最小二乘法把局部坐标系（原点为第一个点，u轴为起始切线方向）中的点列local_points（形状为(n, 2)）拟合为标准形式的parampoly3，
+    参数 p 按弦长累计比例取值，u(p) = bu * p + cu * p² + du * p³，v(p) = cv * p² + dv * p³，保证曲线经过起始点且与起始切线相切。
+    曲线同时经过最后一个点(U, V)：把 du = U - bu - cu、dv = V - cv 代入后，只对bu、cu、cv求最小二乘解。
+    返回(coefficients, residuals)，residuals是每个点到其参数对应的曲线上的点的距离。
+    '''
+    local_points = np.asarray(local_points, dtype=np.float64)
+    chord_lengths = np.concatenate(([0.0], np.cumsum(np.linalg.norm(np.diff(local_points, axis=0), axis=1))))
+    parameters = chord_lengths / chord_lengths[-1]
+    end_u, end_v = local_points[-1]
+
+    cubic_parameters = parameters ** 3
+    u_basis = np.stack((parameters - cubic_parameters, parameters ** 2 - cubic_parameters), axis=1)
+    v_basis = (parameters ** 2 - cubic_parameters)[:, np.newaxis]
+    bu, cu = np.linalg.lstsq(u_basis, local_points[:, 0] - end_u * cubic_parameters, rcond=None)[0]
+    cv, = np.linalg.lstsq(v_basis, local_points[:, 1] - end_v * cubic_parameters, rcond=None)[0]
+
+    coefficients = np.array([0.0, bu, cu, end_u - bu - cu, 0.0, 0.0, cv, end_v - cv])
+    u, v, _, _, _, _ = evaluate_parampoly3_polynomials(coefficients, parameters)
+    residuals = np.hypot(u - local_points[:, 0], v - local_points[:, 1])
+
+    return coefficients, residuals
+
+
+class CurveArray:
+    '''
+    curve的结构体数组（structure of arrays）表示，每种element信息对应一个numpy数组：
+    element_types是element类型编码（见element_type_codes），start_points和end_points是首尾点坐标，形状为(n, 3)，
+    start_headings是起始点航向角，curvatures是起始点处带符号的曲率（向左弯曲为正，line为0），lengths是element长度。
+    spiral的curvatures是其回旋线的起始曲率，curvature_rates是回旋线曲率沿 s 的变化率，lateral_offsets是spiral到回旋线的距离（见get_spiral_base_distances），
+    line和arc的curvature_rates和lateral_offsets为0。
+    poly_coefficients是parampoly3的多项式系数，形状为(n, 8)（见evaluate_parampoly3_polynomials），lateral_offsets是parampoly3到多项式曲线的距离，
+    parampoly3的curvatures和curvature_rates为0，其它element的poly_coefficients为0。
+    length_index是累计长度表，length_index[i]是第i个element起始点处的 s 坐标，length_index[-1]是curve的总长度。
+    CurveArray生成后不再修改，层次包围盒等空间索引在第一次使用时生成并缓存在CurveArray中。
+    '''
+    __slots__ = ('element_types', 'start_points', 'end_points', 'start_headings', 'curvatures', 'lengths', 'curvature_rates', 'lateral_offsets', 'poly_coefficients', 'length_index', 'bounding_box_levels', 'arc_parameters', 'parampoly3_tables')
+
+    def __init__(self, element_types, start_points, end_points, start_headings, curvatures, lengths, curvature_rates=None, lateral_offsets=None, poly_coefficients=None):
+        self.element_types = np.asarray(element_types, dtype=np.int8)
+        self.start_points = np.asarray(start_points, dtype=np.float64).reshape(-1, 3)
+        self.end_points = np.asarray(end_points, dtype=np.float64).reshape(-1, 3)
+        self.start_headings = np.asarray(start_headings, dtype=np.float64)
+        self.curvatures = np.asarray(curvatures, dtype=np.float64)
+        self.lengths = np.asarray(lengths, dtype=np.float64)
+        self.curvature_rates = np.zeros(len(self.lengths)) if curvature_rates is None else np.asarray(curvature_rates, dtype=np.float64)
+        self.lateral_offsets = np.zeros(len(self.lengths)) if lateral_offsets is None else np.asarray(lateral_offsets, dtype=np.float64)
+        self.poly_coefficients = np.zeros((len(self.lengths), 8)) if poly_coefficients is None else np.asarray(poly_coefficients, dtype=np.float64).reshape(-1, 8)
+        self.length_index = np.concatenate(([0.0], np.cumsum(self.lengths)))
+        self.bounding_box_levels = None
+        self.arc_parameters = None
+        self.parampoly3_tables = None
+
+    def to_arrays(self):
+        '''
+        返回构造CurveArray所需的numpy数组组成的tuple，CurveArray(*curve_array.to_arrays())与curve_array相同。
+        CurveArray传给子进程时只传这些数组，子进程不必导入本插件的包（见fit_lane_widths）。
+        '''
+        return (self.element_types, self.start_points, self.end_points, self.start_headings, self.curvatures, self.lengths, 
+            self.curvature_rates, self.lateral_offsets, self.poly_coefficients)
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def get_length(self):
+        return self.length_index[-1]
+
+    def get_base_lengths(self):
+        '''
+        spiral对应的回旋线的长度，line和arc就是element长度。
+        '''
+        return get_spiral_base_distances(self.curvatures, self.curvature_rates, self.lateral_offsets, self.lengths)
+
+    def get_end_headings(self):
+        base_lengths = self.get_base_lengths()
+        end_headings = self.start_headings + base_lengths * (self.curvatures + 0.5 * self.curvature_rates * base_lengths)
+
+        is_parampoly3 = self.get_parampoly3_mask()
+        if is_parampoly3.any():
+            _, heading_tables = self.get_parampoly3_tables()
+            end_headings[is_parampoly3] = self.start_headings[is_parampoly3] + heading_tables[is_parampoly3, -1]
+
+        return end_headings
+
+    def get_end_curvatures(self):
+        '''
+        element结束点处的曲率，spiral的曲率为 k / (1 - k * t)，k是回旋线的曲率，parampoly3同理。
+        '''
+        end_curvatures = self.curvatures + self.curvature_rates * self.get_base_lengths()
+        end_curvatures = end_curvatures / (1 - end_curvatures * self.lateral_offsets)
+
+        is_parampoly3 = self.get_parampoly3_mask()
+        if is_parampoly3.any():
+            end_curvatures[is_parampoly3] = get_parampoly3_curvatures(self.poly_coefficients[is_parampoly3], self.lateral_offsets[is_parampoly3], np.ones(np.count_nonzero(is_parampoly3)))
+
+        return end_curvatures
+
+    def get_spiral_mask(self):
+        return self.element_types == element_type_codes['spiral']
+
+    def get_parampoly3_mask(self):
+        return self.element_types == element_type_codes['parampoly3']
+
+    def get_numerical_mask(self):
+        '''
+        没有解析解、需要数值计算的element（spiral和parampoly3）。
+        '''
+        return self.get_spiral_mask() | self.get_parampoly3_mask()
+
+    def get_parampoly3_tables(self):
+        '''
+        parampoly3的弧长参数化表(length_tables, heading_tables)，见build_parampoly3_arc_length_tables，其它element对应的行为0。
+        '''
+        if self.parampoly3_tables is None:
+            length_tables = np.zeros((len(self), parampoly3_table_size))
+            heading_tables = np.zeros((len(self), parampoly3_table_size))
+            is_parampoly3 = self.get_parampoly3_mask()
+            if is_parampoly3.any():
+                length_tables[is_parampoly3], heading_tables[is_parampoly3] = build_parampoly3_arc_length_tables(self.poly_coefficients[is_parampoly3], parampoly3_table_size)
+            self.parampoly3_tables = (length_tables, heading_tables)
+
+        return self.parampoly3_tables
+
+    def get_parampoly3_parameters(self, element_indexes, local_distances):
+        '''
+        第element_indexes[i]个element（parampoly3）上距离其起始点local_distances[i]处的参数 p。
+        '''
+        length_tables, heading_tables = self.get_parampoly3_tables()
+        return get_parampoly3_parameters(self.poly_coefficients[element_indexes],
+            self.lateral_offsets[element_indexes],
+            length_tables[element_indexes],
+            heading_tables[element_indexes],
+            local_distances)
+
+    def find_element_indexes(self, distances):
+        '''
+        在累计长度表中二分查找 s = distances 所在element的索引，超出curve范围的distance归到第一个或最后一个element。
+        '''
+        element_indexes = np.searchsorted(self.length_index, distances, side='left') - 1
+        np.clip(element_indexes, 0, len(self) - 1, out=element_indexes)
+        return element_indexes
+
+    def evaluate(self, distances):
+        '''
+        批量获取curve上 s = distances 处的position和tangent，返回形状为(len(distances), 3)的数组，tangents是单位向量。
+        '''
+        distances = np.asarray(distances, dtype=np.float64)
+        element_indexes = self.find_element_indexes(distances)
+        positions, headings = self.evaluate_elements(element_indexes, distances - self.length_index[element_indexes])
+
+        tangents = np.zeros_like(positions)
+        tangents[:, 0] = np.cos(headings)
+        tangents[:, 1] = np.sin(headings)
+
+        return positions, tangents
+
+    def evaluate_elements(self, element_indexes, local_distances):
+        '''
+        获取第element_indexes[i]个element上距离其起始点local_distances[i]处的position和航向角。
+        line和arc统一按曲率计算：弦长为 s * sinc(k * s / 2)，弦的方向角为起始航向角加上 k * s / 2，k为0时即为line。
+        spiral用integrate_clothoids计算，parampoly3先由弧长参数化表求出参数 p 再计算。
+        '''
+        curvatures = self.curvatures[element_indexes]
+        half_turning_radians = 0.5 * curvatures * local_distances
+        chord_lengths = local_distances * np.sinc(half_turning_radians / pi) # numpy的sinc(x)定义为sin(pi * x) / (pi * x)。
+        chord_headings = self.start_headings[element_indexes] + half_turning_radians
+
+        positions = self.start_points[element_indexes]
+        positions[:, 0] += chord_lengths * np.cos(chord_headings)
+        positions[:, 1] += chord_lengths * np.sin(chord_headings)
+        headings = chord_headings + half_turning_radians
+
+        element_types = self.element_types[element_indexes]
+        is_spiral = element_types == element_type_codes['spiral']
+        if is_spiral.any():
+            spiral_element_indexes = element_indexes[is_spiral]
+            start_curvatures = self.curvatures[spiral_element_indexes]
+            curvature_rates = self.curvature_rates[spiral_element_indexes]
+            lateral_offsets = self.lateral_offsets[spiral_element_indexes]
+            positions[is_spiral], headings[is_spiral] = evaluate_spirals(self.start_points[spiral_element_indexes],
+                self.start_headings[spiral_element_indexes],
+                start_curvatures,
+                curvature_rates,
+                lateral_offsets,
+                get_spiral_base_distances(start_curvatures, curvature_rates, lateral_offsets, local_distances[is_spiral]))
+
+        is_parampoly3 = element_types == element_type_codes['parampoly3']
+        if is_parampoly3.any():
+            parampoly3_element_indexes = element_indexes[is_parampoly3]
+            positions[is_parampoly3], headings[is_parampoly3] = evaluate_parampoly3s(self.start_points[parampoly3_element_indexes],
+                self.start_headings[parampoly3_element_indexes],
+                self.poly_coefficients[parampoly3_element_indexes],
+                self.lateral_offsets[parampoly3_element_indexes],
+                self.get_parampoly3_parameters(parampoly3_element_indexes, local_distances[is_parampoly3]))
+
+        return positions, headings
+
+    def offset(self, offset):
+        '''
+        把curve朝左侧偏移offset的距离（offset为负时朝右侧偏移），产生新的CurveArray。
+        arc偏移后圆心不变，曲率变为 k / (1 - k * offset)。spiral和parampoly3偏移后回旋线或多项式曲线不变，lateral_offsets增加offset。
+        偏移后element的长度都变为 length - offset * 航向角变化量。
+        '''
+        end_headings = self.get_end_headings()
+
+        start_points = self.start_points.copy()
+        start_points[:, 0] -= offset * np.sin(self.start_headings)
+        start_points[:, 1] += offset * np.cos(self.start_headings)
+        end_points = self.end_points.copy()
+        end_points[:, 0] -= offset * np.sin(end_headings)
+        end_points[:, 1] += offset * np.cos(end_headings)
+
+        lengths = self.lengths - offset * (end_headings - self.start_headings)
+        is_numerical = self.get_numerical_mask()
+        curvatures = np.where(is_numerical, self.curvatures, self.curvatures / (1 - self.curvatures * offset))
+        lateral_offsets = np.where(is_numerical, self.lateral_offsets + offset, 0.0)
+
+        return CurveArray(self.element_types, start_points, end_points, self.start_headings, curvatures, lengths, self.curvature_rates, lateral_offsets, self.poly_coefficients)
+
+    def sample(self, max_turning_radian=0.05):
+        '''
+        把每个element按航向角变化量不超过max_turning_radian等分采样（spiral和parampoly3至少分成8段），每个element的首尾点都被采样，
+        因此相邻element的首尾采样点重复。返回(sample_distances, positions, headings)。
+        '''
+        turning_radians = np.abs(self.get_end_headings() - self.start_headings)
+        divisions = np.maximum(np.ceil(turning_radians / max_turning_radian), 1).astype(np.int64)
+        divisions[self.get_numerical_mask()] = np.maximum(divisions[self.get_numerical_mask()], 8) # spiral和parampoly3的曲率不是常数，多采样一些点。
+
+        sample_element_indexes = np.repeat(np.arange(len(self)), divisions + 1)
+        sample_fractions = np.arange(len(sample_element_indexes)) - np.repeat(np.cumsum(divisions + 1) - (divisions + 1), divisions + 1)
+        local_distances = sample_fractions / np.repeat(divisions, divisions + 1) * self.lengths[sample_element_indexes]
+        positions, headings = self.evaluate_elements(sample_element_indexes, local_distances)
+
+        return self.length_index[sample_element_indexes] + local_distances, positions, headings
+
+    def get_offset_positions(self, distances, offset):
+        '''
+        curve上 s = distances 处的点沿法线向左偏移offset距离（offset为负时向右）后的xy坐标，形状为(len(distances), 2)。
+        '''
+        positions, tangents = self.evaluate(distances)
+        return positions[:, :2] + offset * np.column_stack((-tangents[:, 1], tangents[:, 0]))
+
+    def get_offset_fold_spans(self, offset, max_turning_radian=0.05, newton_iterations=4):
+        '''
+        curve偏移offset距离后，在曲率半径小于偏移距离的地方（1 - k * offset <= 0）偏移曲线反向折叠，并在其两侧形成自相交的环。
+        本函数找出应当从偏移曲线中剪除的部分，返回形状为(m, 2)的数组，每行是一段被剪除部分在本curve上的 s 区间，按 s 排序且互不重叠。
+        先用sample采样，得到偏移曲线的折线近似，与本curve切线方向相反的折线线段即为反向部分
+        （element之间航向角不连续时，同一个 s 处的两个采样点之间的线段也可能反向）；再用find_polyline_self_intersections找出折线的自相交点，
+        并用牛顿法求出偏移曲线上精确的自相交点。包含反向部分的自相交环整个被剪除，首尾没有被自相交环包含的反向部分单独剪除；
+        本curve自身的自相交不包含反向部分，不被剪除。
+        '''
+        if len(self) == 0:
+            return np.empty((0, 2))
+
+        sample_distances, positions, headings = self.sample(max_turning_radian)
+        offset_points = positions[:, :2] + offset * np.column_stack((-np.sin(headings), np.cos(headings)))
+
+        # element之间航向角连续时，相邻element首尾的采样点重合，删除重合的点，避免相邻线段被当作自相交。
+        keep = np.concatenate(([True], np.linalg.norm(np.diff(offset_points, axis=0), axis=1) > 0.000000001))
+        offset_points = offset_points[keep]
+        sample_distances = sample_distances[keep]
+        headings = headings[keep]
+        if len(offset_points) < 2:
+            return np.empty((0, 2))
+
+        segment_vectors = np.diff(offset_points, axis=0)
+        base_directions = np.column_stack((np.cos(headings[:-1]) + np.cos(headings[1:]), np.sin(headings[:-1]) + np.sin(headings[1:])))
+        is_inverted = np.einsum('ij,ij->i', segment_vectors, base_directions) < -0.000000001
+        if not is_inverted.any():
+            return np.empty((0, 2))
+
+        first_segment_indexes, second_segment_indexes, first_parameters, second_parameters = find_polyline_self_intersections(offset_points)
+
+        # 只保留包含反向部分的自相交环。
+        inverted_counts = np.concatenate(([0], np.cumsum(is_inverted)))
+        has_inversion = inverted_counts[second_segment_indexes + 1] - inverted_counts[first_segment_indexes] > 0
+        first_segment_indexes = first_segment_indexes[has_inversion]
+        second_segment_indexes = second_segment_indexes[has_inversion]
+        first_distances = sample_distances[first_segment_indexes] + first_parameters[has_inversion] * (sample_distances[first_segment_indexes + 1] - sample_distances[first_segment_indexes])
+        second_distances = sample_distances[second_segment_indexes] + second_parameters[has_inversion] * (sample_distances[second_segment_indexes + 1] - sample_distances[second_segment_indexes])
+
+        # 用牛顿法求解 P(first_distance) = P(second_distance)，P为偏移曲线上的点，导数用中心差分计算。
+        if len(first_distances) > 0:
+            step = 0.0001
+            curve_length = self.get_length()
+            for _ in range(newton_iterations):
+                differences = self.get_offset_positions(first_distances, offset) - self.get_offset_positions(second_distances, offset)
+                first_derivatives = (self.get_offset_positions(np.minimum(first_distances + step, curve_length), offset) - self.get_offset_positions(np.maximum(first_distances - step, 0.0), offset)) / (2 * step)
+                second_derivatives = (self.get_offset_positions(np.minimum(second_distances + step, curve_length), offset) - self.get_offset_positions(np.maximum(second_distances - step, 0.0), offset)) / (2 * step)
+                determinants = -first_derivatives[:, 0] * second_derivatives[:, 1] + first_derivatives[:, 1] * second_derivatives[:, 0]
+                solvable = np.abs(determinants) > 0.000000001
+                determinants = np.where(solvable, determinants, 1.0)
+                first_steps = (-differences[:, 0] * second_derivatives[:, 1] + differences[:, 1] * second_derivatives[:, 0]) / determinants
+                second_steps = (first_derivatives[:, 0] * differences[:, 1] - first_derivatives[:, 1] * differences[:, 0]) / determinants
+                first_distances = np.where(solvable, np.clip(first_distances - first_steps, 0.0, curve_length), first_distances)
+                second_distances = np.where(solvable, np.clip(second_distances - second_steps, 0.0, curve_length), second_distances)
+
+        fold_spans = [np.column_stack((np.minimum(first_distances, second_distances), np.maximum(first_distances, second_distances)))]
+        inverted_segment_indexes = np.flatnonzero(is_inverted)
+        fold_spans.append(np.column_stack((sample_distances[inverted_segment_indexes], sample_distances[inverted_segment_indexes + 1])))
+
+        return merge_intervals(np.concatenate(fold_spans))
+
+    def split(self, distance):
+        '''
+        把curve在 s = distance 处一分为二，返回(pre_curve_array, next_curve_array)。
+        '''
+        element_index = int(self.find_element_indexes(np.array([distance]))[0])
+        local_distance = distance - self.length_index[element_index]
+        positions, headings = self.evaluate_elements(np.array([element_index]), np.array([local_distance]))
+
+        pre_poly_coefficients = self.poly_coefficients[:element_index + 1].copy()
+        next_poly_coefficients = self.poly_coefficients[element_index:].copy()
+        if self.element_types[element_index] == element_type_codes['parampoly3']:
+            parameter = self.get_parampoly3_parameters(np.array([element_index]), np.array([local_distance]))[0]
+            pre_poly_coefficients[-1], next_poly_coefficients[0] = split_parampoly3_coefficients(self.poly_coefficients[element_index], parameter)
+
+        pre_end_points = self.end_points[:element_index + 1].copy()
+        pre_end_points[-1] = positions[0]
+        pre_lengths = self.lengths[:element_index + 1].copy()
+        pre_lengths[-1] = local_distance
+        pre_curve_array = CurveArray(self.element_types[:element_index + 1],
+            self.start_points[:element_index + 1],
+            pre_end_points,
+            self.start_headings[:element_index + 1],
+            self.curvatures[:element_index + 1],
+            pre_lengths,
+            self.curvature_rates[:element_index + 1],
+            self.lateral_offsets[:element_index + 1],
+            pre_poly_coefficients)
+
+        next_start_points = self.start_points[element_index:].copy()
+        next_start_points[0] = positions[0]
+        next_start_headings = self.start_headings[element_index:].copy()
+        next_start_headings[0] = headings[0]
+        next_curvatures = self.curvatures[element_index:].copy()
+        next_curvatures[0] += self.curvature_rates[element_index] * get_spiral_base_distances(self.curvatures[element_index],
+            self.curvature_rates[element_index],
+            self.lateral_offsets[element_index],
+            local_distance)
+        next_lengths = self.lengths[element_index:].copy()
+        next_lengths[0] -= local_distance
+        next_curve_array = CurveArray(self.element_types[element_index:],
+            next_start_points,
+            self.end_points[element_index:],
+            next_start_headings,
+            next_curvatures,
+            next_lengths,
+            self.curvature_rates[element_index:],
+            self.lateral_offsets[element_index:],
+            next_poly_coefficients)
+
+        return pre_curve_array, next_curve_array
+
+    def get_arc_parameters(self):
+        '''
+        获取每个element所在圆的圆心x、y坐标，半径，起始角和带符号的圆心角，形状为(n, 5)，曲率为0的element、spiral和parampoly3对应的行为nan。
+        '''
+        if self.arc_parameters is None:
+            is_arc = (self.curvatures != 0) & ~self.get_numerical_mask()
+            curvatures = np.where(is_arc, self.curvatures, np.nan)
+            arc_parameters = np.empty((len(self), 5))
+            arc_parameters[:, 0] = self.start_points[:, 0] - np.sin(self.start_headings) / curvatures
+            arc_parameters[:, 1] = self.start_points[:, 1] + np.cos(self.start_headings) / curvatures
+            arc_parameters[:, 2] = 1 / np.abs(curvatures)
+            arc_parameters[:, 3] = self.start_headings - np.copysign(pi / 2, curvatures)
+            arc_parameters[:, 4] = curvatures * self.lengths
+            self.arc_parameters = arc_parameters
+
+        return self.arc_parameters
+
+    def get_bounding_boxes(self):
+        '''
+        获取每个element在xy平面上的包围盒(min_x, min_y, max_x, max_y)，形状为(n, 4)。
+        arc的包围盒除首尾点外，还要包含arc经过的最右、最上、最左、最下的点。
+        spiral和parampoly3的包围盒由沿曲线等距采样的点确定，再向外扩大采样点间弦高的上界 K * h² / 8（K为最大曲率，h为采样间距），
+        parampoly3的最大曲率由弧长参数化表节点处曲率的最大值乘以2估计。
+        '''
+        bounding_boxes = np.empty((len(self), 4))
+        bounding_boxes[:, :2] = np.minimum(self.start_points[:, :2], self.end_points[:, :2])
+        bounding_boxes[:, 2:] = np.maximum(self.start_points[:, :2], self.end_points[:, :2])
+
+        arc_parameters = self.get_arc_parameters()
+        is_arc = ~np.isnan(arc_parameters[:, 2])
+        centers = arc_parameters[is_arc, :2]
+        radii = arc_parameters[is_arc, 2]
+        start_angles = arc_parameters[is_arc, 3]
+        sweep_radians = arc_parameters[is_arc, 4]
+
+        arc_boxes = bounding_boxes[is_arc]
+        for extreme_index in range(0, 4): # 依次检查圆上角度为0、pi/2、pi、3pi/2的点是否在arc上。
+            relative_angles = np.mod(np.copysign(1.0, sweep_radians) * (extreme_index * pi / 2 - start_angles), 2 * pi)
+            passed = relative_angles <= np.abs(sweep_radians)
+            if extreme_index == 0:
+                arc_boxes[passed, 2] = centers[passed, 0] + radii[passed]
+            elif extreme_index == 1:
+                arc_boxes[passed, 3] = centers[passed, 1] + radii[passed]
+            elif extreme_index == 2:
+                arc_boxes[passed, 0] = centers[passed, 0] - radii[passed]
+            else:
+                arc_boxes[passed, 1] = centers[passed, 1] - radii[passed]
+        bounding_boxes[is_arc] = arc_boxes
+
+        is_numerical = self.get_numerical_mask()
+        if is_numerical.any():
+            numerical_element_indexes = np.nonzero(is_numerical)[0]
+            divisions = 16
+            sample_element_indexes = np.repeat(numerical_element_indexes, divisions + 1)
+            sample_distances = (self.lengths[numerical_element_indexes, np.newaxis] * np.linspace(0, 1, divisions + 1)).ravel()
+            sample_points, _ = self.evaluate_elements(sample_element_indexes, sample_distances)
+            sample_points = sample_points[:, :2].reshape(-1, divisions + 1, 2)
+
+            start_curvatures = self.curvatures / (1 - self.curvatures * self.lateral_offsets)
+            max_curvatures = np.maximum(np.abs(start_curvatures), np.abs(self.get_end_curvatures()))
+            is_parampoly3 = self.get_parampoly3_mask()
+            if is_parampoly3.any():
+                table_parameters = np.tile(np.linspace(0, 1, parampoly3_table_size), (np.count_nonzero(is_parampoly3), 1))
+                table_curvatures = get_parampoly3_curvatures(self.poly_coefficients[is_parampoly3], self.lateral_offsets[is_parampoly3, np.newaxis], table_parameters)
+                max_curvatures[is_parampoly3] = 2 * np.abs(table_curvatures).max(axis=1)
+            margins = max_curvatures[numerical_element_indexes] * (self.lengths[numerical_element_indexes] / divisions) ** 2 / 8
+            bounding_boxes[numerical_element_indexes, :2] = sample_points.min(axis=1) - margins[:, np.newaxis]
+            bounding_boxes[numerical_element_indexes, 2:] = sample_points.max(axis=1) + margins[:, np.newaxis]
+
+        return bounding_boxes
+
+    def get_bounding_box_levels(self):
+        '''
+        按element顺序两两合并包围盒得到的层次包围盒（BVH）：bounding_box_levels[0]是所有element的包围盒，
+        bounding_box_levels[k]中第j个包围盒包含bounding_box_levels[k-1]中第2j和第2j+1个包围盒，最后一层只有一个包围盒。
+        curve中相邻的element在空间上也相邻，因此这样得到的层次包围盒很紧凑。
+        '''
+        if self.bounding_box_levels is None:
+            bounding_box_levels = [self.get_bounding_boxes()]
+            while len(bounding_box_levels[-1]) > 1:
+                child_boxes = bounding_box_levels[-1]
+                if len(child_boxes) % 2 == 1:
+                    child_boxes = np.vstack((child_boxes, child_boxes[-1:]))
+                parent_boxes = np.empty((len(child_boxes) // 2, 4))
+                parent_boxes[:, :2] = np.minimum(child_boxes[0::2, :2], child_boxes[1::2, :2])
+                parent_boxes[:, 2:] = np.maximum(child_boxes[0::2, 2:], child_boxes[1::2, 2:])
+                bounding_box_levels.append(parent_boxes)
+            self.bounding_box_levels = bounding_box_levels
+
+        return self.bounding_box_levels
+
+    def expand_bounding_box_nodes(self, level, query_indexes, node_indexes):
+        '''
+        把第level层的包围盒节点展开为第level - 1层的子节点，query_indexes随之复制。
+        '''
+        child_number = len(self.get_bounding_box_levels()[level - 1])
+        query_indexes = np.repeat(query_indexes, 2)
+        node_indexes = np.repeat(node_indexes * 2, 2)
+        node_indexes[1::2] += 1
+        exists = node_indexes < child_number
+
+        return query_indexes[exists], node_indexes[exists]
+
+    def find_line_candidate_elements(self, origins, directions):
+        '''
+        自顶向下遍历层次包围盒，找出可能与直线（origins[i] + t * directions[i]）相交的element。
+        包围盒的四个角点全部位于直线同一侧时，直线与该包围盒内的element不可能相交。
+        返回(直线索引数组, element索引数组)。
+        '''
+        bounding_box_levels = self.get_bounding_box_levels()
+        line_indexes = np.arange(len(origins))
+        node_indexes = np.zeros(len(origins), dtype=np.intp)
+
+        for level in range(len(bounding_box_levels) - 1, -1, -1):
+            boxes = bounding_box_levels[level][node_indexes]
+            origin = origins[line_indexes]
+            direction = directions[line_indexes]
+            corners_x = boxes[:, [0, 2, 2, 0]] - origin[:, 0, np.newaxis]
+            corners_y = boxes[:, [1, 1, 3, 3]] - origin[:, 1, np.newaxis]
+            sides = direction[:, 0, np.newaxis] * corners_y - direction[:, 1, np.newaxis] * corners_x
+            crossed = (sides.min(axis=1) <= 0.000001) & (sides.max(axis=1) >= -0.000001)
+            line_indexes = line_indexes[crossed]
+            node_indexes = node_indexes[crossed]
+
+            if level > 0:
+                line_indexes, node_indexes = self.expand_bounding_box_nodes(level, line_indexes, node_indexes)
+
+        return line_indexes, node_indexes
+
+    def find_points_candidate_elements(self, points):
+        '''
+        自顶向下遍历层次包围盒，为每个点找出可能包含距离该点最近的curve上的点的element。
+        每一层中，点到包围盒最远角点的距离的最小值是最近距离的上界，包围盒到点的距离大于该上界的节点被剔除。
+        返回(点索引数组, element索引数组, 包围盒到点的距离数组)。
+        '''
+        bounding_box_levels = self.get_bounding_box_levels()
+        point_indexes = np.arange(len(points))
+        node_indexes = np.zeros(len(points), dtype=np.intp)
+
+        for level in range(len(bounding_box_levels) - 1, -1, -1):
+            boxes = bounding_box_levels[level][node_indexes]
+            point = points[point_indexes]
+            gap_x = np.maximum(np.maximum(boxes[:, 0] - point[:, 0], point[:, 0] - boxes[:, 2]), 0)
+            gap_y = np.maximum(np.maximum(boxes[:, 1] - point[:, 1], point[:, 1] - boxes[:, 3]), 0)
+            box_distances = np.hypot(gap_x, gap_y)
+            far_x = np.maximum(np.abs(boxes[:, 0] - point[:, 0]), np.abs(boxes[:, 2] - point[:, 0]))
+            far_y = np.maximum(np.abs(boxes[:, 1] - point[:, 1]), np.abs(boxes[:, 3] - point[:, 1]))
+            upper_bounds = np.full(len(points), np.inf)
+            np.minimum.at(upper_bounds, point_indexes, np.hypot(far_x, far_y))
+
+            kept = box_distances <= upper_bounds[point_indexes] + 0.000001
+            node_indexes = node_indexes[kept]
+            point_indexes = point_indexes[kept]
+            box_distances = box_distances[kept]
+
+            if level > 0:
+                point_indexes, node_indexes = self.expand_bounding_box_nodes(level, point_indexes, node_indexes)
+
+        return point_indexes, node_indexes, box_distances
+
+    def find_point_candidate_elements(self, point):
+        '''
+        找出可能包含距离point最近点的element（见find_points_candidate_elements），按包围盒到point的距离从小到大排序。
+        返回(element索引数组, 包围盒到point的距离数组)。
+        '''
+        _, element_indexes, box_distances = self.find_points_candidate_elements(np.array([tuple(point)[:3]], dtype=np.float64))
+        order = np.argsort(box_distances, kind='stable')
+
+        return element_indexes[order], box_distances[order]
+
+    def project_points_onto_elements(self, points, element_indexes):
+        '''
+        把points[i]投影到第element_indexes[i]个element上，取element上距离points[i]最近的点。
+        line和arc用解析公式求解，投影点超出element范围时取较近的端点；spiral和parampoly3先沿element采样找到最近的采样点，
+        再对 s 用牛顿法求解 (P(s) - point)·T(s) = 0，导数为 1 + 曲率 * (P(s) - point)·N(s)，曲率由航向角差分得到。
+        返回(投影点到element起始点的距离数组, 投影点数组, 投影点处的航向角数组)。
+        '''
+        lengths = self.lengths[element_indexes]
+        local_distances = np.zeros(len(element_indexes))
+
+        is_numerical = self.get_numerical_mask()[element_indexes]
+        is_arc = (self.curvatures[element_indexes] != 0) & ~is_numerical
+        is_line = ~is_arc & ~is_numerical
+
+        start_headings = self.start_headings[element_indexes[is_line]]
+        start_offsets = points[is_line, :2] - self.start_points[element_indexes[is_line], :2]
+        local_distances[is_line] = np.clip(start_offsets[:, 0] * np.cos(start_headings) + start_offsets[:, 1] * np.sin(start_headings), 0, lengths[is_line])
+
+        arc_parameters = self.get_arc_parameters()[element_indexes[is_arc]]
+        angles = np.arctan2(points[is_arc, 1] - arc_parameters[:, 1], points[is_arc, 0] - arc_parameters[:, 0])
+        relative_angles = np.mod(np.copysign(1.0, arc_parameters[:, 4]) * (angles - arc_parameters[:, 3]), 2 * pi)
+        beyond_end = relative_angles > np.abs(arc_parameters[:, 4])
+        nearer_to_end = 2 * pi - relative_angles > relative_angles - np.abs(arc_parameters[:, 4]) # 投影点在arc之外时，按圆心角判断哪个端点更近。
+        local_distances[is_arc] = np.where(beyond_end, np.where(nearer_to_end, lengths[is_arc], 0.0), relative_angles * arc_parameters[:, 2])
+
+        if is_numerical.any():
+            numerical_element_indexes = element_indexes[is_numerical]
+            numerical_points = points[is_numerical, :2]
+            numerical_lengths = lengths[is_numerical]
+
+            divisions = 16
+            sample_distances = numerical_lengths[:, np.newaxis] * np.linspace(0, 1, divisions + 1)
+            sample_points, _ = self.evaluate_elements(np.repeat(numerical_element_indexes, divisions + 1), sample_distances.ravel())
+            sample_gaps = np.hypot(sample_points[:, 0] - np.repeat(numerical_points[:, 0], divisions + 1), sample_points[:, 1] - np.repeat(numerical_points[:, 1], divisions + 1))
+            distances = sample_distances[np.arange(len(numerical_element_indexes)), np.argmin(sample_gaps.reshape(-1, divisions + 1), axis=1)]
+
+            step = 0.000001 * np.maximum(numerical_lengths, 1.0)
+            for iteration in range(0, 8):
+                positions, headings = self.evaluate_elements(numerical_element_indexes, distances)
+                signed_steps = np.where(distances + step <= numerical_lengths, step, -step)
+                _, nearby_headings = self.evaluate_elements(numerical_element_indexes, distances + signed_steps)
+                curvatures = (np.mod(nearby_headings - headings + pi, 2 * pi) - pi) / signed_steps
+                offset_x = positions[:, 0] - numerical_points[:, 0]
+                offset_y = positions[:, 1] - numerical_points[:, 1]
+                function_values = offset_x * np.cos(headings) + offset_y * np.sin(headings)
+                derivatives = 1 + curvatures * (offset_y * np.cos(headings) - offset_x * np.sin(headings))
+                derivatives = np.where(derivatives > 0.000001, derivatives, np.inf) # point在曲率中心外侧太远、牛顿法不收敛时保持当前值。
+                distances = np.clip(distances - function_values / derivatives, 0, numerical_lengths)
+            local_distances[is_numerical] = distances
+
+        projected_points, headings = self.evaluate_elements(element_indexes, local_distances)
+
+        return local_distances, projected_points, headings
+
+    def locate(self, points):
+        '''
+        批量把points转换为curve的参考线坐标(s, t)：找到curve上距离每个点最近的点，s是该点的 s 坐标，t是点到curve的带符号距离（左侧为正）。
+        用层次包围盒找出候选element后，对每个(点, element)组合求投影点，再为每个点取距离最近的投影点。
+        超出curve首尾范围的点投影到curve的首尾点上。返回(s, t, element_indexes)，都是长度为len(points)的数组。
+        '''
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        if len(self) == 0:
+            return np.full(len(points), np.nan), np.full(len(points), np.nan), np.full(len(points), -1, dtype=np.intp)
+
+        point_indexes, element_indexes, _ = self.find_points_candidate_elements(points)
+        local_distances, projected_points, headings = self.project_points_onto_elements(points[point_indexes], element_indexes)
+        offset_x = points[point_indexes, 0] - projected_points[:, 0]
+        offset_y = points[point_indexes, 1] - projected_points[:, 1]
+        distances = np.hypot(offset_x, offset_y)
+
+        order = np.lexsort((distances, point_indexes))
+        _, first_positions = np.unique(point_indexes[order], return_index=True)
+        nearest = order[first_positions]
+
+        element_indexes = element_indexes[nearest]
+        s = self.length_index[element_indexes] + local_distances[nearest]
+        t = np.cos(headings[nearest]) * offset_y[nearest] - np.sin(headings[nearest]) * offset_x[nearest]
+
+        return s, t, element_indexes
+
+    def intersect_lines(self, origins, directions, reference_points=None):
+        '''
+        批量计算多条直线（origins[i] + t * directions[i]，t可正可负）与curve的交点，每条直线取距离reference_points[i]最近的交点，
+        reference_points默认为origins。先用层次包围盒找出可能相交的(直线, element)组合，再对这些组合用解析公式求交，
+        spiral和parampoly3没有解析解，先沿曲线采样找出直线两侧符号变化的区间，再在区间内用牛顿法求交点。
+        返回形状为(len(origins), 3)的交点数组，没有交点的行为nan。
+        '''
+        origins = np.asarray(origins, dtype=np.float64).reshape(-1, 3)
+        reference_points = origins if reference_points is None else np.asarray(reference_points, dtype=np.float64).reshape(-1, 3)
+        directions = np.asarray(directions, dtype=np.float64).reshape(-1, 3)[:, :2]
+        directions = directions / np.linalg.norm(directions, axis=1)[:, np.newaxis]
+
+        intersected_points = np.full(origins.shape, np.nan)
+        if len(self) == 0:
+            return intersected_points
+
+        candidate_line_indexes, candidate_element_indexes = self.find_line_candidate_elements(origins, directions)
+        candidate_is_numerical = self.get_numerical_mask()[candidate_element_indexes]
+        candidate_is_arc = (self.curvatures[candidate_element_indexes] != 0) & ~candidate_is_numerical
+        candidate_is_line = ~candidate_is_arc & ~candidate_is_numerical
+
+        hit_line_indexes = []
+        hit_distances = []
+
+        # 直线与line求交。
+        line_index = candidate_line_indexes[candidate_is_line]
+        element_index = candidate_element_indexes[candidate_is_line]
+        distance, valid = intersect_rays_segments(origins[line_index], directions[line_index], self.start_points[element_index], self.end_points[element_index], two_sided=True)
+
+        hit_line_indexes.append(line_index[valid])
+        hit_distances.append(distance[valid])
+
+        # 直线与arc求交。
+        line_index = candidate_line_indexes[candidate_is_arc]
+        element_index = candidate_element_indexes[candidate_is_arc]
+        arc_parameters = self.get_arc_parameters()[element_index]
+        distance, valid = intersect_rays_arcs(origins[line_index], directions[line_index], arc_parameters[:, :2], arc_parameters[:, 2], arc_parameters[:, 3], arc_parameters[:, 4], two_sided=True)
+
+        hit_line_indexes.append(np.repeat(line_index, 2)[valid.ravel()])
+        hit_distances.append(distance[valid])
+
+        # 直线与spiral、parampoly3求交。
+        if candidate_is_numerical.any():
+            line_index, distance = self.intersect_lines_numerically(origins, directions, candidate_line_indexes[candidate_is_numerical], candidate_element_indexes[candidate_is_numerical])
+            hit_line_indexes.append(line_index)
+            hit_distances.append(distance)
+
+        hit_line_indexes = np.concatenate(hit_line_indexes)
+        hit_distances = np.concatenate(hit_distances)
+        if len(hit_line_indexes) == 0:
+            return intersected_points
+
+        # 当出现多个交点时，取距离reference_point最近的点。
+        hit_points = origins[hit_line_indexes, :2] + hit_distances[:, np.newaxis] * directions[hit_line_indexes]
+        reference_distances = np.linalg.norm(hit_points - reference_points[hit_line_indexes, :2], axis=1)
+        order = np.lexsort((reference_distances, hit_line_indexes))
+        nearest_line_indexes, first_positions = np.unique(hit_line_indexes[order], return_index=True)
+
+        intersected_points[nearest_line_indexes] = origins[nearest_line_indexes]
+        intersected_points[nearest_line_indexes, :2] = hit_points[order][first_positions]
+
+        return intersected_points
+
+    def intersect_lines_numerically(self, origins, directions, line_indexes, element_indexes):
+        '''
+        求第line_indexes[i]条直线与第element_indexes[i]个element（spiral或parampoly3）的交点，directions是单位向量。
+        点P到直线的有向距离 g = direction × (P - origin) 在交点处为0：沿element采样找出g符号变化的区间，再用牛顿法求根，
+        g对 s 的导数为 direction × tangent。返回(直线索引数组, 交点沿直线到origin的距离数组)。
+        '''
+        divisions = 16
+        sample_fractions = np.linspace(0, 1, divisions + 1)
+        sample_element_indexes = np.repeat(element_indexes, divisions + 1)
+        sample_distances = (self.lengths[element_indexes, np.newaxis] * sample_fractions).ravel()
+        sample_points, _ = self.evaluate_elements(sample_element_indexes, sample_distances)
+
+        origin = np.repeat(origins[line_indexes, :2], divisions + 1, axis=0)
+        direction = np.repeat(directions[line_indexes], divisions + 1, axis=0)
+        sides = (direction[:, 0] * (sample_points[:, 1] - origin[:, 1]) - direction[:, 1] * (sample_points[:, 0] - origin[:, 0])).reshape(-1, divisions + 1)
+        sample_distances = sample_distances.reshape(-1, divisions + 1)
+
+        pair_indexes, interval_indexes = np.nonzero(sides[:, :-1] * sides[:, 1:] <= 0)
+        lower_distances = sample_distances[pair_indexes, interval_indexes]
+        upper_distances = sample_distances[pair_indexes, interval_indexes + 1]
+        lower_sides = sides[pair_indexes, interval_indexes]
+        upper_sides = sides[pair_indexes, interval_indexes + 1]
+        side_differences = np.where(lower_sides == upper_sides, 1.0, lower_sides - upper_sides)
+        distances = lower_distances + (upper_distances - lower_distances) * lower_sides / side_differences
+
+        line_indexes = line_indexes[pair_indexes]
+        element_indexes = element_indexes[pair_indexes]
+        origin = origins[line_indexes, :2]
+        direction = directions[line_indexes]
+        for iteration in range(0, 8):
+            points, headings = self.evaluate_elements(element_indexes, distances)
+            side = direction[:, 0] * (points[:, 1] - origin[:, 1]) - direction[:, 1] * (points[:, 0] - origin[:, 0])
+            side_derivative = direction[:, 0] * np.sin(headings) - direction[:, 1] * np.cos(headings)
+            side_derivative = np.where(np.abs(side_derivative) < 0.000000001, 0.000000001, side_derivative)
+            distances = np.clip(distances - side / side_derivative, lower_distances, upper_distances)
+
+        points, _ = self.evaluate_elements(element_indexes, distances)
+        side = direction[:, 0] * (points[:, 1] - origin[:, 1]) - direction[:, 1] * (points[:, 0] - origin[:, 0])
+        valid = np.abs(side) < 0.000001
+
+        return line_indexes[valid], np.einsum('ij,ij->i', points[valid, :2] - origin[valid], direction[valid])
+
+def sample_lane_widths(center_lane_curve_array, lane_boundary_curve_array, adjacent_lane_boundary_curve_array, distances):
+    '''
+    批量采样车道宽度：在center_lane_curve_array上 s = distances 处沿 t 方向作直线，分别与两条车道边界求交，交点间的距离即为车道宽度。
+    返回widths以及两条边界上的交点数组，采样失败的位置为nan。
+    '''
+    positions, tangents = center_lane_curve_array.evaluate(distances)
+    normals = np.zeros_like(tangents)
+    normals[:, 0] = -tangents[:, 1]
+    normals[:, 1] = tangents[:, 0]
+
+    intersected_points_on_lane_boundary = lane_boundary_curve_array.intersect_lines(positions, normals)
+    intersected_points_on_adjacent_lane_boundary = adjacent_lane_boundary_curve_array.intersect_lines(positions, normals)
+    widths = np.linalg.norm(intersected_points_on_lane_boundary - intersected_points_on_adjacent_lane_boundary, axis=1)
+
+    return widths, intersected_points_on_lane_boundary, intersected_points_on_adjacent_lane_boundary
+
+def get_curve_fit_sampling_distances(curve_length, divisions=20):
+    '''
+    拟合车道宽度时沿center_lane_boundary采样的 s 坐标：首尾两个采样点分别取在非常接近起始点和结束点的位置，避免采样失败。
+    '''
+    sampling_distances = np.linspace(0, curve_length, divisions + 1)
+    sampling_distances[0] = 0.001 * curve_length
+    sampling_distances[divisions] = 0.999 * curve_length
+
+    return sampling_distances
+
+def fit_cubic_polynomials(x_arrays, y_arrays):
+    '''
+    对多组采样点同时求解三次曲线 y = a + b*x + c*x^2 + d*x^3 的系数。x_arrays和y_arrays的形状为(n, m)，y为nan的采样点不参与拟合；返回(n, 4)数组，每行为[a, b, c, d]。
+    每组的x先除以其最大绝对值，使Vandermonde矩阵的各列量级相同，求解后再把系数换算回原来的x；
+    采样失败的行置零，等价于剔除该采样点，因此所有组的矩阵形状相同，可以由一次批量伪逆求出全部最小二乘解。采样点少于4个时得到范数最小的解。
+    '''
+    sampled = ~np.isnan(y_arrays)
+    x_scales = np.where(sampled, np.abs(x_arrays), 0.0).max(axis=1, initial=0.0)
+    x_scales[x_scales == 0.0] = 1.0
+    powers = np.arange(4)
+
+    vandermonde_matrices = (x_arrays / x_scales[:, np.newaxis])[:, :, np.newaxis] ** powers
+    vandermonde_matrices[~sampled] = 0.0
+    scaled_factors = np.einsum('nij,nj->ni', np.linalg.pinv(vandermonde_matrices, rcond=np.finfo(float).eps * max(x_arrays.shape[1], 4)), np.where(sampled, y_arrays, 0.0))
+
+    return scaled_factors / x_scales[:, np.newaxis] ** powers
+
+def fit_lane_widths(lane_tasks):
+    '''
+    采样并拟合一组车道的宽度三次曲线系数。导出时各道路的lane_tasks在子进程中并行执行，因此只接收和返回numpy数组。
+    lane_tasks中每一项对应一个车道：(lane_boundary_arrays, adjacent_lane_boundary_arrays, center_lane_boundary_arrays_list)，
+    其中的arrays都是CurveArray.to_arrays()的结果，center_lane_boundary_arrays_list是需要拟合的各curve_fit_section。
+    返回(n, 4)数组，依次是各车道各curve_fit_section的[a, b, c, d]，所有系数由一次fit_cubic_polynomials求出。
+    '''
+    x_arrays = []
+    y_arrays = []
+    for lane_boundary_arrays, adjacent_lane_boundary_arrays, center_lane_boundary_arrays_list in lane_tasks:
+        lane_boundary_curve_array = CurveArray(*lane_boundary_arrays)
+        adjacent_lane_boundary_curve_array = CurveArray(*adjacent_lane_boundary_arrays)
+        for center_lane_boundary_arrays in center_lane_boundary_arrays_list:
+            center_lane_curve_array = CurveArray(*center_lane_boundary_arrays)
+            sampling_distances = get_curve_fit_sampling_distances(center_lane_curve_array.get_length())
+            sampled_widths, _, _ = sample_lane_widths(center_lane_curve_array, lane_boundary_curve_array, adjacent_lane_boundary_curve_array, sampling_distances)
+            x_arrays.append(sampling_distances)
+            y_arrays.append(sampled_widths)
+
+    if len(x_arrays) == 0:
+        return np.empty((0, 4))
+
+    return fit_cubic_polynomials(np.array(x_arrays), np.array(y_arrays))
@@ -1,4 +1,3 @@
-import copy
 
 from scenariogeneration.xodr.opendrive import Road
 import bpy
@@ -14,11 +13,15 @@ from math import acos, ceil, pi, radians, dist
 from mathutils import Vector
 
 from . import basic_element_utils
+from . import curve_array_utils
+from . import cubic_curve_fitting_utils
 from . import road_utils
 from .. import map_scene_data
 
 current_opened_map_scene_file = None
 
+map_origin_grid_size = 1000.0 # 文件中没有保存地图原点时，自动选取的原点取整到的网格大小（米）。
+
 class NumpyEncoder(json.JSONEncoder):
     """ Special json encoder for numpy types """
     def default(self, obj):
@@ -40,18 +43,42 @@ def set_current_opened_map_scene_file(file_path):
 def get_current_opened_map_scene_file():
     return current_opened_map_scene_file
 
+def local_to_world(point):
+    '''
+    把场景中的局部坐标point转换为世界坐标列表，用双精度浮点数计算。
+    '''
+    origin = map_scene_data.get_map_origin()
+    return [origin[0] + point[0], origin[1] + point[1], origin[2] + point[2]]
+
+def world_to_local(coordinates):
+    '''
+    把文件中的世界坐标coordinates转换为场景中的局部坐标，先用双精度浮点数减去地图原点，再保存为Vector。
+    '''
+    origin = map_scene_data.get_map_origin()
+    return Vector((coordinates[0] - origin[0], coordinates[1] - origin[1], coordinates[2] - origin[2]))
+
+def choose_map_origin(file_map_data):
+    '''
+    为没有保存地图原点的文件选取原点：取所有参考线起始点在xy平面上包围盒的中心，并取整到map_origin_grid_size。
+    坐标范围本来就在原点附近的地图选取的原点为(0, 0, 0)，坐标保持不变。
+    '''
+    start_points = [element['start_point'] for road_data in file_map_data.values() for reference_line_section in road_data['reference_line_sections'] for element in reference_line_section]
+    if len(start_points) == 0:
+        return (0.0, 0.0, 0.0)
+
+    start_points = np.array(start_points, dtype=np.float64)
+    center = (start_points.min(axis=0) + start_points.max(axis=0)) / 2
+
+    return (round(center[0] / map_origin_grid_size) * map_origin_grid_size, round(center[1] / map_origin_grid_size) * map_origin_grid_size, 0.0)
+
 def save_element(src, target):
+    '''
+    start_point、end_point以世界坐标保存，见local_to_world。
+    '''
     target['type'] = src['type']
 
-    target['start_point'] = []
-    target['start_point'].append(src['start_point'].x)
-    target['start_point'].append(src['start_point'].y)
-    target['start_point'].append(src['start_point'].z)
-
-    target['end_point'] = []
-    target['end_point'].append(src['end_point'].x)
-    target['end_point'].append(src['end_point'].y)
-    target['end_point'].append(src['end_point'].z)
+    target['start_point'] = local_to_world(src['start_point'])
+    target['end_point'] = local_to_world(src['end_point'])
 
     target['start_tangent'] = []
     target['start_tangent'].append(src['start_tangent'].x)
@@ -63,13 +90,36 @@ def save_element(src, target):
     target['end_tangent'].append(src['end_tangent'].y)
     target['end_tangent'].append(src['end_tangent'].z)
 
+    if src['type'] == 'spiral':
+        target['start_curvature'] = src['start_curvature']
+        target['end_curvature'] = src['end_curvature']
+        target['spiral_length'] = src['spiral_length']
+        target['lateral_offset'] = src['lateral_offset']
+    elif src['type'] == 'parampoly3':
+        target['poly_coefficients'] = list(src['poly_coefficients'])
+        target['lateral_offset'] = src['lateral_offset']
+
 def read_element(src, target):
+    '''
+    文件中的start_point、end_point是世界坐标，读取时转换为局部坐标，见world_to_local。
+    '''
     target['type'] = src['type']
-    target['start_point'] = Vector((src['start_point'][0], src['start_point'][1], src['start_point'][2]))
-    target['end_point'] = Vector((src['end_point'][0], src['end_point'][1], src['end_point'][2]))
+    target['start_point'] = world_to_local(src['start_point'])
+    target['end_point'] = world_to_local(src['end_point'])
     target['start_tangent'] = Vector((src['start_tangent'][0], src['start_tangent'][1], src['start_tangent'][2]))
     target['end_tangent'] = Vector((src['end_tangent'][0], src['end_tangent'][1], src['end_tangent'][2]))
 
+    if target['type'] == 'arc':
+        basic_element_utils.update_arc_geometry_info(target)
+    elif target['type'] == 'spiral':
+        target['start_curvature'] = src['start_curvature']
+        target['end_curvature'] = src['end_curvature']
+        target['spiral_length'] = src['spiral_length']
+        target['lateral_offset'] = src['lateral_offset']
+    elif target['type'] == 'parampoly3':
+        target['poly_coefficients'] = tuple(src['poly_coefficients'])
+        target['lateral_offset'] = src['lateral_offset']
+
 def save_reference_line_sections(reference_line_sections_src, reference_line_sections_target):
     for reference_line_section in reference_line_sections_src:
         reference_line_section_data = []
@@ -86,7 +136,7 @@ def read_reference_line_sections(reference_line_sections_src, reference_line_sec
         reference_line_section_data = []
 
         for element in reference_line_section:
-            element_data = {}
+            element_data = basic_element_utils.CurveElement()
             read_element(element, element_data)
             reference_line_section_data.append(element_data)
 
@@ -147,7 +197,7 @@ def save_lane_sections(lane_sections_src, lane_sections_target):
 def read_lane_sections(lane_sections_src, lane_sections_target):
     def read_boundary_curve_elements(src, target):
         for element in src:
-            element_data = {}
+            element_data = basic_element_utils.CurveElement()
             read_element(element, element_data)
             target.append(element_data)
 
@@ -160,7 +210,7 @@ def read_lane_sections(lane_sections_src, lane_sections_target):
             curve_fit_section_data = []
             
             for element in curve_fit_section:
-                element_data = {}
+                element_data = basic_element_utils.CurveElement()
                 read_element(element, element_data)
                 curve_fit_section_data.append(element_data)
 
@@ -211,6 +261,8 @@ def save_map_date(file_path):
         save_lane_sections(lane_sections, road_data['lane_sections'])
 
         map_data[str(road_id)] = road_data
+
+    map_data['map_origin'] = list(map_scene_data.get_map_origin())
         
     with open(file_path + str('.json'), 'w') as outfile:
         json.dump(map_data, outfile, indent = 4, cls = NumpyEncoder)
@@ -218,6 +270,12 @@ def save_map_date(file_path):
 def read_map_data(file_path):
     with open(file_path) as json_file:
         file_map_data = json.load(json_file)
+
+        map_origin = file_map_data.pop('map_origin', None)
+        if map_origin is None: # 文件中没有保存地图原点。
+            map_origin = choose_map_origin(file_map_data)
+        map_scene_data.set_map_origin(map_origin)
+
         for road_id, road_data in file_map_data.items():
             memory_road_data = {}
             memory_road_data['reference_line_sections'] = []
@@ -231,6 +289,8 @@ def read_map_data(file_path):
 
             map_scene_data.set_road_data(int(road_id), memory_road_data)
 
+    cubic_curve_fitting_utils.refit_all(map_scene_data.get_map_data()) # 文件中保存的拟合系数可能已过期，重新拟合所有车道的宽度。
+
 def reload_map_scene(context, file_path):
     for object in bpy.context.scene.objects:
         bpy.data.objects.remove(object, do_unlink=True)
@@ -266,9 +326,9 @@ def reload_map_scene(context, file_path):
                 construct_lane_object(lane_section['lanes'][lane_id + 1]['boundary_curve_elements'], lane_section['lanes'][lane_id]['boundary_curve_elements'])      
 
         # 创建道路参考线实物对象。
-        reference_line_elements = construct_reference_line_elements(copy.deepcopy(road_data['reference_line_sections']))
-        left_side_curve = basic_element_utils.generate_new_curve_by_offset(reference_line_elements, 0.1, 'left')
-        right_side_curve = basic_element_utils.generate_new_curve_by_offset(reference_line_elements, 0.1, 'right')
+        reference_line_elements = construct_reference_line_elements(road_data['reference_line_sections'])
+        left_side_curve = basic_element_utils.OffsetCurve(reference_line_elements, 0.1, 'left')
+        right_side_curve = basic_element_utils.OffsetCurve(reference_line_elements, 0.1, 'right')
         mesh = road_utils.create_band_mesh(left_side_curve, right_side_curve)
         object_name = 'reference_line_object_' + str(road_id) 
         object = bpy.data.objects.new(object_name, mesh)
@@ -280,29 +340,35 @@ def reload_map_scene(context, file_path):
         road_data['road_reference_line_object'] = object
 
 def export_open_drive_map(file_path):
+    '''
+    返回导出前并行拟合车道宽度失败时的异常（见cubic_curve_fitting_utils.refit_all），没有失败时返回None。
+    '''
     odr = xodr.OpenDrive('open_drive_map')
 
     map_data = map_scene_data.get_map_data()
+    _, parallel_error = cubic_curve_fitting_utils.refit_all(map_data) # 导出前用一次批量求解更新所有车道的宽度拟合系数。
     for road_id, road_data in map_data.items():
-        reference_line_elements = construct_reference_line_elements(copy.deepcopy(road_data['reference_line_sections']))
+        reference_line_elements = construct_reference_line_elements(road_data['reference_line_sections'])
         first_element = reference_line_elements[0]
 
         planview = xodr.PlanView()
-        planview.set_start_point(first_element['start_point'].x, first_element['start_point'].y, compute_heading_from_tangent(first_element['start_tangent']))
+        start_point = local_to_world(first_element['start_point']) # 导出世界坐标。
+        planview.set_start_point(start_point[0], start_point[1], compute_heading_from_tangent(first_element['start_tangent']))
 
         for element in reference_line_elements:
             if element['type'] == 'line':
                 line = xodr.Line(basic_element_utils.get_element_length(element))
                 planview.add_geometry(line)
             elif element['type'] == 'arc':
-                center_point, arc_radian, arc_radius = basic_element_utils.get_arc_geometry_info(element)
-
-                normal_vector =  element['start_tangent'].cross(element['end_tangent'])
-                if normal_vector.z < 0:
-                    arc_radius = -arc_radius
-                    
-                arc = xodr.Arc(curvature = 1 / arc_radius, length = basic_element_utils.get_element_length(element))
+                arc = xodr.Arc(curvature = basic_element_utils.get_arc_curvature(element), length = basic_element_utils.get_element_length(element))
                 planview.add_geometry(arc)
+            elif element['type'] == 'spiral':
+                spiral = xodr.Spiral(curvstart = element['start_curvature'], curvend = element['end_curvature'], length = element['spiral_length'])
+                planview.add_geometry(spiral)
+            elif element['type'] == 'parampoly3':
+                au, bu, cu, du, av, bv, cv, dv = curve_array_utils.normalize_parampoly3_coefficients(element['poly_coefficients'])
+                parampoly3 = xodr.ParamPoly3(au, bu, cu, du, av, bv, cv, dv, prange = 'normalized', length = basic_element_utils.get_element_length(element))
+                planview.add_geometry(parampoly3)
 
         planview.adjust_geometries()
 
@@ -341,6 +407,8 @@ def export_open_drive_map(file_path):
 
     adjust_xodr_file_data(odr, file_path)
 
+    return parallel_error
+
 def adjust_xodr_file_data(odr, file_path):
     open_drive_element = odr.get_element()
 
@@ -391,14 +459,17 @@ def add_lane_width_per_lane(lane_element, lane_section, lane_id):
         soffset += basic_element_utils.computer_curve_length(curve_fit_sections[index])  
 
 def construct_reference_line_elements(reference_line_sections):
-    while len(reference_line_sections) > 1:
-        last_index = len(reference_line_sections) - 1
-        result_segment = basic_element_utils.merge_reference_line_segment(reference_line_sections[last_index - 1], reference_line_sections[last_index])
-        reference_line_sections.pop()
-        reference_line_sections.pop()
-        reference_line_sections.append(result_segment)
-
-    return reference_line_sections[0]
+    '''
+    把road的各个参考线分段依次拼接为完整的参考线，相邻分段交界处的两个element由同一个element分割得到，被合并为一个新的element，
+    其余element直接引用，不复制。只遍历一次所有element，reference_line_sections不被修改。
+    '''
+    reference_line_elements = list(reference_line_sections[0])
+    for index in range(1, len(reference_line_sections)):
+        reference_line_section = reference_line_sections[index]
+        reference_line_elements[len(reference_line_elements) - 1] = basic_element_utils.merge_split_elements(reference_line_elements[len(reference_line_elements) - 1], reference_line_section[0])
+        reference_line_elements.extend(reference_line_section[1:])
+
+    return reference_line_elements
 
 def compute_heading_from_tangent(tangent):
     '''
@@ -1,5 +1,5 @@
 
-from math import dist, sqrt, pow
+from math import atan2, cos, copysign, dist, fabs, hypot, pi, sin, sqrt, pow
 from mathutils import Vector, geometry
 from bpy_extras.view3d_utils import region_2d_to_origin_3d, region_2d_to_vector_3d
 from . import draw_utils
@@ -59,41 +59,69 @@ def project_point_onto_line(point, line_start_point, line_end_point):
 def project_point_onto_finite_line(point, line_start_point, line_end_point):
     '''
     把point投影到由 line_start_point 和 line_end_point 确定的直线上（有限长直线），得到投影点projected_point。
+    投影点不在线段上时返回None。
     '''
-    projected_point = geometry.intersect_point_line(point, line_start_point, line_end_point)[0]
-    
-    line_element = {
-        'type': 'line',
-        'start_point': line_start_point,
-        'end_point': line_end_point
-    }
-
-    if basic_element_utils.check_point_on_element(projected_point, line_element) == True:
-        return projected_point
-    else:
+    segment_x = line_end_point[0] - line_start_point[0]
+    segment_y = line_end_point[1] - line_start_point[1]
+    segment_length = hypot(segment_x, segment_y)
+    if segment_length < 0.000001:
+        return line_start_point.copy()
+
+    parameter = ((point[0] - line_start_point[0]) * segment_x + (point[1] - line_start_point[1]) * segment_y) / (segment_length * segment_length)
+    tolerance = 0.000001 / segment_length
+    if parameter < -tolerance or parameter > 1 + tolerance:
         return None
 
+    return geometry.intersect_point_line(point, line_start_point, line_end_point)[0]
+
 def project_point_onto_finite_arc(point, arc):
     '''
-    把point投影到arc上，得到投影点projected_point。
+    把point投影到arc上，得到投影点projected_point：point在arc所在圆上的投影点为圆心沿point方向半径处的点，
+    再用check_angle_in_sweep检查投影点是否落在arc的圆心角范围内，不在时返回None。
     '''
     center_point, arc_radian, arc_radius = basic_element_utils.get_arc_geometry_info(arc)
-    one_side_point, another_side_point = generate_infinite_line(point, center_point)
-    projected_points = geometry.intersect_line_sphere(one_side_point, another_side_point, center_point, arc_radius)
-    for point in projected_points:
-        if point != None and basic_element_utils.check_point_on_element(point, arc) == True:
-            return point
+    if center_point is None: # arc退化为直线。
+        return project_point_onto_finite_line(point, arc['start_point'], arc['end_point'])
+
+    offset_x = point[0] - center_point[0]
+    offset_y = point[1] - center_point[1]
+    if hypot(offset_x, offset_y) < 0.000001: # point与圆心重合，投影点不唯一。
+        return None
+
+    angle = atan2(offset_y, offset_x)
+    start_angle = atan2(arc['start_point'][1] - center_point[1], arc['start_point'][0] - center_point[0])
+    if not check_angle_in_sweep(angle, start_angle, arc['sweep_radian'], 0.000001 / arc_radius):
+        return None
+
+    return Vector((center_point[0] + arc_radius * cos(angle), center_point[1] + arc_radius * sin(angle), point[2]))
+
+def project_point_onto_finite_spiral(point, spiral):
+    '''
+    把point投影到spiral上，得到投影点projected_point。
+    '''
+    distance = basic_element_utils.get_spiral_distance_of_projected_point(spiral, point)
+    if distance is None:
+        return None
     
-    return None
+    return basic_element_utils.get_point_on_spiral_by_distance(spiral, distance)
 
-def generate_infinite_line(line_point_a, line_point_b):
-    origin_point = line_point_a
-    direction = vector_subtract(line_point_b, line_point_a)
-    direction.normalize()
-    one_side_point = vector_add(origin_point, vector_scale(direction, 100))
-    another_side_point = vector_add(origin_point, vector_scale(direction, -100))
+def project_point_onto_finite_parampoly3(point, parampoly3):
+    '''
+    把point投影到parampoly3上，得到投影点projected_point。
+    '''
+    distance = basic_element_utils.get_parampoly3_distance_of_projected_point(parampoly3, point)
+    if distance is None:
+        return None
+
+    return basic_element_utils.get_point_on_parampoly3_by_distance(parampoly3, distance)
 
-    return one_side_point, another_side_point
+def check_angle_in_sweep(angle, start_angle, sweep_radian, angle_tolerance=0.0):
+    '''
+    判断angle是否落在从start_angle开始、转过带符号的圆心角sweep_radian（逆时针为正）的区间内，两端各放宽angle_tolerance。
+    批量版本见curve_array_utils.check_angles_in_sweeps。
+    '''
+    relative_angle = (copysign(1.0, sweep_radian) * (angle - start_angle) + angle_tolerance) % (2 * pi) - angle_tolerance
+    return relative_angle <= fabs(sweep_radian) + angle_tolerance
 
 def raycast_mouse_to_object(context, event, type):
     '''
@@ -1,11 +1,13 @@
 import copy
 import math
 import bpy
+import numpy as np
 
 from math import acos, ceil, radians, dist
 
 from . import cubic_curve_fitting_utils
 from . import basic_element_utils
+from . import curve_array_utils
 
 def construct_default_lane():
     default_lane = {
@@ -22,6 +24,7 @@ def construct_default_lane():
 def add_lane(lane_section, direction):
     '''
     在lane_section对应的车道段中沿direction方向（left或right）向外侧增加车道。
+    新车道边界在曲率半径小于偏移距离处反向折叠的部分被剪除（见basic_element_utils.trim_offset_curve），返回被剪除部分在参考线上的 s 区间列表。
     '''
     reference_lane_id = 0
     new_lane_id = 0
@@ -37,7 +40,8 @@ def add_lane(lane_section, direction):
     reference_lane = lane_section['lanes'][reference_lane_id]['boundary_curve_elements']
 
     new_lane = construct_default_lane()
-    new_lane['boundary_curve_elements'] = basic_element_utils.generate_new_curve_by_offset(reference_lane, 3, direction)
+    # 车道边界被剪除折叠部分或被单独调整时才被替换为element列表。
+    new_lane['boundary_curve_elements'], fold_spans = basic_element_utils.trim_offset_curve(basic_element_utils.OffsetCurve(reference_lane, 3, direction))
 
     center_lane = lane_section['lanes'][0]['boundary_curve_elements']
     new_lane['curve_fit_sections'] = [copy.deepcopy(center_lane)]
@@ -46,6 +50,8 @@ def add_lane(lane_section, direction):
 
     cubic_curve_fitting_utils.update_cubic_curve_factors(lane_section, new_lane_id)
 
+    return fold_spans
+
 def remove_lane(lane_section, lane_index):
     lane_section['lanes'].pop(lane_index)
 
@@ -71,6 +77,172 @@ def create_lane_section(reference_line_elements):
 
     return default_lane_section
 
+def simplify_map_curves(map_data, tolerance=None):
+    '''
+    对地图中所有道路的参考线、车道边界和车道宽度拟合分段调用simplify_curve，返回被删除的element数量。
+    curve被原地替换内容，因此与之共享同一个列表的数据（比如中心车道边界和参考线）以及以之为base_curve的OffsetCurve都随之更新；
+    OffsetCurve本身不需要简化。tolerance默认为basic_element_utils.simplify_curve_tolerance。
+    '''
+    if tolerance is None:
+        tolerance = basic_element_utils.simplify_curve_tolerance
+
+    removed_element_count = 0
+
+    def simplify(curve):
+        nonlocal removed_element_count
+        if isinstance(curve, basic_element_utils.OffsetCurve):
+            return
+
+        simplified_curve = basic_element_utils.simplify_curve(curve, tolerance)
+        removed_element_count += len(curve) - len(simplified_curve)
+        curve[:] = simplified_curve
+
+    for road_data in map_data.values():
+        for reference_line_section in road_data['reference_line_sections']:
+            simplify(reference_line_section)
+
+        for lane_section in road_data['lane_sections']:
+            for lane in lane_section['lanes'].values():
+                simplify(lane['boundary_curve_elements'])
+                for curve_fit_section in lane['curve_fit_sections']:
+                    simplify(curve_fit_section)
+
+    return removed_element_count
+
+def find_road_conflicts(map_data, merge_distance=10.0, tolerance=0.01, max_turning_radian=0.05):
+    '''
+    找出地图中不同道路之间的交叉和重叠，检查每条道路各个车道段的参考线以及最外侧的车道边界。
+    先用CurveArray.sample把这些curve离散为折线，再用curve_array_utils.find_overlapping_box_pairs对所有道路的线段包围盒做排序扫描，
+    只对包围盒重叠且属于不同道路的线段对求交，时间复杂度为O(n log n + 候选对数量)；平行且距离小于tolerance的线段对按重叠处理，重叠部分的两端都作为交点。
+    交点用所在车道段参考线的locate换算为道路的 s 坐标，位于任一道路首尾tolerance范围内的交叉点（道路之间的连接）不算冲突，
+    同一对道路上 s 坐标相距不超过merge_distance的交点合并为一处冲突。
+    返回冲突列表，每项为(road_id, (start_s, end_s), other_road_id, (other_start_s, other_end_s))，road_id < other_road_id。
+    '''
+    section_keys = []
+    section_curve_arrays = []
+    section_start_distances = []
+    road_lengths = {}
+    segment_starts = []
+    segment_ends = []
+    segment_section_indexes = []
+
+    for road_id, road_data in map_data.items():
+        section_start_distance = 0.0
+        lane_sections = road_data['lane_sections']
+        for section_index, reference_line_section in enumerate(road_data['reference_line_sections']):
+            reference_curve_array = basic_element_utils.curve_to_curve_array(reference_line_section)
+            curve_arrays = [reference_curve_array]
+            if section_index < len(lane_sections):
+                lane_section = lane_sections[section_index]
+                for lane_id in (lane_section['left_most_lane_index'], lane_section['right_most_lane_index']):
+                    if lane_id != 0:
+                        curve_arrays.append(basic_element_utils.curve_to_curve_array(lane_section['lanes'][lane_id]['boundary_curve_elements']))
+
+            for curve_array in curve_arrays:
+                if len(curve_array) == 0:
+                    continue
+                _, positions, _ = curve_array.sample(max_turning_radian)
+                segment_starts.append(positions[:-1, :2])
+                segment_ends.append(positions[1:, :2])
+                segment_section_indexes.append(np.full(len(positions) - 1, len(section_keys)))
+
+            section_keys.append(road_id)
+            section_curve_arrays.append(reference_curve_array)
+            section_start_distances.append(section_start_distance)
+            section_start_distance += reference_curve_array.get_length()
+
+        road_lengths[road_id] = section_start_distance
+
+    if len(segment_starts) == 0:
+        return []
+
+    segment_starts = np.concatenate(segment_starts)
+    segment_ends = np.concatenate(segment_ends)
+    segment_section_indexes = np.concatenate(segment_section_indexes)
+    segment_road_ids = np.array(section_keys)[segment_section_indexes]
+
+    bounding_boxes = curve_array_utils.get_segment_bounding_boxes(segment_starts, segment_ends)
+    bounding_boxes[:, :2] -= tolerance
+    bounding_boxes[:, 2:] += tolerance
+    first_indexes, second_indexes = curve_array_utils.find_overlapping_box_pairs(bounding_boxes)
+    different_road = segment_road_ids[first_indexes] != segment_road_ids[second_indexes]
+    first_indexes = first_indexes[different_road]
+    second_indexes = second_indexes[different_road]
+
+    first_parameters, _, crossed = curve_array_utils.intersect_segment_pairs(segment_starts[first_indexes], segment_ends[first_indexes], segment_starts[second_indexes], segment_ends[second_indexes])
+    hit_points = segment_starts[first_indexes] + first_parameters[:, np.newaxis] * (segment_ends[first_indexes] - segment_starts[first_indexes])
+
+    # 平行线段：两条线段共线（距离小于tolerance）且投影重叠时，把重叠部分的两端都作为交点。
+    first_vectors = segment_ends[first_indexes] - segment_starts[first_indexes]
+    first_lengths = np.maximum(np.linalg.norm(first_vectors, axis=1), 0.000000001)
+    first_directions = first_vectors / first_lengths[:, np.newaxis]
+    second_vectors = segment_ends[second_indexes] - segment_starts[second_indexes]
+    parallel = np.abs(first_directions[:, 0] * second_vectors[:, 1] - first_directions[:, 1] * second_vectors[:, 0]) <= tolerance
+    start_offsets = segment_starts[second_indexes] - segment_starts[first_indexes]
+    collinear = parallel & (np.abs(first_directions[:, 0] * start_offsets[:, 1] - first_directions[:, 1] * start_offsets[:, 0]) <= tolerance)
+    projected_starts = np.einsum('ij,ij->i', start_offsets, first_directions)
+    projected_ends = projected_starts + np.einsum('ij,ij->i', second_vectors, first_directions)
+    overlap_starts = np.maximum(np.minimum(projected_starts, projected_ends), 0.0)
+    overlap_ends = np.minimum(np.maximum(projected_starts, projected_ends), first_lengths)
+    overlapped = collinear & ~crossed & (overlap_ends - overlap_starts > tolerance)
+
+    overlap_first_indexes = first_indexes[overlapped]
+    overlap_second_indexes = second_indexes[overlapped]
+    overlap_points = [segment_starts[overlap_first_indexes] + overlap_distances[overlapped, np.newaxis] * first_directions[overlapped] for overlap_distances in (overlap_starts, overlap_ends)]
+
+    first_sections = segment_section_indexes[np.concatenate((first_indexes[crossed], overlap_first_indexes, overlap_first_indexes))]
+    second_sections = segment_section_indexes[np.concatenate((second_indexes[crossed], overlap_second_indexes, overlap_second_indexes))]
+    hit_points = np.concatenate([hit_points[crossed]] + overlap_points)
+    hit_points = np.column_stack((hit_points, np.zeros(len(hit_points))))
+    if len(hit_points) == 0:
+        return []
+
+    # 换算为道路的 s 坐标：按车道段分组，每组调用一次locate。
+    first_distances = np.empty(len(hit_points))
+    second_distances = np.empty(len(hit_points))
+    for hit_sections, hit_distances in ((first_sections, first_distances), (second_sections, second_distances)):
+        for section_index in np.unique(hit_sections):
+            in_section = hit_sections == section_index
+            hit_distances[in_section] = section_curve_arrays[section_index].locate(hit_points[in_section])[0] + section_start_distances[section_index]
+
+    # 每个交叉点是长度为0的 s 区间，每段重叠是以其两端为边界的 s 区间。
+    crossed_count = np.count_nonzero(crossed)
+    overlapped_count = len(overlap_first_indexes)
+    def to_intervals(distances):
+        starts = np.concatenate((distances[:crossed_count], np.minimum(distances[crossed_count:crossed_count + overlapped_count], distances[crossed_count + overlapped_count:])))
+        ends = np.concatenate((distances[:crossed_count], np.maximum(distances[crossed_count:crossed_count + overlapped_count], distances[crossed_count + overlapped_count:])))
+        return starts, ends
+    first_starts, first_ends = to_intervals(first_distances)
+    second_starts, second_ends = to_intervals(second_distances)
+    first_road_ids = np.array(section_keys)[first_sections[:crossed_count + overlapped_count]]
+    second_road_ids = np.array(section_keys)[second_sections[:crossed_count + overlapped_count]]
+
+    # 交叉点位于任一道路首尾tolerance范围内时是道路之间的连接，不算冲突；首尾相接的道路之间不会产生长度大于tolerance的重叠。
+    first_road_lengths = np.array([road_lengths[road_id] for road_id in first_road_ids])
+    second_road_lengths = np.array([road_lengths[road_id] for road_id in second_road_ids])
+    interior = (first_starts > tolerance) & (first_ends < first_road_lengths - tolerance) & (second_starts > tolerance) & (second_ends < second_road_lengths - tolerance)
+    interior[crossed_count:] = True
+
+    # 使每个区间的第一条道路id较小。
+    swapped = first_road_ids > second_road_ids
+    first_road_ids, second_road_ids = np.where(swapped, second_road_ids, first_road_ids)[interior], np.where(swapped, first_road_ids, second_road_ids)[interior]
+    first_starts, second_starts = np.where(swapped, second_starts, first_starts)[interior], np.where(swapped, first_starts, second_starts)[interior]
+    first_ends, second_ends = np.where(swapped, second_ends, first_ends)[interior], np.where(swapped, first_ends, second_ends)[interior]
+
+    # 按(道路对, 起始s)排序，同一对道路上相距不超过merge_distance的区间合并为一处冲突。
+    conflicts = []
+    for index in np.lexsort((first_starts, second_road_ids, first_road_ids)):
+        road_id, other_road_id = first_road_ids[index].item(), second_road_ids[index].item()
+        if len(conflicts) > 0:
+            pre_road_id, (pre_start, pre_end), pre_other_road_id, (pre_other_start, pre_other_end) = conflicts[-1]
+            if pre_road_id == road_id and pre_other_road_id == other_road_id and first_starts[index] - pre_end <= merge_distance:
+                conflicts[-1] = (road_id, (pre_start, max(pre_end, float(first_ends[index]))), 
+                    other_road_id, (min(pre_other_start, float(second_starts[index])), max(pre_other_end, float(second_ends[index]))))
+                continue
+        conflicts.append((road_id, (float(first_starts[index]), float(first_ends[index])), other_road_id, (float(second_starts[index]), float(second_ends[index]))))
+
+    return conflicts
+
 def remove_duplicated_point(origin_vertices):
     reduced_vertices = []
     reduced_vertices.append(origin_vertices[0])
@@ -91,8 +263,15 @@ def create_band_mesh(up_boundary, down_boundary):
     edges = []
     faces = []
 
-    up_boundary_vertices = basic_element_utils.generate_vertices_from_curve_elements(up_boundary)
-    down_boundary_vertices = basic_element_utils.generate_vertices_from_curve_elements(down_boundary)
+    # OffsetCurve每次被访问都重新生成element，下面要遍历两次，先各生成一次element列表。
+    if isinstance(up_boundary, basic_element_utils.OffsetCurve):
+        up_boundary = up_boundary.materialize()
+    if isinstance(down_boundary, basic_element_utils.OffsetCurve):
+        down_boundary = down_boundary.materialize()
+
+    element_divisions = basic_element_utils.get_paired_element_divisions(up_boundary, down_boundary)
+    up_boundary_vertices = basic_element_utils.generate_vertices_from_curve_elements(up_boundary, element_divisions)
+    down_boundary_vertices = basic_element_utils.generate_vertices_from_curve_elements(down_boundary, element_divisions)
     remove_duplicated_point(up_boundary_vertices)
     remove_duplicated_point(down_boundary_vertices)
 